@@ -1,22 +1,23 @@
 import os
-import json
 import logging
 import ssl
 import math
 import random
 import asyncio
+import hashlib
 import httpcore
-from datetime import datetime
 from tempfile import NamedTemporaryFile
 
 from cinp.common import URI
+from cinp import json_codec
 
 __CLIENT_VERSION__ = '2.1.1'
 __CINP_VERSION__ = '2.0'
 
 __all__ = [ 'Timeout', 'ResponseError', 'DetailedInvalidRequest',
             'InvalidRequest', 'InvalidSession', 'NotAuthorized',
-            'NotFound', 'ServerError', 'CInP', 'RequestAborted' ]
+            'NotFound', 'ServerError', 'CInP', 'RequestAborted',
+            'UploadIncomplete' ]
 
 DELAY_MULTIPLIER = 15
 # delay of 15 results in a delay of:
@@ -75,6 +76,12 @@ class RequestAborted( Exception ):
   pass
 
 
+class UploadIncomplete( ResponseError ):  # pass session to uploadFile to resume the upload
+  def __init__( self, message, session ):
+    super().__init__( message )
+    self.session = session
+
+
 def _backOffDelay( count ):
   if count < 1:  # math.log dosen't do so well below 1
     count = 1
@@ -95,6 +102,17 @@ def _headerListToMap( header_list ):
   return header_map
 
 
+def _preview( buff ):  # for error messages, the first bit of a raw response body
+  return str( buff[ 0:200 ], 'utf-8', 'replace' ).strip()
+
+
+def _isLastChunk( count_map, position, chunk_size ):
+  if count_map[ 'count' ] < chunk_size:
+    return True
+
+  return count_map[ 'total' ] is not None and position >= count_map[ 'total' ]  # older servers always send the total
+
+
 class CInP():
   def __init__( self, host, root_path, proxy=None, verify_ssl=True, retry_event=None ):  # retry_event should be an Event Object, use to cancel retry loops, if the event get's set the retry loop will throw the most recent Exception it ignored
     super().__init__()
@@ -130,6 +148,7 @@ class CInP():
                                           } )
 
     self.auth_header_list = []
+    self.describe_cache = {}  # uri -> ( etag, data, type ), filled from DESCRIBE responses that carry an ETag
 
   async def __aenter__( self ):
     if self.retry_event is None:
@@ -155,7 +174,7 @@ class CInP():
     if verb not in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE', 'CALL', 'DESCRIBE' ):
       raise InvalidRequest( 'Invalid Verb (HTTP Method) "{0}"'.format( verb ) )
 
-    if data is not None and not isinstance( data, dict ):
+    if data is not None and not isinstance( data, dict ) and not ( verb == 'CREATE' and isinstance( data, list ) ):
       raise InvalidRequest( 'Data must be a dict' )
 
     try:
@@ -222,8 +241,14 @@ class CInP():
         raise InvalidRequest( 'data must be an readable stream' )
       verb = 'POST'  # not to be handled by CInP on the other end, but by a file upload handler
 
-    elif verb == 'RAWGET':  # not a CINP verb, just using it to bypass some checking here in __request
-      verb = 'GET'
+    elif verb == 'UPLOADCHUNK':  # not a CINP verb, a part of a resumable file upload
+      header_map[ 'Content-Type' ] = 'application/octet-stream'
+      if not isinstance( data, bytes ):
+        raise InvalidRequest( 'data must be bytes' )
+      verb = 'PUT'
+
+    elif verb in ( 'RAWGET', 'RAWPOST' ):  # not a CINP verb, just using it to bypass some checking here in __request
+      verb = verb[ 3: ]
 
     else:
       header_map[ 'Content-Type' ] = 'application/json;charset=utf-8'
@@ -231,7 +256,7 @@ class CInP():
       if data is None:
         data = ''.encode( 'utf-8' )
       else:
-        data = json.dumps( data, default=JSONEncoder ).encode( 'utf-8' )
+        data = json_codec.dumps( data )
 
     header_list = self.header_list + self.auth_header_list + _headerMapToList( header_map )
     url = '{0}{1}'.format( self.host, uri )
@@ -239,7 +264,7 @@ class CInP():
     try:
       resp = await self.connection_pool.request( verb, url, content=data, headers=header_list, extensions={ 'timeout': { 'connect': timeout } } )
       http_code = resp.status
-      if http_code not in ( 200, 201, 202, 400, 401, 403, 404, 500 ):
+      if http_code not in ( 200, 201, 202, 304, 400, 401, 403, 404, 500 ):
         raise ResponseError( 'HTTP code "{0}" unhandled'.format( http_code ) )
 
       logging.debug( 'cinp: got HTTP code "{0}"'.format( http_code ) )
@@ -259,22 +284,22 @@ class CInP():
         logging.warning( 'cinp: Not Found' )
         raise NotFound()
 
-      buff = str( resp.content, 'utf-8' ).strip()
-      if not buff:
+      buff = resp.content  # decoded straight from the bytes, no need for an intermediate str
+      if not buff or buff.isspace():
         data = None
       else:
         if return_raw_result:
-          data = buff
+          data = str( buff, 'utf-8' ).strip()
         else:
           try:
-            data = json.loads( buff )
-          except ValueError:
+            data = json_codec.loads( buff )
+          except json_codec.DecodeError:
             data = None
             if http_code not in ( 400, 500 ):  # these two codes can deal with non dict data
-              logging.warning( 'cinp: Unable to parse response "{0}"'.format( buff[ 0:200 ] ) )
-              raise ResponseError( 'Unable to parse response "{0}"'.format( buff[ 0:200 ] ) )
+              logging.warning( 'cinp: Unable to parse response "{0}"'.format( _preview( buff ) ) )
+              raise ResponseError( 'Unable to parse response "{0}"'.format( _preview( buff ) ) )
 
-      header_map = { k: v for k, v in _headerListToMap( resp.headers ).items() if k in ( 'Position', 'Count', 'Total', 'Type', 'Multi-Object', 'Object-Id', 'Verb' ) }
+      header_map = { k: v for k, v in _headerListToMap( resp.headers ).items() if k in ( 'Position', 'Count', 'Total', 'Cursor', 'Type', 'Multi-Object', 'Object-Id', 'Verb', 'ETag' ) }
 
     except httpcore.ProtocolError as e:
       raise ResponseError( 'ProtocolError "{0}"'.format( e ) )
@@ -297,7 +322,7 @@ class CInP():
         data[ 'message' ]
         e = DetailedInvalidRequest( data )
       except ( KeyError, ValueError, TypeError ):
-        e = InvalidRequest( buff[ 0:200 ] )
+        e = InvalidRequest( _preview( buff ) )
 
       logging.warning( 'cinp: Invalid Request "{0}"'.format( e.args[0] ) )
       raise e
@@ -313,7 +338,7 @@ class CInP():
             message = data
 
       else:
-        message = 'Server Error: "{0}"'.format( buff[ 0:200 ] )
+        message = 'Server Error: "{0}"'.format( _preview( buff ) )
 
       logging.error( 'cinp: {0}'.format( message ) )
       raise ServerError( message )
@@ -334,22 +359,53 @@ class CInP():
   async def describe( self, uri, timeout=30, retry_count=0 ):
     """
     DESCRIBE
+
+    responses are cached by ETag, subsequent DESCRIBEs of the same uri send
+    If-None-Match and re-use the cached value if the server answers 304.
+    NOTE: the returned data is shared with the cache, treat it as read only.
     """
+    header_map = {}
+    cached = self.describe_cache.get( uri, None )
+    if cached is not None:
+      header_map[ 'If-None-Match' ] = cached[0]
+
     logging.debug( 'cinp: DESCRIBE "{0}"'.format( uri ) )
-    ( http_code, data, header_map ) = await self._request( 'DESCRIBE', uri, timeout=timeout, retry_count=retry_count )
+    ( http_code, data, header_map ) = await self._request( 'DESCRIBE', uri, header_map=header_map, timeout=timeout, retry_count=retry_count )
+
+    if http_code == 304 and cached is not None:
+      return cached[1], cached[2]
 
     if http_code != 200:
       logging.warning( 'cinp: Unexpected HTTP Code "{0}" for DESCRIBE'.format( http_code ) )
       raise ResponseError( 'Unexpected HTTP Code "{0}" for DESCRIBE'.format( http_code ) )
 
     try:
-      return data, header_map[ 'Type' ]
+      type = header_map[ 'Type' ]
     except KeyError:
       raise ResponseError( 'DESCRIBE Response did not specify the Type' )
 
-  async def list( self, uri, filter_name=None, filter_value_map=None, position=0, count=10, timeout=30, retry_count=0 ):
+    etag = header_map.get( 'ETag', None )
+    if etag is not None:
+      self.describe_cache[ uri ] = ( etag, data, type )
+    else:
+      self.describe_cache.pop( uri, None )
+
+    return data, type
+
+  async def list( self, uri, filter_name=None, filter_value_map=None, position=0, count=10, include_total=True, cursor=None, values=False, timeout=30, retry_count=0 ):
     """
     LIST
+
+    include_total — True for the exact total, False to skip counting, or 'Estimate' to
+                    allow the server to estimate it.  With False the total in the count
+                    map is None, unless the server sends one anyway.
+    cursor        — the 'cursor' from the previous page's count map, the server seeks
+                    to the page after it instead of skipping position rows.  The count
+                    map only has a 'cursor' if the server sent one, ie: it supports
+                    cursors for this LIST and there are more pages.
+    values        — ask for the records instead of the ids, the result is then a dict
+                    of uri -> record like a multi-object GET.  Servers that do not
+                    support it return the id list.
     """
     if filter_value_map is None:
       filter_value_map = {}
@@ -360,10 +416,22 @@ class CInP():
     if not isinstance( position, int ) or not isinstance( count, int ) or position < 0 or count < 0:
       raise InvalidRequest( 'position and count must be an int and greater than or equal 0' )
 
+    if include_total not in ( True, False, 'Estimate' ):
+      raise InvalidRequest( 'include_total must be True, False, or "Estimate"' )
+
     header_map = { 'Position': str( position ), 'Count': str( count ) }  # TODO set position and count to default to None, and don't send them if npt specified, rely on the server's defaults
     if filter_name is not None:
       header_map[ 'Filter' ] = filter_name
 
+    if include_total is not True:  # the server's default is to include the total
+      header_map[ 'Include-Total' ] = str( include_total )
+
+    if cursor is not None:
+      header_map[ 'Cursor' ] = cursor
+
+    if values:
+      header_map[ 'Values' ] = 'True'
+
     logging.debug( 'cinp: LIST "{0}" with filter "{1}"'.format( uri, filter_name ) )
     ( http_code, id_list, header_map ) = await self._request( 'LIST', uri, data=filter_value_map, header_map=header_map, timeout=timeout, retry_count=retry_count )
 
@@ -371,17 +439,20 @@ class CInP():
       logging.warning( 'cinp: Unexpected HTTP Code "{0}" for LIST'.format( http_code ) )
       raise ResponseError( 'Unexpected HTTP Code "{0}" for LIST'.format( http_code ) )
 
-    if not isinstance( id_list, list ):
+    if not isinstance( id_list, list ) and not ( values and isinstance( id_list, dict ) ):
       logging.warning( 'cinp: Response id_list must be a list for LIST' )
       raise ResponseError( 'Response id_list must be a list for LIST' )
 
-    count_map = { 'position': 0, 'count': 0, 'total': 0 }
+    count_map = { 'position': 0, 'count': 0, 'total': None if include_total is False else 0 }
     for item in ( 'Position', 'Count', 'Total' ):  # NOTE HTTP Headers typicaly are CamelCase, but we want lower case for our count dictionary
       try:
         count_map[ item.lower() ] = int( header_map[ item ] )
       except ( KeyError, ValueError ):
         pass
 
+    if 'Cursor' in header_map:
+      count_map[ 'cursor' ] = header_map[ 'Cursor' ]
+
     return ( id_list, count_map )
 
   async def get( self, uri, force_multi_mode=False, timeout=30, retry_count=0 ):
@@ -430,6 +501,28 @@ class CInP():
 
     return ( object_id, rec_values )
 
+  async def createMany( self, uri, values_list, timeout=30, retry_count=0 ):
+    """
+    CREATE more than one object in one request, the server creates all of them or none of them
+    the server limits how many, the same as "multi-uri-max" from DESCRIBE of a namespace
+    returns a list of ( object_id, rec_values ) in values_list order
+    """
+    if not isinstance( values_list, list ) or not values_list or not all( isinstance( values, dict ) for values in values_list ):
+      raise InvalidRequest( 'values_list must be a non empty list of dicts' )
+
+    logging.debug( 'cinp: CREATE "{0}" x {1}'.format( uri, len( values_list ) ) )
+    ( http_code, rec_values_map, header_map ) = await self._request( 'CREATE', uri, data=values_list, timeout=timeout, retry_count=retry_count )
+
+    if http_code != 201:
+      logging.warning( 'cinp: Unexpected HTTP Code "{0}" for CREATE'.format( http_code ) )
+      raise ResponseError( 'Unexpected HTTP Code "{0}" for CREATE'.format( http_code ) )
+
+    if not isinstance( rec_values_map, dict ) or len( rec_values_map ) != len( values_list ):
+      logging.warning( 'cinp: Response rec_values must be a dict with an entry for each created object for CREATE' )
+      raise ResponseError( 'Response rec_values must be a dict with an entry for each created object for CREATE' )
+
+    return list( rec_values_map.items() )
+
   async def update( self, uri, values, force_multi_mode=False, timeout=30, retry_count=0 ):
     """
     UPDATE
@@ -487,11 +580,13 @@ class CInP():
 
     return return_value
 
-  async def getMulti( self, uri, id_list=None, chunk_size=10, retry_count=0 ):
+  async def getMulti( self, uri, id_list=None, chunk_size=10, retry_count=0, concurrency=1, ordered=True ):
     """
     returns a generator that will iterate over the uri/id_list, retrieving from the server in chunk_size blocks
     each item is ( rec_id, rec_values )
     if uri is a list, id_list is ignored
+    concurrency is how many chunk GETs are kept in flight at once, at most that many chunks are buffered
+    if ordered is False, chunks are yielded as they arrive instead of in id_list order
     """
     if isinstance( uri, list ):
       id_list = []
@@ -511,36 +606,95 @@ class CInP():
 
     pos = 0
 
-    while pos < len( id_list ):
-      tmp_data = await self.get( self.uri.build( namespace, model, None, id_list[ pos: pos + chunk_size ] ), force_multi_mode=True, retry_count=retry_count )
-      pos += chunk_size
-      for key in tmp_data:
-        yield ( key, tmp_data[ key ] )
+    if concurrency <= 1:
+      while pos < len( id_list ):
+        tmp_data = await self.get( self.uri.build( namespace, model, None, id_list[ pos: pos + chunk_size ] ), force_multi_mode=True, retry_count=retry_count )
+        pos += chunk_size
+        for key in tmp_data:
+          yield ( key, tmp_data[ key ] )
+
+      return
+
+    pending_list = []  # in id_list order
+    try:
+      while pos < len( id_list ) or pending_list:
+        while pos < len( id_list ) and len( pending_list ) < concurrency:
+          pending_list.append( asyncio.ensure_future( self.get( self.uri.build( namespace, model, None, id_list[ pos: pos + chunk_size ] ), force_multi_mode=True, retry_count=retry_count ) ) )
+          pos += chunk_size
+
+        if ordered:
+          task = pending_list[0]
+        else:
+          ( done, _ ) = await asyncio.wait( pending_list, return_when=asyncio.FIRST_COMPLETED )
+          task = next( item for item in pending_list if item in done )  # the earliest finished chunk, so the order is stable if more than one is done
+
+        tmp_data = await task
+        pending_list.remove( task )
+        for key in tmp_data:
+          yield ( key, tmp_data[ key ] )
 
-  async def getFilteredObjects( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0 ):
+    finally:  # on error, or if the consumer stops early, don't leave requests running
+      for task in pending_list:
+        task.cancel()
+
+      if pending_list:
+        await asyncio.gather( *pending_list, return_exceptions=True )
+
+  async def getFilteredObjects( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0, concurrency=1 ):
     pos = 0
-    total = 1
-    while pos < total:
-      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, timeout=timeout, retry_count=retry_count )
+    cursor = None
+    while True:  # the total is not asked for, a short chunk is the last chunk
+      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, include_total=False, cursor=cursor, timeout=timeout, retry_count=retry_count )
       id_list = self.uri.extractIds( tmp_id_list )
       pos = count_map[ 'position' ] + count_map[ 'count' ]
-      total = count_map[ 'total' ]
+      cursor = count_map.get( 'cursor', None )  # use the cursor when the server offers one, deep pages are cheaper
 
-      async for item in self.getMulti( uri, id_list, get_chunk_size, retry_count=retry_count ):
+      async for item in self.getMulti( uri, id_list, get_chunk_size, retry_count=retry_count, concurrency=concurrency ):
         yield item
 
+      if _isLastChunk( count_map, pos, list_chunk_size ):
+        break
+
+  async def listObjects( self, uri, filter_name=None, filter_value_map=None, chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0, concurrency=1 ):
+    """
+    returns a generator that will iterate over the objects matching the filter, like
+    getFilteredObjects, each item is ( rec_id, rec_values ).  The records come back with
+    the LIST, chunk_size at a time.  If the server does not support returning records
+    with LIST, they are retrieved with getMulti in get_chunk_size blocks.
+    """
+    pos = 0
+    cursor = None
+    while True:
+      ( result, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=chunk_size, include_total=False, cursor=cursor, values=True, timeout=timeout, retry_count=retry_count )
+      pos = count_map[ 'position' ] + count_map[ 'count' ]
+      cursor = count_map.get( 'cursor', None )
+
+      if isinstance( result, dict ):
+        for key in result:
+          yield ( key, result[ key ] )
+
+      else:
+        async for item in self.getMulti( uri, self.uri.extractIds( result ), get_chunk_size, retry_count=retry_count, concurrency=concurrency ):
+          yield item
+
+      if _isLastChunk( count_map, pos, chunk_size ):
+        break
+
   async def getFilteredURIs( self, uri, filter_name=None, filter_value_map=None, list_chunk_size=100, get_chunk_size=10, timeout=30, retry_count=0 ):
     pos = 0
-    total = 1
-    while pos < total:
-      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, timeout=timeout, retry_count=retry_count )
+    cursor = None
+    while True:
+      ( tmp_id_list, count_map ) = await self.list( uri, filter_name=filter_name, filter_value_map=filter_value_map, position=pos, count=list_chunk_size, include_total=False, cursor=cursor, timeout=timeout, retry_count=retry_count )
       id_list = self.uri.extractIds( tmp_id_list )
       pos = count_map[ 'position' ] + count_map[ 'count' ]
-      total = count_map[ 'total' ]
+      cursor = count_map.get( 'cursor', None )
 
       while len( id_list ) > 0:
         yield id_list.pop( 0 )
 
+      if _isLastChunk( count_map, pos, list_chunk_size ):
+        break
+
   async def getFile( self, uri, target_dir='/tmp', file_object=None, cb=None, timeout=30 ):
     """
     Download a file from the server.
@@ -632,12 +786,18 @@ class CInP():
 
     return filename
 
-  async def uploadFile( self, uri, filepath, filename=None, cb=None, timeout=30 ):
+  async def uploadFile( self, uri, filepath, filename=None, cb=None, timeout=30, chunk_size=None, concurrency=4, session=None, retry_count=0 ):
     """
     filepath can be a string of the path name or a file object.  If a file object
     either specify the filename or make sure your file object exposes the attribute
     'name'.  Also if file object, must be opened in binary mode, ie: 'rb'
 
+    If chunk_size is specified, the file is uploaded in chunk_size pieces, concurrency
+    of them at a time, each with a checksum the server verifies, and the whole file's
+    checksum is verified when it is finalized.  If it fails, UploadIncomplete
+    is raised, pass it's session to resume the upload, only what the server does not
+    have is sent.  The server's file handler must support resumable uploads.
+
     NOTE: this is not a CInP function, but a convenience function for uploading large files.
     """
     uri_parser = URI( '/' )
@@ -663,9 +823,14 @@ class CInP():
     try:
       if isinstance( filepath, str ):
         opened_file = open( filepath, 'rb' )
-        file_reader = _readerWrapper( opened_file, cb )
+        reader = opened_file
       else:
-        file_reader = _readerWrapper( filepath, cb )
+        reader = filepath
+
+      if chunk_size is not None:  # cb is called as the chunks are sent, not as they are read
+        return await self._uploadChunked( uri_parser.build( namespace, model ), _readerWrapper( reader, None ), filename, cb, timeout, chunk_size, concurrency, session, retry_count )
+
+      file_reader = _readerWrapper( reader, cb )
 
       header_map = {
                      'Content-Disposition': 'inline; filename="{0}"'.format( filename ),
@@ -684,6 +849,96 @@ class CInP():
 
     return data[ 'uri' ]
 
+  async def _uploadChunk( self, uri, session, offset, buff, size, timeout, retry_count ):
+    header_map = {
+                   'Upload-Session': session,
+                   'Content-Range': 'bytes {0}-{1}/{2}'.format( offset, offset + len( buff ) - 1, size ),
+                   'Upload-Checksum': 'sha256 {0}'.format( hashlib.sha256( buff ).hexdigest() )
+                 }
+
+    ( http_code, _, _ ) = await self._request( 'UPLOADCHUNK', uri, data=buff, header_map=header_map, timeout=timeout, retry_count=retry_count )
+    if http_code != 200:
+      raise ResponseError( 'Unexpected HTTP Code "{0}" for File Upload Chunk'.format( http_code ) )
+
+    return len( buff )
+
+  async def _uploadChunked( self, uri, file_reader, filename, cb, timeout, chunk_size, concurrency, session, retry_count ):
+    size = len( file_reader )
+    if session is None:
+      header_map = { 'Upload-Length': str( size ), 'Content-Disposition': 'inline; filename="{0}"'.format( filename ) }
+      ( http_code, data, _ ) = await self._request( 'RAWPOST', uri, header_map=header_map, timeout=timeout, retry_count=retry_count )
+      if http_code != 201:
+        raise ResponseError( 'Unexpected HTTP Code "{0}" for File Upload Session'.format( http_code ) )
+
+      session = data[ 'session' ]
+      range_list = []
+
+    else:
+      ( http_code, data, _ ) = await self._request( 'RAWGET', uri, header_map={ 'Upload-Session': session }, timeout=timeout, retry_count=retry_count )
+      if http_code != 200:
+        raise ResponseError( 'Unexpected HTTP Code "{0}" for File Upload Session "{1}"'.format( http_code, session ) )
+
+      if data[ 'size' ] != size:
+        raise InvalidRequest( 'Upload session is for "{0}" bytes, the file is "{1}" bytes'.format( data[ 'size' ], size ) )
+
+      range_list = data[ 'range_list' ]
+
+    logging.debug( 'cinp: uploading "{0}" bytes to session "{1}"'.format( size, session ) )
+
+    hasher = hashlib.sha256()
+    sent = sum( end - start for ( start, end ) in range_list )
+    pending_list = []
+
+    async def _wait():
+      nonlocal sent
+      ( done, _ ) = await asyncio.wait( pending_list, return_when=asyncio.FIRST_COMPLETED )
+      for task in done:
+        pending_list.remove( task )
+        sent += await task
+        if cb:
+          try:
+            cb( sent, size )
+          except Exception:  # this is just informational, if it is throwing stuff, just ignore it.
+            pass
+
+    try:
+      for offset in range( 0, size, chunk_size ):
+        buff = file_reader.read( min( chunk_size, size - offset ) )  # read in order, so the whole file checksum can be done along the way
+        if len( buff ) != min( chunk_size, size - offset ):
+          raise InvalidRequest( 'File changed size while uploading' )
+
+        hasher.update( buff )
+        if any( start <= offset and offset + len( buff ) <= end for ( start, end ) in range_list ):  # the server already has it
+          continue
+
+        while len( pending_list ) >= concurrency:
+          await _wait()
+
+        pending_list.append( asyncio.ensure_future( self._uploadChunk( uri, session, offset, buff, size, timeout, retry_count ) ) )
+
+      while pending_list:
+        await _wait()
+
+      header_map = { 'Upload-Session': session, 'Upload-Checksum': 'sha256 {0}'.format( hasher.hexdigest() ) }
+      ( http_code, data, _ ) = await self._request( 'RAWPOST', uri, header_map=header_map, timeout=timeout, retry_count=retry_count )
+
+    except ( ResponseError, InvalidRequest, ServerError, Timeout, RequestAborted ) as e:
+      logging.warning( 'cinp: File Upload session "{0}" incomplete: {1}'.format( session, e ) )
+      raise UploadIncomplete( 'File Upload session "{0}" incomplete: {1}'.format( session, e ), session ) from e
+
+    finally:  # on error, don't leave chunks uploading
+      for task in pending_list:
+        task.cancel()
+
+      if pending_list:
+        await asyncio.gather( *pending_list, return_exceptions=True )
+
+    if http_code != 202:
+      logging.warning( 'cinp: Unexpected HTTP Code "{0}" for File Upload'.format( http_code ) )
+      raise ResponseError( 'Unexpected HTTP Code "{0}" for File Upload'.format( http_code ) )
+
+    return data[ 'uri' ]
+
 
 class _readerWrapper():
   def __init__( self, reader, cb ):
@@ -699,11 +954,3 @@ class _readerWrapper():
       self._cb( self._reader.tell(), self._size )
     buff = self._reader.read( size )
     return buff
-
-
-class JSONEncoder( json.JSONEncoder ):
-  def default( self, obj ):
-    if isinstance( obj, datetime ):
-      return obj.isoformat()
-
-    return super().default( obj )
@@ -1,11 +1,27 @@
+import os
+import json
 import pytest
+import asyncio
+from io import BytesIO
 
-from cinp.client import CInP, ResponseError, InvalidRequest, DetailedInvalidRequest, InvalidSession, NotAuthorized, NotFound, ServerError
+from cinp import json_codec, django_file_handler
+from cinp.server_common import Request
+from cinp.client import __CLIENT_VERSION__, CInP, ResponseError, InvalidRequest, DetailedInvalidRequest, InvalidSession, NotAuthorized, NotFound, ServerError, UploadIncomplete
 
 # TODO: test timeout value  passthrough
 # TODO: test setting proxy, also make sure the environment proxy settings are handdled correctly
 
 
+@pytest.fixture( autouse=True )
+def stdlib_json():  # the expected bodies are in the stdlib's formatting
+  json_codec.setCodec( 'json' )
+  yield
+  json_codec.setCodec()
+
+
+USER_AGENT = ( b'User-Agent', 'python CInP client {0}'.format( __CLIENT_VERSION__ ).encode( 'ascii' ) )
+
+
 class MockResponse():
   def __init__( self, code, header_map, data ):
     super().__init__()
@@ -557,6 +573,28 @@ async def test_list( mocker ):
     assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
     assert count_map == { 'position': 0, 'count': 2, 'total': 20 }
 
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, { 'Position': '0', 'Count': '2' }, '["/api/v1/model:123:","/api/v1/model:124:"]' )
+    ( items, count_map ) = await cinp.list( '/api/v1/model', include_total=False )
+    assert mocked_open.call_args.kwargs[ 'headers' ] == [USER_AGENT, (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'10'), (b'Include-Total', b'False'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert items == [ '/api/v1/model:123:', '/api/v1/model:124:' ]
+    assert count_map == { 'position': 0, 'count': 2, 'total': None }
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '2000' }, '["/api/v1/model:123:","/api/v1/model:124:"]' )
+    ( items, count_map ) = await cinp.list( '/api/v1/model', include_total='Estimate' )
+    assert ( b'Include-Total', b'Estimate' ) in mocked_open.call_args.kwargs[ 'headers' ]
+    assert count_map == { 'position': 0, 'count': 2, 'total': 2000 }
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, { 'Position': '10', 'Count': '2', 'Total': '2000', 'Cursor': 'xyz' }, '["/api/v1/model:123:","/api/v1/model:124:"]' )
+    ( items, count_map ) = await cinp.list( '/api/v1/model', position=10, cursor='abc' )
+    assert ( b'Cursor', b'abc' ) in mocked_open.call_args.kwargs[ 'headers' ]
+    assert count_map == { 'position': 10, 'count': 2, 'total': 2000, 'cursor': 'xyz' }
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.list( '/api/v1/model', include_total='Maybe' )
+
     with pytest.raises( InvalidRequest ):
       await cinp.list( '/api/v1/', filter_value_map='asdf' )
 
@@ -658,6 +696,41 @@ async def test_create( mocker ):
       await cinp.create( '/api/v1/model', { 'asdf': 'xcv' } )
 
 
+@pytest.mark.asyncio
+async def test_create_many( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 201, { 'Object-Id': '/api/v1/model:1:2:', 'Multi-Object': 'True' }, '{"/api/v1/model:1:": {"asdf": "a"}, "/api/v1/model:2:": {"asdf": "b"}}' )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMany( '/api/v1/model', [] )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMany( '/api/v1/model', { 'asdf': 'a' } )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMany( '/api/v1/model', [ { 'asdf': 'a' }, 'b' ] )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.createMany( '/api/v1/model:adsf:', [ { 'asdf': 'a' } ] )
+
+    mocked_open.reset_mock()
+    rec_values_list = await cinp.createMany( '/api/v1/model', [ { 'asdf': 'a' }, { 'asdf': 'b' } ] )
+    ( method, full_url ) = mocked_open.call_args.args
+    assert method == 'CREATE'
+    assert full_url == 'http://localhost:8080/api/v1/model'
+    assert mocked_open.call_args.kwargs[ 'content' ] == b'[{"asdf": "a"}, {"asdf": "b"}]'
+    assert rec_values_list == [ ( '/api/v1/model:1:', { 'asdf': 'a' } ), ( '/api/v1/model:2:', { 'asdf': 'b' } ) ]
+
+    mocked_open.return_value = MockResponse( 201, {}, '{"/api/v1/model:1:": {"asdf": "a"}}' )
+    with pytest.raises( ResponseError ):
+      await cinp.createMany( '/api/v1/model', [ { 'asdf': 'a' }, { 'asdf': 'b' } ] )
+
+    mocked_open.return_value = MockResponse( 200, {}, '{"/api/v1/model:1:": {"asdf": "a"}}' )
+    with pytest.raises( ResponseError ):
+      await cinp.createMany( '/api/v1/model', [ { 'asdf': 'a' } ] )
+
+
 @pytest.mark.asyncio
 async def test_update( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -886,6 +959,42 @@ async def test_describe( mocker ):
       await cinp.describe( '/api/v1/model' )
 
 
+@pytest.mark.asyncio
+async def test_describe_cache( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.return_value = MockResponse( 200, { 'Type': 'Model', 'ETag': '"abc"' }, '{"name": "model"}' )
+    data, type = await cinp.describe( '/api/v1/model' )
+    assert type == 'Model'
+    assert data == { 'name': 'model' }
+    assert ( b'If-None-Match', b'"abc"' ) not in mocked_open.call_args.kwargs[ 'headers' ]
+    assert cinp.describe_cache == { '/api/v1/model': ( '"abc"', { 'name': 'model' }, 'Model' ) }
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 304, { 'Type': 'Model', 'ETag': '"abc"' }, '' )
+    data, type = await cinp.describe( '/api/v1/model' )
+    assert type == 'Model'
+    assert data == { 'name': 'model' }
+    assert ( b'If-None-Match', b'"abc"' ) in mocked_open.call_args.kwargs[ 'headers' ]
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, { 'Type': 'Model', 'ETag': '"def"' }, '{"name": "changed"}' )
+    data, type = await cinp.describe( '/api/v1/model' )
+    assert data == { 'name': 'changed' }
+    assert ( b'If-None-Match', b'"abc"' ) in mocked_open.call_args.kwargs[ 'headers' ]
+    assert cinp.describe_cache == { '/api/v1/model': ( '"def"', { 'name': 'changed' }, 'Model' ) }
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 200, { 'Type': 'Model' }, '{"name": "changed"}' )
+    data, type = await cinp.describe( '/api/v1/model' )
+    assert cinp.describe_cache == {}
+
+    mocked_open.reset_mock()
+    mocked_open.return_value = MockResponse( 304, { 'Type': 'Model' }, '' )
+    with pytest.raises( ResponseError ):
+      await cinp.describe( '/api/v1/model' )
+
+
 @pytest.mark.asyncio
 async def test_setauth():
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
@@ -949,13 +1058,181 @@ async def test_get_multi( mocker ):
     assert method == 'GET'
 
 
+@pytest.mark.asyncio
+async def test_get_multi_concurrency( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    in_flight = { 'now': 0, 'max': 0 }
+    gate_map = {}  # keyed by the first id in the chunk, the request finishes when it is set
+    fail_set = set()
+    started = asyncio.Queue()  # the first id of each chunk, as its request starts
+    received = asyncio.Queue()  # the ids, as getMulti yields them
+
+    async def request( method, url, **kwargs ):
+      id_list = url.split( ':' )[ 3:-1 ]  # http, //localhost, 8080/api/v1/ns/model, ids..., ''
+      gate_map[ id_list[0] ] = asyncio.Event()
+      in_flight[ 'now' ] += 1
+      in_flight[ 'max' ] = max( in_flight[ 'max' ], in_flight[ 'now' ] )
+      started.put_nowait( id_list[0] )
+      try:
+        if id_list[0] in fail_set:
+          raise TypeError()
+
+        await gate_map[ id_list[0] ].wait()
+      finally:
+        in_flight[ 'now' ] -= 1
+
+      return MockResponse( 200, {}, '{{{0}}}'.format( ','.join( '"/api/v1/ns/model:{0}:":{{"id":"{0}"}}'.format( item ) for item in id_list ) ) )
+
+    async def collect( gen ):
+      result = []
+      async for item in gen:
+        result.append( item[0] )
+        received.put_nowait( item[0].split( ':' )[1] )
+
+      return result
+
+    async def next_started( count ):
+      return [ await started.get() for _ in range( 0, count ) ]
+
+    async def next_received( count ):
+      return [ await received.get() for _ in range( 0, count ) ]
+
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request', side_effect=request )
+    id_list = [ 'a', 'b', 'c', 'd', 'e', 'f', 'g' ]
+
+    consumer = asyncio.ensure_future( collect( cinp.getMulti( '/api/v1/ns/model', id_list, chunk_size=2, concurrency=2 ) ) )
+    assert await next_started( 2 ) == [ 'a', 'c' ]
+    gate_map[ 'c' ].set()  # done first, but is held until 'a' is yielded
+    gate_map[ 'a' ].set()
+    assert await next_received( 4 ) == [ 'a', 'b', 'c', 'd' ]
+    assert await next_started( 2 ) == [ 'e', 'g' ]  # only started as the others finished
+    gate_map[ 'g' ].set()
+    gate_map[ 'e' ].set()
+    assert await consumer == [ '/api/v1/ns/model:{0}:'.format( item ) for item in id_list ]
+    assert await next_received( 3 ) == [ 'e', 'f', 'g' ]
+    assert mocked_open.call_count == 4
+    assert in_flight[ 'max' ] == 2
+
+    in_flight[ 'max' ] = 0
+    consumer = asyncio.ensure_future( collect( cinp.getMulti( '/api/v1/ns/model', id_list, chunk_size=2, concurrency=10, ordered=False ) ) )
+    assert await next_started( 4 ) == [ 'a', 'c', 'e', 'g' ]
+    for ( first, count ) in ( ( 'g', 1 ), ( 'c', 2 ), ( 'e', 2 ), ( 'a', 2 ) ):  # yielded as they finish
+      gate_map[ first ].set()
+      assert ( await next_received( count ) )[0] == first
+
+    assert await consumer == [ '/api/v1/ns/model:{0}:'.format( item ) for item in ( 'g', 'c', 'd', 'e', 'f', 'a', 'b' ) ]
+    assert in_flight[ 'max' ] == 4
+
+    gen = cinp.getMulti( '/api/v1/ns/model', id_list, chunk_size=2, concurrency=3 )
+    first = asyncio.ensure_future( gen.__anext__() )
+    assert await next_started( 3 ) == [ 'a', 'c', 'e' ]
+    gate_map[ 'a' ].set()
+    assert ( await first )[0] == '/api/v1/ns/model:a:'
+    await gen.aclose()  # stopping early cancels what is still in flight
+    assert in_flight[ 'now' ] == 0
+
+    fail_set.add( 'c' )
+    consumer = asyncio.ensure_future( collect( cinp.getMulti( '/api/v1/ns/model', id_list, chunk_size=2, concurrency=3 ) ) )
+    assert await next_started( 3 ) == [ 'a', 'c', 'e' ]
+    gate_map[ 'a' ].set()
+    with pytest.raises( TypeError ):
+      await consumer
+
+    assert in_flight[ 'now' ] == 0
+    assert started.empty()  # nothing more was started after the error
+
+
+@pytest.mark.asyncio
+async def test_get_filtered_uris( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Position': '0', 'Count': '2' }, '["/api/v1/ns/model:a:","/api/v1/ns/model:b:"]' ),
+        MockResponse( 200, { 'Position': '2', 'Count': '2' }, '["/api/v1/ns/model:c:","/api/v1/ns/model:d:"]' ),
+        MockResponse( 200, { 'Position': '4', 'Count': '1' }, '["/api/v1/ns/model:e:"]' ),
+    ]
+
+    result = [ item async for item in cinp.getFilteredURIs( '/api/v1/ns/model', list_chunk_size=2 ) ]
+
+    assert result == [ 'a', 'b', 'c', 'd', 'e' ]
+    assert mocked_open.call_count == 3
+    for index, position in enumerate( ( b'0', b'2', b'4' ) ):
+      assert ( b'Position', position ) in mocked_open.call_args_list[ index ].kwargs[ 'headers' ]
+      assert ( b'Include-Total', b'False' ) in mocked_open.call_args_list[ index ].kwargs[ 'headers' ]
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Position': '0', 'Count': '2', 'Cursor': 'c1' }, '["/api/v1/ns/model:a:","/api/v1/ns/model:b:"]' ),
+        MockResponse( 200, { 'Position': '2', 'Count': '2', 'Cursor': 'c2' }, '["/api/v1/ns/model:c:","/api/v1/ns/model:d:"]' ),
+        MockResponse( 200, { 'Position': '4', 'Count': '0' }, '[]' ),
+    ]
+
+    result = [ item async for item in cinp.getFilteredURIs( '/api/v1/ns/model', list_chunk_size=2 ) ]
+
+    assert result == [ 'a', 'b', 'c', 'd' ]
+    assert mocked_open.call_count == 3
+    assert ( b'Cursor', b'c1' ) not in mocked_open.call_args_list[0].kwargs[ 'headers' ]
+    assert ( b'Cursor', b'c1' ) in mocked_open.call_args_list[1].kwargs[ 'headers' ]
+    assert ( b'Cursor', b'c2' ) in mocked_open.call_args_list[2].kwargs[ 'headers' ]
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '2' }, '["/api/v1/ns/model:a:","/api/v1/ns/model:b:"]' ),  # a server that sends the total anyway
+    ]
+
+    result = [ item async for item in cinp.getFilteredURIs( '/api/v1/ns/model', list_chunk_size=2 ) ]
+
+    assert result == [ 'a', 'b' ]
+    assert mocked_open.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_list_objects( mocker ):
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
+    mocked_open.side_effect = [
+        MockResponse( 200, { 'Position': '0', 'Count': '2', 'Cursor': 'c1' }, '{"/api/v1/ns/model:a:":{"key":"a"},"/api/v1/ns/model:b:":{"key":"b"}}' ),
+        MockResponse( 200, { 'Position': '2', 'Count': '1' }, '{"/api/v1/ns/model:c:":{"key":"c"}}' ),
+    ]
+
+    result = [ item async for item in cinp.listObjects( '/api/v1/ns/model', chunk_size=2 ) ]
+
+    assert result == [ ( '/api/v1/ns/model:a:', { 'key': 'a' } ), ( '/api/v1/ns/model:b:', { 'key': 'b' } ), ( '/api/v1/ns/model:c:', { 'key': 'c' } ) ]
+    assert mocked_open.call_count == 2
+    ( method, full_url ) = mocked_open.call_args_list[0].args
+    assert method == 'LIST'
+    assert full_url == 'http://localhost:8080/api/v1/ns/model'
+    assert mocked_open.call_args_list[0].kwargs[ 'headers' ] == [USER_AGENT, (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'2'), (b'Include-Total', b'False'), (b'Values', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert ( b'Cursor', b'c1' ) in mocked_open.call_args_list[1].kwargs[ 'headers' ]
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = [  # a server that ignores Values
+        MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '2' }, '["/api/v1/ns/model:a:","/api/v1/ns/model:b:"]' ),
+        MockResponse( 200, {}, '{"/api/v1/ns/model:a:":{"key":"a"},"/api/v1/ns/model:b:":{"key":"b"}}' ),
+    ]
+
+    result = [ item async for item in cinp.listObjects( '/api/v1/ns/model', chunk_size=2 ) ]
+
+    assert result == [ ( '/api/v1/ns/model:a:', { 'key': 'a' } ), ( '/api/v1/ns/model:b:', { 'key': 'b' } ) ]
+    assert mocked_open.call_count == 2
+    ( method, full_url ) = mocked_open.call_args_list[1].args
+    assert method == 'GET'
+    assert full_url == 'http://localhost:8080/api/v1/ns/model:a:b:'
+
+    mocked_open.reset_mock()
+    mocked_open.side_effect = None
+    mocked_open.return_value = MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '20' }, '{"/api/v1/ns/model:a:":{"key":"a"}}' )
+    with pytest.raises( ResponseError ):
+      await cinp.list( '/api/v1/ns/model' )  # records are only expected when asked for
+
+
 @pytest.mark.asyncio
 async def test_get_filtered_objects( mocker ):
   async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
     mocked_open = mocker.patch.object( cinp.connection_pool, 'request' )
     mocked_open.side_effect = [
-      MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '2' }, '["/api/v1/ns/model:asd:","/api/v1/ns/model:efe:"]' ),
-      MockResponse( 200, {}, '{"/api/v1/ns/model:asd:":{"key1":"value1"},"/api/v1/ns/model:efe:":{"key2":"value2"}}' ),
+        MockResponse( 200, { 'Position': '0', 'Count': '2', 'Total': '2' }, '["/api/v1/ns/model:asd:","/api/v1/ns/model:efe:"]' ),
+        MockResponse( 200, {}, '{"/api/v1/ns/model:asd:":{"key1":"value1"},"/api/v1/ns/model:efe:":{"key2":"value2"}}' ),
     ]
 
     result = sorted( [ item async for item in cinp.getFilteredObjects( '/api/v1/ns/model' ) ] )
@@ -967,10 +1244,103 @@ async def test_get_filtered_objects( mocker ):
     assert method == 'LIST'
     assert full_url == 'http://localhost:8080/api/v1/ns/model'
     assert mocked_open.call_args_list[0].kwargs[ 'content' ] == b'{}'
-    assert mocked_open.call_args_list[0].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'100'), (b'Content-Type', b'application/json;charset=utf-8')]
+    assert mocked_open.call_args_list[0].kwargs[ 'headers' ] == [USER_AGENT, (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Position', b'0'), (b'Count', b'100'), (b'Include-Total', b'False'), (b'Content-Type', b'application/json;charset=utf-8')]
 
     ( method, full_url ) = mocked_open.call_args_list[1].args
     assert method == 'GET'
     assert full_url == 'http://localhost:8080/api/v1/ns/model:asd:efe:'
     assert mocked_open.call_args_list[1].kwargs[ 'content' ] == b''
     assert mocked_open.call_args_list[1].kwargs[ 'headers' ] == [(b'User-Agent', b'python CInP client 2.0.0'), (b'Accepts', b'application/json'), (b'Accept-Charset', b'utf-8'), (b'CInP-Version', b'2.0'), (b'Multi-Object', b'True'), (b'Content-Type', b'application/json;charset=utf-8')]
+
+
+class UploadRequest( Request ):
+  def __init__( self, verb, header_list, content ):
+    super().__init__( verb=verb, uri='/api/v1/ns/upload', header_map=dict( ( k.decode( 'ascii' ).upper(), v.decode( 'ascii' ) ) for k, v in header_list ), cookie_map={} )
+    self.stream = BytesIO( content or b'' )
+
+  def readinto( self, buff ):
+    return self.stream.readinto( buff )
+
+
+@pytest.mark.asyncio
+async def test_upload_file_chunked( mocker, tmp_path, monkeypatch ):
+  monkeypatch.setattr( django_file_handler, 'FILE_STORAGE', str( tmp_path / 'storage' ) )
+  data = os.urandom( 10000 )
+  filepath = str( tmp_path / 'image.bin' )
+  open( filepath, 'wb' ).write( data )
+
+  in_flight = { 'now': 0, 'max': 0 }
+  range_list = []
+  corrupt_list = []
+
+  async def request( method, url, content, headers, **kwargs ):  # the real file handler on the other end
+    assert url == 'http://localhost:8080/api/v1/ns/upload'
+    header_map = dict( headers )
+    if method == 'PUT':
+      range_list.append( header_map[ b'Content-Range' ].decode() )
+      if range_list[-1] in corrupt_list:
+        corrupt_list.remove( range_list[-1] )
+        content = b'x' * len( content )
+
+    in_flight[ 'now' ] += 1
+    in_flight[ 'max' ] = max( in_flight[ 'max' ], in_flight[ 'now' ] )
+    try:
+      await asyncio.sleep( 0.01 )
+    finally:
+      in_flight[ 'now' ] -= 1
+
+    response = django_file_handler.upload_handler( UploadRequest( method, headers, content ) )
+    return MockResponse( response.http_code, {}, json.dumps( response.data ) )
+
+  progress_list = []
+
+  async with CInP( 'http://localhost:8080', '/api/v1/', None ) as cinp:
+    mocker.patch.object( cinp.connection_pool, 'request', side_effect=request )
+
+    uri = await cinp.uploadFile( '/api/v1/ns/upload', filepath, cb=lambda done, size: progress_list.append( ( done, size ) ), chunk_size=1000, concurrency=3 )
+    ( reader, filename ) = django_file_handler.djfh( uri )
+    with reader:
+      assert ( reader.read(), filename ) == ( data, 'image.bin' )
+
+    assert sorted( range_list ) == sorted( 'bytes {0}-{1}/10000'.format( i, i + 999 ) for i in range( 0, 10000, 1000 ) )
+    assert in_flight[ 'max' ] == 3
+    assert progress_list[-1] == ( 10000, 10000 )
+
+    range_list.clear()
+    corrupt_list.append( 'bytes 4000-4999/10000' )
+    with open( filepath, 'rb' ) as reader:
+      with pytest.raises( UploadIncomplete ) as info:
+        await cinp.uploadFile( '/api/v1/ns/upload', reader, filename='other.bin', chunk_size=1000, concurrency=2 )
+
+    session = info.value.session
+    assert isinstance( info.value.__cause__, DetailedInvalidRequest )  # the server checked the chunk
+    with pytest.raises( ValueError ):
+      django_file_handler.djfh( 'djfh://{0}'.format( session ) )  # not done yet
+
+    committed_list = django_file_handler._updateMeta( session, django_file_handler._sessionStatus )[ 'range_list' ]
+    assert [ 4000, 5000 ] not in committed_list
+
+    open( filepath + '.short', 'wb' ).write( data[ :5000 ] )
+    with pytest.raises( InvalidRequest ):
+      await cinp.uploadFile( '/api/v1/ns/upload', filepath + '.short', chunk_size=1000, session=session )  # not the same file
+
+    range_list.clear()
+    uri = await cinp.uploadFile( '/api/v1/ns/upload', filepath, chunk_size=1000, session=session )  # resume, only what is missing is sent
+    assert uri == 'djfh://{0}'.format( session )
+    ( reader, filename ) = django_file_handler.djfh( uri )
+    with reader:
+      assert ( reader.read(), filename ) == ( data, 'other.bin' )
+
+    assert 'bytes 4000-4999/10000' in range_list
+    for content_range in range_list:
+      ( start, end ) = [ int( i ) for i in content_range[ 6:-6 ].split( '-' ) ]
+      assert not any( i[0] <= start and end < i[1] for i in committed_list )
+
+    assert len( range_list ) == 10 - sum( ( i[1] - i[0] ) // 1000 for i in committed_list )
+
+    with pytest.raises( InvalidRequest ):
+      await cinp.uploadFile( '/api/v1/ns/upload', filepath, chunk_size=1000, session=session )  # it's been finalized
+
+    mocker.patch.object( cinp.connection_pool, 'request', return_value=MockResponse( 202, {}, '{}' ) )
+    with pytest.raises( ResponseError ):
+      await cinp.uploadFile( '/api/v1/ns/upload', filepath, chunk_size=1000, session=session )  # the status is only good with a 200
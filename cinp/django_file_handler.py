@@ -1,4 +1,8 @@
 import os
+import time
+import fcntl
+import hashlib
+import logging
 import tempfile
 import json
 import re
@@ -10,7 +14,10 @@ from cinp.readers import READER_REGISTRY
 FILE_STORAGE = '/tmp/django_file_handler/'
 FILE_TTL = timedelta( hours=2 )
 CHUNK_SIZE = 4096 * 1024
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024 * 1024  # the largest Upload-Length a resumable upload can ask for, the file is allocated to that size up front
 INLINE_CONTENT_DISPOSITION = re.compile( r'^inline; filename="([a-zA-Z0-9_\-\. ]+)"$' )
+CONTENT_RANGE = re.compile( r'^bytes ([0-9]+)-([0-9]+)/([0-9]+)$' )
+CHECKSUM_ALGORITHM = 'sha256'  # for the Upload-Checksum header, ie: "sha256 <hex digest>"
 
 
 def cleaner():  # .meta files are created at the same time, so they should clean up at the same time
@@ -38,6 +45,9 @@ def _localFileReader( refname ):
   except ( json.JSONDecodeError, FileNotFoundError ):
     raise ValueError( 'Invalid refname' )
 
+  if 'range_list' in meta:  # an upload session that has not been finalized
+    raise ValueError( 'Invalid refname' )
+
   try:
     reader = open( filepath, 'rb' )
   except FileNotFoundError:
@@ -49,18 +59,181 @@ def _localFileReader( refname ):
     raise ValueError( 'Invalid refname' )
 
 
-def _localFileWriter( original_filename ):
+def _localFileWriter( original_filename, session_size=None ):  # if session_size is specified, it is the start of a resumable upload of that size
   if not os.path.exists( FILE_STORAGE ):
     os.makedirs( FILE_STORAGE, mode=0o700 )
 
   writer = tempfile.NamedTemporaryFile( mode='wb', prefix='', dir=FILE_STORAGE, delete=False )
   filename = writer.name
 
-  open( '{0}.meta'.format( filename ), 'w' ).write( json.dumps( { 'filename': original_filename } ) )
+  meta = { 'filename': original_filename }
+  if session_size is not None:
+    writer.truncate( session_size )  # the chunks can arrive in any order
+    meta[ 'size' ] = session_size
+    meta[ 'range_list' ] = []  # [ start, end ) of what has been written
+
+  open( '{0}.meta'.format( filename ), 'w' ).write( json.dumps( meta ) )
 
   return ( writer, os.path.basename( filename ) )
 
 
+def _updateMeta( refname, func ):  # the chunks can be written by different processes at the same time, the .meta is locked while func looks at/updates it
+  if refname is None or not re.match( '^[a-z0-9_]+$', refname ):
+    raise InvalidRequest( 'Invalid Upload-Session' )
+
+  try:
+    meta_file = open( os.path.join( FILE_STORAGE, '{0}.meta'.format( refname ) ), 'r+' )
+  except FileNotFoundError:
+    raise InvalidRequest( 'Invalid Upload-Session' )
+
+  with meta_file:
+    fcntl.flock( meta_file, fcntl.LOCK_EX )
+    buff = meta_file.read()
+    try:
+      meta = json.loads( buff )
+    except json.JSONDecodeError:
+      raise InvalidRequest( 'Invalid Upload-Session' )
+
+    if 'range_list' not in meta:
+      raise InvalidRequest( 'Upload-Session is finalized' )
+
+    result = func( meta )
+
+    if json.dumps( meta ) != buff:  # also keeps the cleaner from removing sessions that are still being written to
+      meta_file.seek( 0 )
+      meta_file.truncate()
+      meta_file.write( json.dumps( meta ) )
+
+  return result
+
+
+def _addRange( range_list, start, end ):  # returns the sorted, merged list
+  result = []
+  for ( range_start, range_end ) in sorted( range_list + [ [ start, end ] ] ):
+    if result and range_start <= result[-1][1]:
+      result[-1][1] = max( result[-1][1], range_end )
+    else:
+      result.append( [ range_start, range_end ] )
+
+  return result
+
+
+def _sessionStatus( meta ):  # offset is how much has been written with out gaps
+  range_list = meta[ 'range_list' ]
+  if range_list and range_list[0][0] == 0:
+    offset = range_list[0][1]
+  else:
+    offset = 0
+
+  return { 'size': meta[ 'size' ], 'offset': offset, 'range_list': range_list }
+
+
+def _requestChecksum( request ):  # the hex digest from the Upload-Checksum header, None if it was not sent
+  value = request.header_map.get( 'UPLOAD-CHECKSUM', None )
+  if value is None:
+    return None
+
+  try:
+    ( algorithm, digest ) = value.split( ' ' )
+  except ValueError:
+    raise InvalidRequest( 'Invalid Upload-Checksum' )
+
+  if algorithm != CHECKSUM_ALGORITHM:
+    raise InvalidRequest( 'Upload-Checksum algorithm must be "{0}"'.format( CHECKSUM_ALGORITHM ) )
+
+  return digest.lower()
+
+
+def _fileChecksum( reader, offset, size ):  # checks what actually made it to disk
+  hasher = hashlib.new( CHECKSUM_ALGORITHM )
+  buff = memoryview( bytearray( max( min( CHUNK_SIZE, size ), 1 ) ) )
+  reader.seek( offset )
+  while size:
+    count = reader.readinto( buff[ :min( len( buff ), size ) ] )
+    if not count:
+      break
+
+    hasher.update( buff[ :count ] )
+    size -= count
+
+  return hasher.hexdigest()
+
+
+def _kernelCopy( source_fd, offset, size, target_fd ):  # returns the number of bytes copied, None if the kernel can't copy between these
+  copied = 0
+  use_copy_file_range = hasattr( os, 'copy_file_range' )
+  while copied < size:
+    try:
+      if use_copy_file_range:
+        count = os.copy_file_range( source_fd, target_fd, size - copied, offset + copied )
+      else:
+        count = os.sendfile( target_fd, source_fd, offset + copied, size - copied )
+
+    except OSError:  # not supported by the kernel/file system, ie: EXDEV, ENOSYS, EINVAL
+      if copied:
+        raise
+
+      if use_copy_file_range:
+        use_copy_file_range = False
+        continue
+
+      return None
+
+    if not count:  # the file is shorter than it should be
+      break
+
+    copied += count
+
+  return copied
+
+
+def _bufferedCopy( request, target_fd, size=None ):  # readinto one buffer, and write straight to the fd, no bytes objects, no python level file buffering
+  buff = memoryview( bytearray( CHUNK_SIZE ) )
+  copied = 0
+  while size is None or copied < size:
+    if size is None:
+      count = request.readinto( buff )
+    else:
+      count = request.readinto( buff[ :min( CHUNK_SIZE, size - copied ) ] )
+
+    if not count:
+      break
+
+    view = buff[ :count ]
+    while view:
+      view = view[ os.write( target_fd, view ): ]
+
+    copied += count
+
+  if size is not None and copied == size and request.readinto( bytearray( 1 ) ):  # there is more than there should be
+    copied += 1
+
+  return copied
+
+
+def _copyBody( request, file_writer, size=None ):  # returns ( bytes copied, method used ), if size is specified, the body must be exactly that size
+  target_fd = file_writer.fileno()
+  body_file = getattr( request, 'body_file', None )
+  copied = None
+  if body_file is not None and size in ( None, body_file[2] ):  # the server has the body in a regular file, hand the fd to the kernel
+    ( source, offset, length ) = body_file
+    copied = _kernelCopy( source.fileno(), offset, length, target_fd )
+    if copied is not None:
+      source.seek( offset + copied )  # as if it was read
+      method = 'kernel'
+      if copied != length:  # the spooled body is shorter than the Content-Length, ie: the client went away part way through
+        raise InvalidRequest( 'Request body is "{0}" bytes, expected "{1}"'.format( copied, length ) )
+
+  if copied is None:
+    copied = _bufferedCopy( request, target_fd, size )
+    method = 'buffered'
+
+  if size is not None and copied != size:
+    raise InvalidRequest( 'Request body is "{0}" bytes, expected "{1}"'.format( copied, size ) )
+
+  return ( copied, method )
+
+
 def djfh( uri ):
   reader, filename = _localFileReader( uri[ len( 'djfh://' ): ] )
   return ( reader, filename )
@@ -75,39 +248,148 @@ def upload_view( django_request ):
   pass
 
 
+def _filename( request ):
+  content_disposition = request.header_map.get( 'CONTENT-DISPOSITION', None )
+  if content_disposition is None:
+    return None
+
+  match = INLINE_CONTENT_DISPOSITION.match( content_disposition )
+  if not match:
+    raise InvalidRequest( message='Invalid Content-Disposition' )
+
+  return match.groups()[0]
+
+
+def _sessionCreate( request ):
+  try:
+    size = int( request.header_map[ 'UPLOAD-LENGTH' ] )
+  except ValueError:
+    raise InvalidRequest( 'Invalid Upload-Length' )
+
+  if size < 0:
+    raise InvalidRequest( 'Invalid Upload-Length' )
+
+  if size > MAX_UPLOAD_SIZE:
+    raise InvalidRequest( 'Upload-Length "{0}" is more than the max of "{1}" bytes'.format( size, MAX_UPLOAD_SIZE ) )
+
+  file_writer, refname = _localFileWriter( _filename( request ), session_size=size )
+  file_writer.close()
+
+  return Response( 201, data={ 'session': refname, 'size': size } )
+
+
+def _sessionWrite( request, refname ):
+  match = CONTENT_RANGE.match( request.header_map.get( 'CONTENT-RANGE', '' ) )
+  if not match:
+    raise InvalidRequest( 'Invalid Content-Range' )
+
+  ( start, end, total ) = [ int( i ) for i in match.groups() ]
+  end += 1  # Content-Range's end is inclusive
+
+  size = _updateMeta( refname, lambda meta: meta[ 'size' ] )
+  if total != size or start >= end or end > size:
+    raise InvalidRequest( 'Content-Range "{0}" does not fit in the upload of "{1}" bytes'.format( request.header_map[ 'CONTENT-RANGE' ], size ) )
+
+  checksum = _requestChecksum( request )
+
+  # chunks do not overlap, so they can be written at the same time with out locking
+  with open( os.path.join( FILE_STORAGE, refname ), 'r+b', buffering=0 ) as file_writer:
+    file_writer.seek( start )
+    _copyBody( request, file_writer, end - start )
+
+    if checksum is not None and _fileChecksum( file_writer, start, end - start ) != checksum:
+      raise InvalidRequest( 'Upload-Checksum mismatch for Content-Range "{0}"'.format( request.header_map[ 'CONTENT-RANGE' ] ) )
+
+  def _commit( meta ):
+    meta[ 'range_list' ] = _addRange( meta[ 'range_list' ], start, end )
+    return _sessionStatus( meta )
+
+  return Response( 200, data=_updateMeta( refname, _commit ) )
+
+
+def _sessionFinalize( request, refname ):
+  checksum = _requestChecksum( request )
+
+  def _finalize( meta ):
+    status = _sessionStatus( meta )
+    if status[ 'offset' ] != meta[ 'size' ]:
+      raise InvalidRequest( data={ 'message': 'Upload is incomplete', 'status': status } )
+
+    if checksum is not None:
+      with open( os.path.join( FILE_STORAGE, refname ), 'rb' ) as reader:
+        if _fileChecksum( reader, 0, meta[ 'size' ] ) != checksum:
+          raise InvalidRequest( 'Upload-Checksum mismatch' )
+
+    del meta[ 'size' ]
+    del meta[ 'range_list' ]  # now _localFileReader will accept it
+
+  _updateMeta( refname, _finalize )
+
+  return Response( 202, data={ 'uri': 'djfh://{0}'.format( refname ) } )
+
+
 # for gunicorn apps
+# POST with an application/octet-stream body, uploads the whole file at once, or
+# resumable, in chunks:
+#   POST with the Upload-Length header -> 201 { 'session': <id> }
+#   PUT with the Upload-Session and Content-Range headers, and the chunk as the body -> 200 <status>
+#   GET with the Upload-Session header -> 200 <status>, status is { 'size':, 'offset':, 'range_list': }
+#   POST with the Upload-Session header -> 202 { 'uri': 'djfh://...' }
+# the chunk PUTs and final POST can include a "Upload-Checksum: sha256 <hex digest>" header
 def upload_handler( request ):  # TODO: also support multi-part
   if request.verb == 'OPTIONS':
     header_map = {}
-    header_map[ 'Allow' ] = 'OPTIONS, POST'
+    header_map[ 'Allow' ] = 'OPTIONS, GET, POST, PUT'
     header_map[ 'Cache-Control' ] = 'max-age=0'
     header_map[ 'Access-Control-Allow-Methods' ] = header_map[ 'Allow' ]
-    header_map[ 'Access-Control-Allow-Headers' ] = 'Accept, Content-Type, Content-Disposition'
+    header_map[ 'Access-Control-Allow-Headers' ] = 'Accept, Content-Type, Content-Disposition, Content-Range, Upload-Length, Upload-Session, Upload-Checksum'
 
     return Response( 200, data=None, header_map=header_map )
 
-  if request.verb != 'POST':
-    return Response( 400, data='Invalid Verb (HTTP Method)', content_type='text' )
+  session = request.header_map.get( 'UPLOAD-SESSION', None )
+  try:
+    if request.verb == 'GET' and session is not None:
+      return Response( 200, data=_updateMeta( session, _sessionStatus ) )
 
-  if request.header_map.get( 'CONTENT-TYPE', None ) != 'application/octet-stream':
-    return Response( 400, data='Invalid Content-Type', content_type='text' )
+    if request.verb == 'PUT':
+      if request.header_map.get( 'CONTENT-TYPE', None ) != 'application/octet-stream':
+        return Response( 400, data='Invalid Content-Type', content_type='text' )
 
-  content_disposition = request.header_map.get( 'CONTENT-DISPOSITION', None )
-  if content_disposition is not None:
-    match = INLINE_CONTENT_DISPOSITION.match( content_disposition )
-    if not match:
-      return InvalidRequest( message='Invalid Content-Disposition' ).asResponse()
-    filename = match.groups()[0]
-  else:
-    filename = None
+      return _sessionWrite( request, session )
 
-  file_writer, refname = _localFileWriter( filename )
+    if request.verb != 'POST':
+      return Response( 400, data='Invalid Verb (HTTP Method)', content_type='text' )
 
-  buff = request.read( CHUNK_SIZE )
-  while buff:
-    file_writer.write( buff )
-    buff = request.read( CHUNK_SIZE )
+    if session is not None:
+      return _sessionFinalize( request, session )
 
-  file_writer.close()
+    if 'UPLOAD-LENGTH' in request.header_map:
+      return _sessionCreate( request )
+
+    if request.header_map.get( 'CONTENT-TYPE', None ) != 'application/octet-stream':
+      return Response( 400, data='Invalid Content-Type', content_type='text' )
+
+    filename = _filename( request )
+
+  except InvalidRequest as e:
+    return e.asResponse()
+
+  file_writer, refname = _localFileWriter( filename )
+
+  start = time.monotonic()
+  try:
+    try:
+      ( size, method ) = _copyBody( request, file_writer )
+    finally:
+      file_writer.close()
+
+  except InvalidRequest as e:  # don't leave the partial file, its .meta says it is complete
+    filepath = os.path.join( FILE_STORAGE, refname )
+    os.unlink( '{0}.meta'.format( filepath ) )
+    os.unlink( filepath )
+    return e.asResponse()
+
+  elapsed = max( time.monotonic() - start, 0.000001 )
+  logging.info( 'djfh: received "{0}" {1} bytes in {2:.3f} seconds, {3:.1f} MiB/s ({4})'.format( refname, size, elapsed, size / elapsed / 1048576, method ) )
 
   return Response( 202, data={ 'uri': 'djfh://{0}'.format( refname ) } )
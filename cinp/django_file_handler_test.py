@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import socket
+import tempfile
+from io import BytesIO
+
+import pytest
+
+from cinp import django_file_handler
+from cinp.server_common import Request
+
+
+@pytest.fixture( autouse=True )
+def storage( tmp_path, monkeypatch ):
+  monkeypatch.setattr( django_file_handler, 'FILE_STORAGE', str( tmp_path ) )
+  yield tmp_path
+
+
+class UploadRequest( Request ):
+  def __init__( self, stream, header_map=None, verb='POST' ):
+    super().__init__( verb=verb, uri='/upload', header_map={ 'CONTENT-TYPE': 'application/octet-stream' }, cookie_map={} )
+    if header_map is not None:
+      self.header_map.update( header_map )
+
+    self.stream = stream
+    self.readinto_count = 0
+
+  def read( self, size ):
+    return self.stream.read( size )
+
+  def readinto( self, buff ):
+    self.readinto_count += 1
+    return self.stream.readinto( buff )
+
+
+def _stored( response ):
+  refname = response.data[ 'uri' ][ len( 'djfh://' ): ]
+  ( reader, filename ) = django_file_handler._localFileReader( refname )
+  with reader:
+    return ( reader.read(), filename )
+
+
+def test_upload_handler( monkeypatch ):
+  monkeypatch.setattr( django_file_handler, 'CHUNK_SIZE', 1000 )
+  data = os.urandom( 5500 )
+
+  req = UploadRequest( BytesIO( data ), { 'CONTENT-DISPOSITION': 'inline; filename="test.bin"' } )
+  response = django_file_handler.upload_handler( req )
+  assert response.http_code == 202
+  assert _stored( response ) == ( data, 'test.bin' )
+  assert req.readinto_count == 7  # 6 reads with data, and the one that hits the end
+
+  req = UploadRequest( BytesIO( b'' ) )
+  response = django_file_handler.upload_handler( req )
+  assert response.http_code == 202
+  assert _stored( response ) == ( b'', None )
+
+  ( sender, receiver ) = socket.socketpair()  # a socket's raw reader, recv_into goes straight into the buffer
+  sender.sendall( data )
+  sender.close()
+  with receiver, receiver.makefile( 'rb', buffering=0 ) as stream:
+    response = django_file_handler.upload_handler( UploadRequest( stream ) )
+
+  assert _stored( response ) == ( data, None )
+
+  assert django_file_handler.upload_handler( UploadRequest( BytesIO( data ), { 'CONTENT-TYPE': 'text/plain' } ) ).http_code == 400
+  assert django_file_handler.upload_handler( UploadRequest( BytesIO( data ), { 'CONTENT-DISPOSITION': 'attachment' } ) ).http_code == 400
+  assert django_file_handler.upload_handler( UploadRequest( BytesIO( data ), verb='PUT' ) ).http_code == 400
+  assert django_file_handler.upload_handler( UploadRequest( BytesIO( data ), verb='OPTIONS' ) ).http_code == 200
+
+
+def test_upload_handler_body_file( monkeypatch ):
+  data = os.urandom( 100000 )
+  with tempfile.TemporaryFile() as body:
+    body.write( b'headers' + data + b'trailer' )
+
+    req = UploadRequest( body )
+    req.body_file = ( body, 7, len( data ) )
+    response = django_file_handler.upload_handler( req )
+    assert _stored( response ) == ( data, None )
+    assert req.readinto_count == 0  # the kernel did it
+    assert body.tell() == 7 + len( data )
+
+    req = UploadRequest( body )
+    req.body_file = ( body, 7, len( data ) + 100 )  # the spooled body is cut short
+    response = django_file_handler.upload_handler( req )
+    assert response.http_code == 400
+    assert response.data == { 'message': 'Request body is "{0}" bytes, expected "{1}"'.format( len( data ) + 7, len( data ) + 100 ) }
+    assert len( os.listdir( django_file_handler.FILE_STORAGE ) ) == 2  # the one from before and its .meta, nothing is left from the short one
+
+    monkeypatch.delattr( os, 'copy_file_range', raising=False )  # falls back to sendfile
+    req = UploadRequest( body )
+    req.body_file = ( body, 7, len( data ) )
+    response = django_file_handler.upload_handler( req )
+    assert _stored( response ) == ( data, None )
+    assert req.readinto_count == 0
+
+    def no_sendfile( *args ):
+      raise OSError( 'not supported' )
+
+    monkeypatch.setattr( os, 'sendfile', no_sendfile )  # falls back to reading
+    body.seek( 7 )
+    req = UploadRequest( body )
+    req.body_file = ( body, 7, len( data ) )
+    response = django_file_handler.upload_handler( req )
+    assert _stored( response )[0] == data + b'trailer'  # it reads what ever the request stream has
+    assert req.readinto_count > 0
+
+
+def test_local_file():
+  ( writer, refname ) = django_file_handler._localFileWriter( 'thing.txt' )
+  writer.write( b'stuff' )
+  writer.close()
+
+  assert json.loads( open( os.path.join( django_file_handler.FILE_STORAGE, '{0}.meta'.format( refname ) ) ).read() ) == { 'filename': 'thing.txt' }
+  ( reader, filename ) = django_file_handler.djfh( 'djfh://{0}'.format( refname ) )
+  with reader:
+    assert ( reader.read(), filename ) == ( b'stuff', 'thing.txt' )
+
+  for refname in ( '../etc/passwd', 'nothere' ):
+    with pytest.raises( ValueError ):
+      django_file_handler._localFileReader( refname )
+
+
+def test_upload_session( monkeypatch ):
+  data = os.urandom( 3000 )
+
+  def _request( verb, header_map, body=b'' ):
+    return django_file_handler.upload_handler( UploadRequest( BytesIO( body ), header_map, verb=verb ) )
+
+  def _put( session, start, end, body=None, checksum=None ):
+    header_map = { 'UPLOAD-SESSION': session, 'CONTENT-RANGE': 'bytes {0}-{1}/3000'.format( start, end - 1 ) }
+    if checksum is not None:
+      header_map[ 'UPLOAD-CHECKSUM' ] = checksum
+
+    return _request( 'PUT', header_map, data[ start:end ] if body is None else body )
+
+  response = _request( 'POST', { 'UPLOAD-LENGTH': '3000', 'CONTENT-DISPOSITION': 'inline; filename="big.img"' } )
+  assert response.http_code == 201
+  session = response.data[ 'session' ]
+  assert response.data == { 'session': session, 'size': 3000 }
+
+  assert _request( 'GET', { 'UPLOAD-SESSION': session } ).data == { 'size': 3000, 'offset': 0, 'range_list': [] }
+  with pytest.raises( ValueError ):
+    django_file_handler.djfh( 'djfh://{0}'.format( session ) )
+
+  response = _put( session, 1000, 2000, checksum='sha256 {0}'.format( hashlib.sha256( data[ 1000:2000 ] ).hexdigest() ) )
+  assert response.http_code == 200
+  assert response.data == { 'size': 3000, 'offset': 0, 'range_list': [ [ 1000, 2000 ] ] }
+
+  assert _put( session, 0, 1000, checksum='sha256 {0}'.format( hashlib.sha256( b'other' ).hexdigest() ) ).http_code == 400  # not committed
+  assert _put( session, 0, 1000, checksum='md5 1234' ).http_code == 400
+  assert _put( session, 0, 1000, body=data[ 0:999 ] ).http_code == 400
+  assert _put( session, 0, 1000, body=data[ 0:1001 ] ).http_code == 400
+  assert _request( 'PUT', { 'UPLOAD-SESSION': session, 'CONTENT-RANGE': 'bytes 0-999/4000' }, data[ 0:1000 ] ).http_code == 400
+  assert _request( 'PUT', { 'UPLOAD-SESSION': session, 'CONTENT-RANGE': 'bytes 2000-3000/3000' }, data[ 2000:3000 ] + b'x' ).http_code == 400
+  assert _request( 'PUT', { 'UPLOAD-SESSION': session, 'CONTENT-RANGE': '0-999' }, data[ 0:1000 ] ).http_code == 400
+  assert _request( 'PUT', { 'UPLOAD-SESSION': 'nothere', 'CONTENT-RANGE': 'bytes 0-999/3000' }, data[ 0:1000 ] ).http_code == 400
+  assert _request( 'PUT', { 'UPLOAD-SESSION': '../' + session, 'CONTENT-RANGE': 'bytes 0-999/3000' }, data[ 0:1000 ] ).http_code == 400
+  assert _request( 'GET', { 'UPLOAD-SESSION': session } ).data[ 'range_list' ] == [ [ 1000, 2000 ] ]
+
+  response = _request( 'POST', { 'UPLOAD-SESSION': session } )
+  assert response.http_code == 400
+  assert response.data == { 'message': 'Upload is incomplete', 'status': { 'size': 3000, 'offset': 0, 'range_list': [ [ 1000, 2000 ] ] } }
+
+  assert _put( session, 2000, 3000 ).data == { 'size': 3000, 'offset': 0, 'range_list': [ [ 1000, 3000 ] ] }
+  assert _put( session, 0, 1500 ).data == { 'size': 3000, 'offset': 3000, 'range_list': [ [ 0, 3000 ] ] }  # overlapping is fine
+
+  assert _request( 'POST', { 'UPLOAD-SESSION': session, 'UPLOAD-CHECKSUM': 'sha256 {0}'.format( hashlib.sha256( b'other' ).hexdigest() ) } ).http_code == 400
+  response = _request( 'POST', { 'UPLOAD-SESSION': session, 'UPLOAD-CHECKSUM': 'sha256 {0}'.format( hashlib.sha256( data ).hexdigest().upper() ) } )
+  assert response.http_code == 202
+  assert response.data == { 'uri': 'djfh://{0}'.format( session ) }
+  assert _stored( response ) == ( data, 'big.img' )
+
+  assert _request( 'GET', { 'UPLOAD-SESSION': session } ).data == { 'message': 'Upload-Session is finalized' }
+  assert _put( session, 0, 1000 ).http_code == 400
+
+  response = _request( 'POST', { 'UPLOAD-LENGTH': '0' } )
+  response = _request( 'POST', { 'UPLOAD-SESSION': response.data[ 'session' ] } )
+  assert _stored( response ) == ( b'', None )
+
+  assert _request( 'POST', { 'UPLOAD-LENGTH': '-1' } ).http_code == 400
+  assert _request( 'POST', { 'UPLOAD-LENGTH': 'big' } ).http_code == 400
+  assert _request( 'POST', { 'UPLOAD-LENGTH': str( django_file_handler.MAX_UPLOAD_SIZE + 1 ) } ).http_code == 400
+  monkeypatch.setattr( django_file_handler, 'MAX_UPLOAD_SIZE', 2999 )
+  response = _request( 'POST', { 'UPLOAD-LENGTH': '3000' } )
+  assert response.http_code == 400
+  assert response.data == { 'message': 'Upload-Length "3000" is more than the max of "2999" bytes' }
+  assert _request( 'GET', {} ).http_code == 400
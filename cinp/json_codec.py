@@ -0,0 +1,190 @@
+import re
+import json
+import codecs
+from datetime import datetime
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import ujson
+except ImportError:
+  ujson = None
+
+# JSON encode/decode used by the server and client, the fastest installed
+# library is used, orjson then ujson, falling back to the stdlib json module.
+# dumps always returns bytes, loads takes bytes or str.  All the libraries
+# raise a subclass of ValueError on bad JSON, catch DecodeError.
+
+__all__ = [ 'dumps', 'loads', 'iterload', 'ArrayReader', 'DecodeError', 'setCodec', 'CODEC_LIST' ]
+
+CODEC_LIST = [ 'orjson', 'ujson', 'json' ]  # in order of preference
+
+DecodeError = ValueError
+
+CODEC = None
+dumps = None
+loads = None
+
+_WHITESPACE = re.compile( r'[ \t\n\r]*' )
+_DELIMITERS = ' \t\n\r,]'
+_DECODER = json.JSONDecoder()
+
+
+def _default( value ):
+  if isinstance( value, datetime ):
+    return value.isoformat()
+
+  raise TypeError( 'Object of type "{0}" is not JSON serializable'.format( type( value ).__name__ ) )
+
+
+def _json_dumps( value ):
+  return json.dumps( value, default=_default ).encode( 'utf-8' )
+
+
+def _json_loads( value ):
+  return json.loads( value )
+
+
+def _orjson_dumps( value ):
+  try:
+    return orjson.dumps( value, default=_default, option=orjson.OPT_NON_STR_KEYS )  # orjson handles datetime natively
+  except TypeError:  # orjson is stricter than the stdlib (ie: ints over 64 bits), let the stdlib have a go
+    return _json_dumps( value )
+
+
+def _ujson_dumps( value ):
+  try:
+    return ujson.dumps( value, default=_default, ensure_ascii=False, escape_forward_slashes=False ).encode( 'utf-8' )
+  except ( TypeError, OverflowError ):
+    return _json_dumps( value )
+
+
+_CODEC_MAP = {
+               'json': ( _json_dumps, _json_loads ),
+             }
+
+if orjson is not None:
+  _CODEC_MAP[ 'orjson' ] = ( _orjson_dumps, orjson.loads )
+
+if ujson is not None:
+  _CODEC_MAP[ 'ujson' ] = ( _ujson_dumps, ujson.loads )
+
+
+def setCodec( name=None ):
+  """
+  select the codec by name, one of CODEC_LIST, None selects the fastest one
+  installed.  Returns the name of the codec selected.
+  """
+  global CODEC, dumps, loads
+
+  if name is None:
+    name = [ i for i in CODEC_LIST if i in _CODEC_MAP ][0]
+
+  try:
+    ( dumps, loads ) = _CODEC_MAP[ name ]
+  except KeyError:
+    raise ValueError( 'JSON codec "{0}" is not available'.format( name ) )
+
+  CODEC = name
+  return name
+
+
+setCodec()
+
+
+class ArrayReader():  # the items of a top level array, parsed as they are read
+  def __init__( self, stream, chunk_size ):
+    super().__init__()
+    self._stream = stream
+    self._decoder = codecs.getincrementaldecoder( 'utf-8' )()
+    self._buff = ''
+    self._pos = 0
+    self._eof = False
+    self._chunk_size = chunk_size
+
+  def _fill( self, size=None ):
+    chunk = self._stream.read( size or self._chunk_size )
+    if not chunk:
+      self._eof = True
+
+    if isinstance( chunk, bytes ):  # a multi byte character can be split between chunks
+      chunk = self._decoder.decode( chunk, final=self._eof )
+
+    self._buff = self._buff[ self._pos: ] + chunk  # what has been parsed is dropped as more is read
+    self._pos = 0
+
+  def _skip( self ):  # returns the next non whitespace character, '' at the end
+    while True:
+      self._pos = _WHITESPACE.match( self._buff, self._pos ).end()
+      if self._pos < len( self._buff ) or self._eof:
+        return self._buff[ self._pos: self._pos + 1 ]
+
+      self._fill()
+
+  def _value( self ):
+    size = self._chunk_size
+    while True:
+      try:
+        ( value, end ) = _DECODER.raw_decode( self._buff, self._pos )
+      except json.JSONDecodeError:
+        if self._eof:
+          raise
+
+        self._fill( size )
+        size *= 2  # each retry parses the value from the start again, growing the read keeps a big value from being parsed once per chunk
+        continue
+
+      if not self._eof and ( end == len( self._buff ) or self._buff[ end ] not in _DELIMITERS ):  # a number could be cut off, ie: "1.5e3" as "1.", make sure it is really the end
+        self._fill()
+        continue
+
+      self._pos = end
+      return value
+
+  def __iter__( self ):
+    if self._skip() == ']':
+      self._pos += 1
+
+    else:
+      while True:
+        yield self._value()
+        char = self._skip()
+        self._pos += 1
+        if char == ']':
+          break
+
+        if char != ',':
+          raise json.JSONDecodeError( 'Expecting "," or "]"', self._buff, self._pos - 1 )
+
+        self._skip()
+
+    if self._skip() != '':
+      raise json.JSONDecodeError( 'Extra data', self._buff, self._pos )
+
+
+def iterload( stream, chunk_size=65536 ):
+  """
+  parse the JSON value from stream (file like, of bytes or str) a chunk at a
+  time.  If it is an array, returns an iterable that parses and yields the items
+  as it is iterated, only the current chunk is held in memory.  Otherwise the
+  value is parsed with the selected codec and returned, None if there is
+  nothing but whitespace.  Both raise DecodeError.
+  NOTE: the array items are parsed by the stdlib, it is the only one that can
+  say where a value ends.
+  """
+  reader = ArrayReader( stream, chunk_size )
+  char = reader._skip()
+  if char == '[':
+    reader._pos += 1
+    return reader
+
+  if char == '':
+    return None
+
+  while not reader._eof:
+    reader._fill()
+
+  return loads( reader._buff )
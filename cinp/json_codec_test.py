@@ -0,0 +1,101 @@
+import pytest
+import json
+from io import BytesIO, StringIO
+from datetime import datetime, timezone
+
+from cinp import json_codec
+
+
+@pytest.fixture( params=[ i for i in json_codec.CODEC_LIST if i in json_codec._CODEC_MAP ] )
+def codec( request ):
+  json_codec.setCodec( request.param )
+  yield request.param
+  json_codec.setCodec()
+
+
+def test_select():
+  assert json_codec.setCodec() == json_codec.CODEC
+  assert json_codec.CODEC in json_codec.CODEC_LIST
+  assert json_codec.setCodec( 'json' ) == 'json'
+  assert json_codec.dumps( { 'a': 1 } ) == b'{"a": 1}'
+
+  with pytest.raises( ValueError ):
+    json_codec.setCodec( 'bson' )
+
+  assert json_codec.CODEC == 'json'
+  json_codec.setCodec()
+
+
+def test_dumps( codec ):
+  value = { 'str': 'thing', 'int': 12, 'float': 1.5, 'bool': True, 'none': None, 'list': [ 1, 'two', [ 3 ] ], 'map': { 'a': { 'b': 'c' } }, 'unicode': 'café /path/' }
+  buff = json_codec.dumps( value )
+  assert isinstance( buff, bytes )
+  assert json.loads( buff ) == value
+
+  assert json.loads( json_codec.dumps( ( 1, 2 ) ) ) == [ 1, 2 ]
+  assert json.loads( json_codec.dumps( { 1: 'a' } ) ) == { '1': 'a' }
+  assert json.loads( json_codec.dumps( 2 ** 70 ) ) == 2 ** 70  # to big for some of the fast libraries
+  assert json_codec.dumps( None ) == b'null'
+
+  assert json.loads( json_codec.dumps( datetime( 2020, 3, 4, 5, 6, 7, 123456 ) ) ) == '2020-03-04T05:06:07.123456'
+  assert json.loads( json_codec.dumps( datetime( 2020, 3, 4, 5, 6, 7, tzinfo=timezone.utc ) ) ) == '2020-03-04T05:06:07+00:00'
+
+  with pytest.raises( TypeError ):
+    json_codec.dumps( object() )
+
+
+def test_loads( codec ):
+  assert json_codec.loads( b'{"a": [1, 2.5, "c", null, true]}' ) == { 'a': [ 1, 2.5, 'c', None, True ] }
+  assert json_codec.loads( '{"a": [1, 2.5, "c", null, true]}' ) == { 'a': [ 1, 2.5, 'c', None, True ] }
+  assert json_codec.loads( '"café"'.encode( 'utf-8' ) ) == 'café'
+  assert json_codec.loads( b' 12 ' ) == 12
+
+  for value in ( b'', b'{', b'{"a": }', b'[1, 2', b'nope' ):
+    with pytest.raises( json_codec.DecodeError ):
+      json_codec.loads( value )
+
+
+def test_iterload( codec ):
+  body = ' [ 1, 22 ,333, {"a": "caf\u00e9 \u2603"}, [1, [2]], "x,]" , true, null, -1.5e3 ] '
+  for chunk_size in ( 1, 2, 3, 7, 1000 ):  # the chunks split numbers, strings, and the multi byte characters
+    reader = json_codec.iterload( BytesIO( body.encode( 'utf-8' ) ), chunk_size )
+    assert isinstance( reader, json_codec.ArrayReader )
+    assert list( reader ) == [ 1, 22, 333, { 'a': 'caf\u00e9 \u2603' }, [ 1, [ 2 ] ], 'x,]', True, None, -1500.0 ]
+
+  assert list( json_codec.iterload( StringIO( body ), 4 ) )[ 0:3 ] == [ 1, 22, 333 ]
+  assert list( json_codec.iterload( BytesIO( b' [ ] ' ), 1 ) ) == []
+  assert json_codec.iterload( BytesIO( b'{"a": [1, 2]}' ), 2 ) == { 'a': [ 1, 2 ] }
+  assert json_codec.iterload( BytesIO( b'12345' ), 2 ) == 12345
+  assert json_codec.iterload( BytesIO( b'  ' ), 2 ) is None
+
+  for value in ( b'[1,', b'[1 2]', b'[1,]', b'[1] x', b'[', b'[1,,2]', b'[1]]', b'[{"a": }]' ):
+    with pytest.raises( json_codec.DecodeError ):
+      list( json_codec.iterload( BytesIO( value ), 2 ) )
+
+  with pytest.raises( json_codec.DecodeError ):
+    json_codec.iterload( BytesIO( b'{"a": ' ), 2 )
+
+  class Stream():  # make sure it is read as it goes
+    def __init__( self ):
+      self.read_count = 0
+      self.buff = BytesIO( b'[' + b', '.join( [ b'"item"' ] * 100 ) + b']' )
+
+    def read( self, size ):
+      self.read_count += 1
+      return self.buff.read( size )
+
+  stream = Stream()
+  reader = iter( json_codec.iterload( stream, 10 ) )
+  assert next( reader ) == 'item'
+  assert stream.read_count == 1
+  assert len( list( reader ) ) == 99
+  assert stream.read_count > 70
+
+  class BigStream( Stream ):  # one big item is not re-parsed once per chunk
+    def __init__( self ):
+      self.read_count = 0
+      self.buff = BytesIO( b'["' + b'x' * 100000 + b'", 1]' )
+
+  stream = BigStream()
+  assert list( json_codec.iterload( stream, 10 ) ) == [ 'x' * 100000, 1 ]
+  assert stream.read_count < 30
@@ -1,21 +1,47 @@
 import re
+import json
+import uuid
+import base64
+import hashlib
+import decimal
+import datetime
+import time
 import random
+import functools
+import threading
 import django
 import inspect
 from asgiref.sync import async_to_sync
 from django.conf import settings
-from django.db import DatabaseError, models, transaction
+from django.db import DatabaseError, models, transaction, connection
 from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
 from django.apps import apps
-from django.core.exceptions import ObjectDoesNotExist, ValidationError, AppRegistryNotReady
-from django.db.models import fields, ProtectedError
+from django.utils.module_loading import import_string
+from django.core.exceptions import ObjectDoesNotExist, ValidationError, AppRegistryNotReady, FieldDoesNotExist
+from django.db.models import fields, signals, ProtectedError
 from django.core.files import File
 
-from cinp.server_common import Converter, Namespace, Model, Action, Parameter, FilterParameter, Field, InvalidRequest, checkAuth_true, checkAuth_false, MAP_TYPE_CONVERTER
+from cinp.server_common import Converter, Namespace, Model, Action, Parameter, FilterParameter, Field, InvalidRequest, checkAuth_true, checkAuth_false, MAP_TYPE_CONVERTER, _checkAuthObjects
 
 __MODEL_REGISTRY__ = {}
 
-# TODO: take advantage of .save( update_fields=.... ) on UPDATE
+# LIST totals are cached this many seconds, so paging through a big result set runs the COUNT once, set to 0 to disable
+# CREATE/UPDATE/DELETE through CInP in this process drop the model's cached totals, other changes can take up to the TTL to show up in the total
+TOTAL_CACHE_TTL = 30
+TOTAL_CACHE_SIZE = 1024
+
+__TOTAL_CACHE__ = {}  # ( model path, filter_name, filter values ) -> ( expires, total )
+__TOTAL_CACHE_LOCK__ = threading.Lock()  # requests can be handled by more than one thread
+
+# basic_auth_check gets a user's permissions once every TTL seconds instead of asking has_perm on every request, set to 0 to disable
+# call permission_cache_invalidate after changing a user's permissions or groups for it to take effect right away
+PERMISSION_CACHE_TTL = 60
+PERMISSION_CACHE_SIZE = 1024
+
+__PERMISSION_CACHE__ = {}  # user pk -> ( expires, permission set )
+__PERMISSION_CACHE_LOCK__ = threading.Lock()
+__MODEL_PERMISSION_MAP__ = {}  # django model -> { verb: permission }, filled in when the model is registered
 
 HAS_VIEW_PERMISSION = ( int( django.get_version().split( '.' )[0] ), int( django.get_version().split( '.' )[1] ) ) >= ( 2, 1 )
 
@@ -168,43 +194,270 @@ def parameter_type_to_filter_parameter( parameter_type ):
 
 
 def make_action_auth( check_auth, action_name ):
+  if _checkAuthObjects( check_auth ):
+    return lambda user, verb, id_list, object_map=None: check_auth( user, verb, id_list, action_name, object_map=object_map )
+
   return lambda user, verb, id_list: check_auth( user, verb, id_list, action_name )
 
 
-class DjangoConverter( Converter ):
-  def _toPython( self, parameter, cinp_value, transaction ):
-    if parameter.type == 'File':
-      value = super()._toPython( parameter, cinp_value, transaction )
-      if value is None:
-        return None
+def _total_cache_key_default( value ):  # filter values can be model instances, key them by pk
+  try:
+    return '{0}:{1}'.format( value.__class__.__name__, value.pk )
+  except AttributeError:
+    return str( value )
+
+
+def _keyset_order( django_model, qs ):
+  """
+  returns the ordering of qs as a list of ( name, django field, descending ) ending
+  with the pk, or None if the ordering can not be used for keyset pagination, ie: it
+  is not made of plain non-null local fields
+  """
+  meta = django_model._meta
+  order_list = qs.query.order_by
+  if not order_list and qs.query.default_ordering:
+    order_list = meta.ordering
+
+  result = []
+  for entry in order_list:
+    if not isinstance( entry, str ):
+      return None
 
-      ( reader, filename ) = value
+    descending = entry.startswith( '-' )
+    name = entry.lstrip( '-' )
+    if name == '?' or LOOKUP_SEP in name:
+      return None
 
-      if filename is None:
-        filename = ''.join( random.choices( '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_-', k=20 ) )
+    if name == 'pk' or name == meta.pk.name:
+      result.append( ( 'pk', meta.pk, descending ) )
+      break  # the pk is unique, anything after it never matters
 
-      if isinstance( parameter, Field ):
-        return File( parameter.django_field.save( filename, reader ) )
+    try:
+      django_field = meta.get_field( name )
+    except FieldDoesNotExist:
+      return None
+
+    if django_field.is_relation or django_field.null or not django_field.concrete:
+      return None
+
+    result.append( ( name, django_field, descending ) )
+
+  else:
+    result.append( ( 'pk', meta.pk, False ) )
+
+  return result
+
+
+def _keyset_seek( keyset, value_list ):  # ( a > x ) OR ( a = x AND b > y ) OR ...
+  q = Q()
+  for index, ( name, _, descending ) in enumerate( keyset ):
+    term = Q( **{ '{0}__{1}'.format( name, 'lt' if descending else 'gt' ): value_list[ index ] } )
+    for prev_index in range( 0, index ):
+      term &= Q( **{ keyset[ prev_index ][0]: value_list[ prev_index ] } )
+
+    q |= term
+
+  return q
+
+
+def _cursor_value( value ):  # JSON for a cursor value, it has to survive the round trip exactly, or the seek repeats/skips rows
+  if isinstance( value, ( datetime.datetime, datetime.date, datetime.time ) ):
+    return value.isoformat()  # DjangoJSONEncoder would cut this to milliseconds
+
+  if isinstance( value, ( decimal.Decimal, uuid.UUID, datetime.timedelta ) ):
+    return str( value )
+
+  return value
+
+
+def _cursor_filter_key( filter_name, filter_values ):  # so a cursor from one filter can't be used with another
+  data = json.dumps( [ filter_name, filter_values ], sort_keys=True, default=_total_cache_key_default )
+  return hashlib.sha256( data.encode() ).hexdigest()[ 0:16 ]
 
-      else:
-        return File( reader, filename )
 
-    return super()._toPython( parameter, cinp_value, transaction )
+def _cursor_encode( keyset, value_list, filter_name, filter_values ):
+  data = json.dumps( [ _cursor_filter_key( filter_name, filter_values ), [ name for ( name, _, _ ) in keyset ], [ _cursor_value( value ) for value in value_list ] ] )
+  return base64.urlsafe_b64encode( data.encode() ).decode().rstrip( '=' )
 
-  def _fromPython( self, parameter, python_value ):
-    if parameter.type == 'Model':
-      if python_value is None:
-        return None
 
-      return '{0}:{1}:'.format( parameter.model.path, python_value.pk )
+def _cursor_decode( keyset, cursor, filter_name, filter_values ):
+  try:
+    ( filter_key, name_list, value_list ) = json.loads( base64.urlsafe_b64decode( cursor + '=' * ( -len( cursor ) % 4 ) ) )
+  except ( ValueError, TypeError ):
+    raise ValueError( 'Invalid Cursor' )
+
+  if filter_key != _cursor_filter_key( filter_name, filter_values ):
+    raise ValueError( 'Cursor does not match the filter' )
+
+  if name_list != [ name for ( name, _, _ ) in keyset ] or len( value_list ) != len( keyset ):
+    raise ValueError( 'Cursor does not match the ordering' )
+
+  try:
+    return [ django_field.to_python( value ) for ( ( _, django_field, _ ), value ) in zip( keyset, value_list ) ]
+  except ValidationError:
+    raise ValueError( 'Invalid Cursor' )
+
+
+def _total_cache_invalidate( model ):  # the model's rows changed, drop it's cached totals
+  with __TOTAL_CACHE_LOCK__:
+    for key in [ key for key in __TOTAL_CACHE__ if key[0] == model.path ]:
+      del __TOTAL_CACHE__[ key ]
+
+
+def _has_save_logic( django_model ):  # True if saving runs code of it's own, ie: a custom save() or save signal listeners
+  if django_model.save is not models.Model.save:
+    return True
+
+  return signals.pre_save.has_listeners( django_model ) or signals.post_save.has_listeners( django_model )
+
+
+def _has_delete_logic( django_model ):  # True if the model has a custom delete(), QuerySet.delete() does not call it
+  return django_model.delete is not models.Model.delete
+
 
-    if parameter.type == 'File':
-      if python_value is None:
-        return None
+def _field_values( target_object ):  # the column values, to see what changed later
+  return dict( [ ( field.attname, field.value_from_object( target_object ) ) for field in target_object._meta.concrete_fields ] )
 
-      return python_value.url
 
-    return super()._fromPython( parameter, python_value )
+def _update_fields( target_object, name_list, before_map ):  # the fields save( update_fields= ) needs to write, the ones being set, the ones clean() changed and the auto_now ones
+  result = []
+  for field in target_object._meta.concrete_fields:
+    if field.primary_key:
+      continue
+
+    if field.name in name_list or getattr( field, 'auto_now', False ) or field.value_from_object( target_object ) != before_map[ field.attname ]:
+      result.append( field.name )
+
+  return result
+
+
+def _save_changed( target_object, name_list, before_map ):  # only write the touched columns, unless save() has logic of its own, it may set other fields (ie: a slug)
+  if _has_save_logic( type( target_object ) ):
+    target_object.save()
+  else:
+    target_object.save( update_fields=_update_fields( target_object, name_list, before_map ) )
+
+
+def _clean_exclude( django_model, name_list ):  # the fields full_clean() can skip when only the fields in name_list are being set, the rest were validated when they were saved
+  meta = django_model._meta
+  group_list = [ set( item ) for item in meta.unique_together ]
+  for constraint in meta.constraints:
+    field_list = getattr( constraint, 'fields', None )
+    if not field_list or getattr( constraint, 'condition', None ) is not None or getattr( constraint, 'expressions', None ):  # can not tell which fields it checks
+      return []
+
+    group_list.append( set( field_list ) )
+
+  for field in meta.concrete_fields:
+    if field.unique_for_date or field.unique_for_month or field.unique_for_year:
+      return []
+
+  touched_set = set( name_list )
+  for group in group_list:  # the other fields in a unique group with a field being set need to be included for the unique check
+    if group & touched_set:
+      touched_set |= group
+
+  return [ field.name for field in meta.concrete_fields if field.name not in touched_set ]
+
+
+def _model_permission_map( model ):  # the permission basic_auth_check wants for each verb
+  try:
+    return __MODEL_PERMISSION_MAP__[ model ]
+  except KeyError:
+    pass
+
+  app = model._meta.app_label
+  name = model._meta.model_name
+  return {
+           'GET': '{0}.view_{1}'.format( app, name ),
+           'LIST': '{0}.view_{1}'.format( app, name ),
+           'CREATE': '{0}.add_{1}'.format( app, name ),
+           'UPDATE': '{0}.change_{1}'.format( app, name ),
+           'DELETE': '{0}.delete_{1}'.format( app, name )
+         }
+
+
+@functools.lru_cache( maxsize=None )
+def _backends_list_permissions( backend_path_list ):  # True if every auth backend can list a user's permissions, a backend with only has_perm (ie: object level) would be left out of get_all_permissions
+  return all( hasattr( import_string( path ), 'get_all_permissions' ) for path in backend_path_list )
+
+
+def _permission_set( user ):  # the user's cached permissions, None if they can not be cached
+  if PERMISSION_CACHE_TTL <= 0 or getattr( user, 'pk', None ) is None or not hasattr( user, 'get_all_permissions' ) or user.is_superuser:  # has_perm is always True for superusers
+    return None
+
+  if not _backends_list_permissions( tuple( settings.AUTHENTICATION_BACKENDS ) ):
+    return None
+
+  now = time.monotonic()
+  with __PERMISSION_CACHE_LOCK__:
+    try:
+      ( expires, permission_set ) = __PERMISSION_CACHE__[ user.pk ]
+      if expires > now:
+        return permission_set
+
+    except KeyError:
+      pass
+
+  permission_set = frozenset( user.get_all_permissions() )
+
+  with __PERMISSION_CACHE_LOCK__:
+    if len( __PERMISSION_CACHE__ ) >= PERMISSION_CACHE_SIZE:
+      for key in [ key for key, value in __PERMISSION_CACHE__.items() if value[0] <= now ]:
+        del __PERMISSION_CACHE__[ key ]
+
+      if len( __PERMISSION_CACHE__ ) >= PERMISSION_CACHE_SIZE:  # everything is still live, drop the oldest
+        del __PERMISSION_CACHE__[ next( iter( __PERMISSION_CACHE__ ) ) ]
+
+    __PERMISSION_CACHE__[ user.pk ] = ( now + PERMISSION_CACHE_TTL, permission_set )
+
+  return permission_set
+
+
+def _has_perm( user, permission ):
+  permission_set = _permission_set( user )
+  if permission_set is None:
+    return user.has_perm( permission )
+
+  return permission in permission_set
+
+
+def permission_cache_invalidate( user_id=None ):  # drop the cached permissions of user_id, or everyone's if user_id is None
+  with __PERMISSION_CACHE_LOCK__:
+    if user_id is None:
+      __PERMISSION_CACHE__.clear()
+    else:
+      __PERMISSION_CACHE__.pop( user_id, None )
+
+
+class DjangoConverter( Converter ):
+  def _toPythonFile( self, parameter, cinp_value, transaction ):
+    value = super()._toPythonFile( parameter, cinp_value, transaction )
+    if value is None:
+      return None
+
+    ( reader, filename ) = value
+
+    if filename is None:
+      filename = ''.join( random.choices( '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_-', k=20 ) )
+
+    if isinstance( parameter, Field ):
+      return File( parameter.django_field.save( filename, reader ) )
+
+    else:
+      return File( reader, filename )
+
+  def _fromPythonModel( self, parameter, python_value ):
+    if python_value is None:
+      return None
+
+    return '{0}:{1}:'.format( parameter.model.path, python_value.pk )
+
+  def _fromPythonFile( self, parameter, python_value ):
+    if python_value is None:
+      return None
+
+    return python_value.url
 
 
 # decorator for the models
@@ -247,7 +500,7 @@ class DjangoCInP():
     return namespace
 
   # decorators
-  def model( self, hide_field_list=None, show_field_list=None, property_list=None, constant_set_map=None, not_allowed_verb_list=None, read_only_list=None ):
+  def model( self, hide_field_list=None, show_field_list=None, property_list=None, constant_set_map=None, not_allowed_verb_list=None, read_only_list=None, set_update=False, max_request_size=None ):
     def decorator( cls ):
       global __MODEL_REGISTRY__
 
@@ -286,6 +539,20 @@ class DjangoCInP():
         django_field_list.append( django_field )
         pk_field_name = django_field.name
 
+      # the loading plan, so serializing a record does not cost a query per related field
+      # forward relations that point at the pk of the related model are serialized from the local *_id column, so they do not need to be loaded
+      select_related_list = []
+      prefetch_related_list = []
+      id_attribute_map = {}
+      for django_field in django_field_list:
+        if django_field.many_to_many:
+          prefetch_related_list.append( django_field.name )
+        elif django_field.many_to_one or django_field.one_to_one:
+          if django_field.target_field.primary_key and not getattr( django_field, 'cinp_is_array', False ):
+            id_attribute_map[ django_field.name ] = django_field.attname
+          else:
+            select_related_list.append( django_field.name )
+
       for django_field in django_field_list:
         kwargs = {
                    'name': django_field.name,
@@ -349,6 +616,9 @@ class DjangoCInP():
 
             kwargs[ 'model' ] = model
 
+          if django_field.name in id_attribute_map:
+            kwargs[ 'id_attribute' ] = id_attribute_map[ django_field.name ]
+
         else:
           raise ValueError( 'Unknown Field type "{0}"'.format( internal_type ) )
 
@@ -358,6 +628,9 @@ class DjangoCInP():
           except AttributeError:
             pass
 
+        if getattr( django_field, 'cinp_json_native', False ):
+          kwargs[ 'json_native' ] = True
+
         field_list.append( Field( **kwargs ) )
 
       for item in property_list_:
@@ -409,11 +682,15 @@ class DjangoCInP():
       except AttributeError:
         doc = None
 
-      model = Model( name=name, doc=doc, id_field_name=pk_field_name, transaction_class=self._getTransactionClass( cls ), field_list=field_list, list_filter_map=filter_map, list_query_filter_map=list_query_filter[1], list_query_sort_list=list_query_sort[1], constant_set_map=constant_set_map, not_allowed_verb_list=not_allowed_verb_list )
+      model = Model( name=name, doc=doc, id_field_name=pk_field_name, transaction_class=self._getTransactionClass( cls ), field_list=field_list, list_filter_map=filter_map, list_query_filter_map=list_query_filter[1], list_query_sort_list=list_query_sort[1], constant_set_map=constant_set_map, not_allowed_verb_list=not_allowed_verb_list, max_request_size=max_request_size )
       model._django_model = cls
       model._django_filter_funcs_map = filter_funcs_map
       model._django_query_filter = list_query_filter[0]
       model._django_query_sort = list_query_sort[0]
+      model._django_select_related = tuple( select_related_list )
+      model._django_prefetch_related = tuple( prefetch_related_list )
+      model._django_set_update = set_update
+      __MODEL_PERMISSION_MAP__[ cls ] = _model_permission_map( cls )
       self.model_list.append( model )
       __MODEL_REGISTRY__[ '{0}.{1}'.format( cls.__module__, cls.__name__ ) ] = model
       MAP_TYPE_CONVERTER[ cls.__name__ ] = lambda a: model.path + ':{0}:'.format( a.pk )
@@ -437,7 +714,7 @@ class DjangoCInP():
 
     return decorator
 
-  def action( self, return_type=None, parameter_type_list=None ):  # must decorate the @staticmethod decorator to detect if it is static or not
+  def action( self, return_type=None, parameter_type_list=None, max_request_size=None ):  # must decorate the @staticmethod decorator to detect if it is static or not
     def decorator( func ):
       if type( func ).__name__ == 'staticmethod':
         static = True
@@ -478,7 +755,7 @@ class DjangoCInP():
       except AttributeError:
         doc = ''
 
-      self.action_map[ model_name ].append( Action( name=name, doc=doc, func=async_to_sync( func ) if is_async else func, return_parameter=return_parameter, parameter_list=parameter_list, static=static ) )
+      self.action_map[ model_name ].append( Action( name=name, doc=doc, func=async_to_sync( func ) if is_async else func, async_func=func if is_async else None, max_request_size=max_request_size, return_parameter=return_parameter, parameter_list=parameter_list, static=static ) )
       return func
 
     return decorator
@@ -500,23 +777,11 @@ class DjangoCInP():
     if verb == 'DESCRIBE':
       return True
 
-    app = model._meta.app_label
-    model = model._meta.model_name
-
-    if verb in ( 'GET', 'LIST' ):
-      if HAS_VIEW_PERMISSION:
-        return user.has_perm( '{0}.view_{1}'.format( app, model ) )
-      else:
-        return True
-
-    if verb == 'CREATE':
-      return user.has_perm( '{0}.add_{1}'.format( app, model ) )
-
-    if verb == 'UPDATE':
-      return user.has_perm( '{0}.change_{1}'.format( app, model ) )
+    if verb in ( 'GET', 'LIST' ) and not HAS_VIEW_PERMISSION:
+      return True
 
-    if verb == 'DELETE':
-      return user.has_perm( '{0}.delete_{1}'.format( app, model ) )
+    if verb in ( 'GET', 'LIST', 'CREATE', 'UPDATE', 'DELETE' ):
+      return _has_perm( user, _model_permission_map( model )[ verb ] )
 
     if verb == 'CALL':
       if not action_permission_map:
@@ -535,12 +800,12 @@ class DjangoCInP():
 
       if isinstance( permissions, ( list, tuple ) ):
         for permission in permissions:
-          if user.has_perm( permission ):
+          if _has_perm( user, permission ):
             return True
 
         return False
       else:
-        return user.has_perm( permissions )
+        return _has_perm( user, permissions )
 
     return False
 
@@ -601,10 +866,41 @@ class DjangoCInP():
 class DjangoTransaction():  # NOTE: developed on Postgres
   def __init__( self ):
     super().__init__()
+    self._preload_map = {}  # model path -> { object_id: object }, objects that were loaded for checkAuth
+
+  def preload( self, model, object_map ):
+    """
+    keep objects that have already been loaded, so retrieving them again for
+    the request does not cost another query
+    """
+    self._preload_map[ model.path ] = dict( object_map )
+
+  def _preloaded( self, model, id_list ):  # the preloaded objects for id_list, None if any of them have not been preloaded
+    object_map = self._preload_map.get( model.path, {} )
+    try:
+      return dict( [ ( object_id, object_map[ object_id ] ) for object_id in id_list ] )
+    except KeyError:
+      return None
+
+  def _queryset( self, model, qs=None ):  # the queryset for retrieving objects that are going to be serialized, applies the model's loading plan
+    if qs is None:
+      qs = model._django_model.objects.all()
+
+    if model._django_select_related:  # select_related() with no args follows every non-null relation, so only call it when there is something to select
+      qs = qs.select_related( *model._django_select_related )
+
+    if model._django_prefetch_related:
+      qs = qs.prefetch_related( *model._django_prefetch_related )
+
+    return qs
 
   def get( self, model, object_id ):
+    object_map = self._preloaded( model, [ object_id ] )
+    if object_map is not None:
+      return object_map[ object_id ]
+
     try:
-      return model._django_model.objects.get( pk=object_id )
+      return self._queryset( model ).get( pk=object_id )
 
     except ObjectDoesNotExist:
       return None
@@ -612,6 +908,27 @@ class DjangoTransaction():  # NOTE: developed on Postgres
     except ValueError:
       return None  # an invalid pk is indeed 404
 
+  def get_many( self, model, id_list ):
+    """
+    retrieve all the objects in id_list with one query, returns a dict of
+    object_id -> object in id_list order, ids that are not found map to None
+    """
+    object_map = self._preloaded( model, id_list )
+    if object_map is not None:
+      return object_map
+
+    pk_field = model._django_model._meta.pk
+    pk_map = {}
+    for object_id in id_list:
+      try:
+        pk_map[ object_id ] = pk_field.to_python( object_id )
+      except ValidationError:
+        pk_map[ object_id ] = None  # an invalid pk is indeed 404
+
+    object_map = dict( [ ( target_object.pk, target_object ) for target_object in self._queryset( model ).filter( pk__in=[ pk for pk in pk_map.values() if pk is not None ] ) ] )
+
+    return dict( [ ( object_id, object_map.get( pk_map[ object_id ], None ) ) for object_id in id_list ] )
+
   def create( self, model, value_map ):
     target_object = model._django_model()
 
@@ -634,32 +951,168 @@ class DjangoTransaction():  # NOTE: developed on Postgres
     for name in multi_multi_list:
       getattr( target_object, name ).set( value_map[ name ] )
 
+    _total_cache_invalidate( model )
+
     return ( target_object.pk, target_object )
 
-  def update( self, model, object_id, value_map ):
+  def create_many( self, model, value_map_list ):
+    """
+    create an object for each value_map, everything is validated before
+    anything is saved, returns a list of ( object_id, object ) in value_map_list order
+    """
+    django_model = model._django_model
+    object_list = []
+    multi_multi_list = []
+    error_map = {}
+    for index, value_map in enumerate( value_map_list ):
+      target_object = django_model()
+      multi_multi_map = {}
+      for name in value_map:
+        if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
+          if value_map[ name ] is not None:
+            multi_multi_map[ name ] = value_map[ name ]
+        else:
+          setattr( target_object, name, value_map[ name ] )
+
+      try:
+        target_object.full_clean()
+      except ValidationError as e:
+        error_map[ str( index ) ] = e.message_dict
+
+      object_list.append( target_object )
+      multi_multi_list.append( multi_multi_map )
+
+    if error_map:
+      raise ValueError( error_map )
+
+    # bulk_create skips save() and the save signals, and can not do multi-table inheritance, or get the pks back on some backends, so those get saved one at a time
+    use_bulk = not _has_save_logic( django_model ) and not django_model._meta.parents and connection.features.can_return_rows_from_bulk_insert
     try:
-      target_object = model._django_model.objects.get( pk=object_id )
-    except ObjectDoesNotExist:
+      if use_bulk:
+        django_model.objects.bulk_create( object_list )
+      else:
+        with transaction.atomic():
+          for target_object in object_list:
+            target_object.save()
+
+    except DatabaseError as e:
+      raise ValueError( str( e ) )
+
+    for ( target_object, multi_multi_map ) in zip( object_list, multi_multi_list ):
+      for name in multi_multi_map:
+        getattr( target_object, name ).set( multi_multi_map[ name ] )
+
+    _total_cache_invalidate( model )
+
+    return [ ( target_object.pk, target_object ) for target_object in object_list ]
+
+  def update( self, model, object_id, value_map ):
+    target_object = self.get( model, object_id )
+    if target_object is None:
       return None
 
+    update_list = []
     for name in value_map:
       if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
         if value_map[ name ] is not None:
           getattr( target_object, name ).set( value_map[ name ] )
       else:
-        setattr( target_object, name, value_map[ name ] )
+        update_list.append( name )
+
+    before_map = _field_values( target_object )
+    for name in update_list:
+      setattr( target_object, name, value_map[ name ] )
 
     try:
-      target_object.full_clean()
-      target_object.save()
+      target_object.full_clean( exclude=_clean_exclude( model._django_model, update_list ) )
+      _save_changed( target_object, update_list, before_map )
     except ValidationError as e:
       raise ValueError( e.message_dict )
     except DatabaseError as e:
       raise ValueError( str( e ) )
 
+    _total_cache_invalidate( model )  # the change can move it in or out of a filter
+
     return target_object
 
-  def list( self, model, filter_name, filter_values, position, count ):
+  def update_many( self, model, id_list, value_map ):
+    """
+    apply value_map to all the objects in id_list, the objects are retrieved
+    with one query and all validated before anything is saved, returns a dict
+    of object_id -> object, if any ids are not found nothing is updated and they map to None
+    """
+    object_map = self.get_many( model, id_list )
+    if None in object_map.values():
+      return object_map
+
+    django_model = model._django_model
+    object_list = list( dict( [ ( target_object.pk, target_object ) for target_object in object_map.values() ] ).values() )  # the same id can be in id_list more than once
+
+    update_map = {}
+    multi_multi_map = {}
+    for name in value_map:
+      if model.field_map[ name ].type == 'Model' and model.field_map[ name ].is_array:  # ie: is a ManyToManyField
+        if value_map[ name ] is not None:
+          multi_multi_map[ name ] = value_map[ name ]
+      else:
+        update_map[ name ] = value_map[ name ]
+
+    exclude_list = _clean_exclude( django_model, update_map )
+    before_map_list = []
+    error_map = {}
+    for target_object in object_list:
+      before_map_list.append( _field_values( target_object ) )
+      for name in update_map:
+        setattr( target_object, name, update_map[ name ] )
+
+      try:
+        target_object.full_clean( exclude=exclude_list )
+      except ValidationError as e:
+        error_map[ str( target_object.pk ) ] = e.message_dict
+
+    if error_map:
+      raise ValueError( error_map )
+
+    # set_update models opted in to one UPDATE ... WHERE pk IN ( ... ), otherwise unless saving or clean() can do something per row, bulk_update() writes them all in one go
+    bulk_update = not ( _has_save_logic( django_model ) or django_model.clean is not models.Model.clean )
+    try:
+      with transaction.atomic():
+        if model._django_set_update or bulk_update:
+          field_list = [ django_model._meta.get_field( name ) for name in update_map ]
+          field_list += [ field for field in django_model._meta.concrete_fields if getattr( field, 'auto_now', False ) and field not in field_list ]
+          column_map = dict( [ ( field.attname, field.pre_save( object_list[0], False ) ) for field in field_list ] )  # pre_save fills in the auto_now values, the same ones for every row
+          for target_object in object_list[ 1: ]:
+            for name in column_map:
+              setattr( target_object, name, column_map[ name ] )
+
+        if model._django_set_update:
+          if column_map:
+            django_model.objects.filter( pk__in=[ target_object.pk for target_object in object_list ] ).update( **column_map )
+
+        elif bulk_update:
+          if column_map:
+            django_model.objects.bulk_update( object_list, [ field.name for field in field_list ] )
+
+        else:
+          for ( target_object, before_map ) in zip( object_list, before_map_list ):
+            _save_changed( target_object, update_map, before_map )
+
+        for target_object in object_list:
+          for name in multi_multi_map:
+            getattr( target_object, name ).set( multi_multi_map[ name ] )
+
+    except DatabaseError as e:
+      raise ValueError( str( e ) )
+
+    _total_cache_invalidate( model )
+
+    return object_map
+
+  def list( self, model, filter_name, filter_values, position, count, total_mode='exact', cursor=None, values=False ):
+    """
+    returns ( id_list, position, total, next_cursor ), with values id_list is
+    a list of ( id, object )
+    """
     if filter_name is None:
       qs = model._django_model.objects.all()
 
@@ -691,9 +1144,99 @@ class DjangoTransaction():  # NOTE: developed on Postgres
     if not qs.ordered:
       qs = qs.order_by( 'pk' )
 
+    keyset = _keyset_order( model._django_model, qs )
+    if keyset is not None:  # make sure pk is the final tie breaker, so the cursor identifies exactly one row
+      qs = qs.order_by( *[ '{0}{1}'.format( '-' if descending else '', name ) for ( name, _, descending ) in keyset ] )
+
+    if values:  # the objects themselves, in the same query
+      page_qs = self._queryset( model, qs )
+    elif keyset is not None:
+      page_qs = qs.values_list( 'pk', *[ name for ( name, _, _ ) in keyset ] )
+    else:
+      page_qs = qs.values_list( 'pk' )
+
+    if cursor is not None:
+      if keyset is None:
+        raise ValueError( 'Cursor not supported for this ordering' )
+
+      page_qs = page_qs.filter( _keyset_seek( keyset, _cursor_decode( keyset, cursor, filter_name, filter_values ) ) )[ 0:count ]
+    else:
+      page_qs = page_qs[ position:position + count ]
+
+    if values:
+      object_list = list( page_qs )
+      row_list = [ ( target_object.pk, ) + tuple( target_object.pk if name == 'pk' else getattr( target_object, name ) for ( name, _, _ ) in keyset or [] ) for target_object in object_list ]
+    else:
+      row_list = list( page_qs )
+
+    id_list = [ row[0] for row in row_list ]
+
+    next_cursor = None
+    if keyset is not None and count > 0 and len( row_list ) == count:
+      next_cursor = _cursor_encode( keyset, row_list[ -1 ][ 1: ], filter_name, filter_values )
+
     qs = qs.values_list( 'pk' )
 
-    return ( [ item[0] for item in qs[ position:position + count ] ], position, qs.count() )
+    if total_mode == 'none':
+      total = None
+
+    elif cursor is None and len( id_list ) < count and ( id_list or position == 0 ):  # this is the last page, no need to count
+      total = position + len( id_list )
+
+    elif total_mode == 'estimate' and filter_name is None:
+      total = self._estimate( model )
+      if total is None:
+        total = self._total( model, filter_name, filter_values, qs )
+
+    else:
+      total = self._total( model, filter_name, filter_values, qs )
+
+    if values:
+      id_list = list( zip( id_list, object_list ) )
+
+    return ( id_list, position, total, next_cursor )
+
+  def _total( self, model, filter_name, filter_values, qs ):
+    if TOTAL_CACHE_TTL <= 0:
+      return qs.count()
+
+    key = ( model.path, filter_name, json.dumps( filter_values, sort_keys=True, default=_total_cache_key_default ) )
+    now = time.monotonic()
+    with __TOTAL_CACHE_LOCK__:
+      try:
+        ( expires, total ) = __TOTAL_CACHE__[ key ]
+        if expires > now:
+          return total
+
+      except KeyError:
+        pass
+
+    total = qs.count()  # not holding the lock while the database is busy
+
+    with __TOTAL_CACHE_LOCK__:
+      if len( __TOTAL_CACHE__ ) >= TOTAL_CACHE_SIZE:
+        for cache_key in [ cache_key for cache_key, value in __TOTAL_CACHE__.items() if value[0] <= now ]:
+          del __TOTAL_CACHE__[ cache_key ]
+
+        if len( __TOTAL_CACHE__ ) >= TOTAL_CACHE_SIZE:  # everything is still live, drop the oldest
+          del __TOTAL_CACHE__[ next( iter( __TOTAL_CACHE__ ) ) ]
+
+      __TOTAL_CACHE__[ key ] = ( now + TOTAL_CACHE_TTL, total )
+
+    return total
+
+  def _estimate( self, model ):  # the planner's row estimate for the whole table, Postgres only, None if there is not one
+    if connection.vendor != 'postgresql':
+      return None
+
+    with connection.cursor() as cursor:
+      cursor.execute( 'SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [ connection.ops.quote_name( model._django_model._meta.db_table ) ] )
+      row = cursor.fetchone()
+
+    if row is None or row[0] < 0:  # -1 if the table has not been vacuumed/analyzed yet
+      return None
+
+    return int( row[0] )
 
   def _filter( self, filter_spec_map, model ):
     if not filter_spec_map:
@@ -734,18 +1277,73 @@ class DjangoTransaction():  # NOTE: developed on Postgres
     raise ValueError( 'Invalid Filter Spec' )
 
   def delete( self, model, object_id ):
-    try:
-      target_object = model._django_model.objects.get( pk=object_id )
-    except ObjectDoesNotExist:
-      return False
+    object_map = self._preloaded( model, [ object_id ] )
+    if object_map is not None:
+      target_object = object_map[ object_id ]
+      if target_object is None:
+        return False
+
+    else:
+      try:
+        target_object = model._django_model.objects.get( pk=object_id )
+      except ObjectDoesNotExist:
+        return False
 
     try:
       target_object.delete()
     except ProtectedError:
       raise InvalidRequest( 'Not Deletable' )
 
+    _total_cache_invalidate( model )
+
     return True
 
+  def delete_many( self, model, id_list ):
+    """
+    delete all the objects in id_list with one collection/delete, or one at a
+    time if the model has a custom delete(), returns a list of the ids that
+    were not found, if there are any nothing is deleted
+    """
+    pk_field = model._django_model._meta.pk
+    pk_map = {}
+    for object_id in id_list:
+      try:
+        pk_map[ object_id ] = pk_field.to_python( object_id )
+      except ValidationError:
+        pk_map[ object_id ] = None
+
+    qs = model._django_model.objects.filter( pk__in=[ pk for pk in pk_map.values() if pk is not None ] )
+    object_map = self._preloaded( model, id_list )
+    if object_map is not None:
+      missing_list = [ object_id for object_id in id_list if object_map[ object_id ] is None ]
+    else:
+      found_set = set( qs.values_list( 'pk', flat=True ) )
+      missing_list = [ object_id for object_id in id_list if pk_map[ object_id ] not in found_set ]
+
+    if missing_list:
+      return missing_list
+
+    try:
+      if _has_delete_logic( model._django_model ):
+        if object_map is None:
+          object_list = list( qs )
+        else:
+          object_list = list( dict( [ ( target_object.pk, target_object ) for target_object in object_map.values() ] ).values() )  # the same id can be in id_list more than once
+
+        with transaction.atomic():
+          for target_object in object_list:
+            target_object.delete()
+
+      else:
+        qs.delete()
+
+    except ProtectedError:
+      raise InvalidRequest( 'Not Deletable' )
+
+    _total_cache_invalidate( model )
+
+    return []
+
   def start( self ):
     transaction.set_autocommit( False )
 
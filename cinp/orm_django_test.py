@@ -1,8 +1,11 @@
 import pytest
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 
-from django.db import models
+from django.db import models, connection
+from django.test.utils import CaptureQueriesContext
 
-from cinp.orm_django import DjangoCInP, HAS_VIEW_PERMISSION
+from cinp.orm_django import DjangoCInP, DjangoConverter, HAS_VIEW_PERMISSION, make_action_auth, permission_cache_invalidate, _model_permission_map
 from cinp.server_common import Server, Request
 
 last_permission = None
@@ -35,6 +38,21 @@ class MockServer( Server ):
     return self.root_namespace.element_map[ name ]
 
 
+@contextmanager
+def _model_tables( *model_list ):  # the test models are not part of an app, so there are no migrations to create the tables, use with django_db( transaction=True )
+  with connection.schema_editor() as editor:
+    for model in model_list:
+      editor.create_model( model )
+
+  try:
+    yield
+
+  finally:
+    with connection.schema_editor() as editor:
+      for model in reversed( model_list ):
+        editor.delete_model( model )
+
+
 def _ns_compare( ns, target, child_map ):
   assert ns.name == target[0]
   assert ns.version == target[1]
@@ -646,6 +664,768 @@ def test_multi_through_model_manytomany():
   assert r.http_code == 200
 
 
+@pytest.mark.django_db( transaction=True )
+def test_get_many():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Bulk( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_get_many.<locals>.Bulk' ]
+
+  with _model_tables( Bulk ):
+    for name in ( 'a', 'b', 'c' ):
+      Bulk.objects.create( name=name )
+
+    transaction = model.transaction_class()
+    with CaptureQueriesContext( connection ) as ctx:
+      result = transaction.get_many( model, [ '3', '1', '42', 'bad' ] )
+
+    assert len( ctx.captured_queries ) == 1
+    assert list( result.keys() ) == [ '3', '1', '42', 'bad' ]
+    assert result[ '3' ].name == 'c'
+    assert result[ '1' ].name == 'a'
+    assert result[ '42' ] is None
+    assert result[ 'bad' ] is None
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_get_many.<locals>.Bulk:2:1:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert r.data == { '/Simple/test_get_many.<locals>.Bulk:2:': { 'id': 2, 'name': 'b' }, '/Simple/test_get_many.<locals>.Bulk:1:': { 'id': 1, 'name': 'a' } }
+    assert len( ctx.captured_queries ) == 1
+
+    r = srv.handle( Request( uri='/Simple/test_get_many.<locals>.Bulk:2:42:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 404
+
+
+@pytest.mark.django_db( transaction=True )
+def test_create_many():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Batch( models.Model ):
+    name = models.CharField( max_length=20 )
+    size = models.IntegerField( default=1 )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class SavedBatch( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    def save( self, *args, **kwargs ):
+      self.name = self.name.upper()
+      super().save( *args, **kwargs )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_create_many.<locals>.Batch' ]
+  saved_model = srv.getTestNS( 'Simple' ).element_map[ 'test_create_many.<locals>.SavedBatch' ]
+
+  with _model_tables( Batch, SavedBatch ):
+    transaction = model.transaction_class()
+    with CaptureQueriesContext( connection ) as ctx:
+      result = transaction.create_many( model, [ { 'name': 'n{0}'.format( i ), 'size': i } for i in range( 0, 20 ) ] )
+
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'BEGIN', 'INSERT', 'COMMIT' ]  # one INSERT for all of them
+    assert [ item[0] for item in result ] == list( range( 1, 21 ) )
+    assert result[3][1].name == 'n3'
+    assert Batch.objects.count() == 20
+
+    with pytest.raises( ValueError ) as e:
+      transaction.create_many( model, [ { 'name': 'good' }, { 'name': 'x' * 30 }, { 'name': 'good' } ] )
+
+    assert list( e.value.args[0].keys() ) == [ '1' ]
+    assert Batch.objects.count() == 20  # nothing saved
+
+    result = transaction.create_many( saved_model, [ { 'name': 'a' }, { 'name': 'b' } ] )  # custom save(), saved one at a time
+    assert [ ( item[0], item[1].name ) for item in result ] == [ ( 1, 'A' ), ( 2, 'B' ) ]
+
+    request = Request( uri='/Simple/test_create_many.<locals>.Batch', verb='CREATE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} )
+    request.data = [ { 'name': 'x' }, { 'name': 'y', 'size': 5 } ]
+    r = srv.dispatch( request )
+    assert r.http_code == 201
+    assert r.header_map[ 'Object-Id' ] == '/Simple/test_create_many.<locals>.Batch:21:22:'
+    assert r.data == { '/Simple/test_create_many.<locals>.Batch:21:': { 'id': 21, 'name': 'x', 'size': 1 }, '/Simple/test_create_many.<locals>.Batch:22:': { 'id': 22, 'name': 'y', 'size': 5 } }
+
+
+@pytest.mark.django_db( transaction=True )
+def test_update_many():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Mass( models.Model ):
+    name = models.CharField( max_length=20 )
+    size = models.IntegerField( default=1 )
+    updated = models.DateTimeField( auto_now=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class SavedMass( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    def save( self, *args, **kwargs ):
+      self.name = self.name.upper()
+      super().save( *args, **kwargs )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model( set_update=True )
+  class SetMass( models.Model ):
+    name = models.CharField( max_length=20 )
+    updated = models.DateTimeField( auto_now=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_update_many.<locals>.Mass' ]
+  saved_model = srv.getTestNS( 'Simple' ).element_map[ 'test_update_many.<locals>.SavedMass' ]
+  set_model = srv.getTestNS( 'Simple' ).element_map[ 'test_update_many.<locals>.SetMass' ]
+
+  with _model_tables( Mass, SavedMass, SetMass ):
+    for i in range( 0, 100 ):
+      Mass.objects.create( name='n{0}'.format( i ), size=i )
+
+    before = Mass.objects.get( pk=1 ).updated
+    transaction = model.transaction_class()
+    with CaptureQueriesContext( connection ) as ctx:
+      result = transaction.update_many( model, [ str( i ) for i in range( 1, 101 ) ], { 'size': 42 } )
+
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'SELECT', 'BEGIN', 'UPDATE', 'COMMIT' ]  # one bulk_update() for all of them
+    assert ' CASE ' in ctx.captured_queries[2][ 'sql' ]
+    assert list( result.keys() ) == [ str( i ) for i in range( 1, 101 ) ]
+    assert result[ '5' ].size == 42
+    assert Mass.objects.filter( size=42 ).count() == 100
+    assert Mass.objects.get( pk=1 ).name == 'n0'
+    assert Mass.objects.get( pk=1 ).updated > before
+    assert Mass.objects.get( pk=1 ).updated == result[ '99' ].updated
+
+    assert transaction.update_many( model, [ '1', '200' ], { 'size': 7 } ) == { '1': result[ '1' ], '200': None }
+    assert Mass.objects.filter( size=7 ).count() == 0  # nothing updated
+
+    with pytest.raises( ValueError ) as e:
+      transaction.update_many( model, [ '1', '2' ], { 'name': 'x' * 30 } )
+
+    assert list( e.value.args[0].keys() ) == [ '1', '2' ]
+    assert Mass.objects.filter( name='x' * 30 ).count() == 0
+
+    SavedMass.objects.create( name='a' )
+    SavedMass.objects.create( name='b' )
+    result = transaction.update_many( saved_model, [ '1', '2' ], { 'name': 'c' } )  # custom save(), saved one at a time
+    assert [ item.name for item in SavedMass.objects.all().order_by( 'pk' ) ] == [ 'C', 'C' ]
+
+    SetMass.objects.create( name='a' )
+    SetMass.objects.create( name='b' )
+    with CaptureQueriesContext( connection ) as ctx:
+      result = transaction.update_many( set_model, [ '1', '2' ], { 'name': 'd' } )  # set_update, a plain UPDATE ... WHERE pk IN ( ... )
+
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'SELECT', 'BEGIN', 'UPDATE', 'COMMIT' ]
+    assert ' CASE ' not in ctx.captured_queries[2][ 'sql' ]
+    assert [ item.name for item in SetMass.objects.all().order_by( 'pk' ) ] == [ 'd', 'd' ]
+    assert SetMass.objects.get( pk=2 ).updated == result[ '1' ].updated
+
+    request = Request( uri='/Simple/test_update_many.<locals>.Mass:3:4:', verb='UPDATE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} )
+    request.data = { 'name': 'z' }
+    r = srv.dispatch( request )
+    assert r.http_code == 200
+    assert r.header_map[ 'Multi-Object' ] == 'True'
+    assert r.data[ '/Simple/test_update_many.<locals>.Mass:4:' ][ 'name' ] == 'z'
+    assert Mass.objects.filter( name='z' ).count() == 2
+
+
+@pytest.mark.django_db( transaction=True )
+def test_update_fields():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Wide( models.Model ):
+    status = models.CharField( max_length=10 )
+    label = models.CharField( max_length=20, unique=True )
+    group = models.IntegerField()
+    rank = models.IntegerField()
+    status_upper = models.CharField( max_length=10, blank=True )
+
+    def clean( self ):
+      self.status_upper = self.status.upper()
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+      unique_together = ( ( 'group', 'rank' ), )
+
+  @cinp.model()
+  class Slugged( models.Model ):
+    name = models.CharField( max_length=20 )
+    slug = models.CharField( max_length=20, blank=True )
+
+    def save( self, *args, **kwargs ):
+      self.slug = self.name.lower().replace( ' ', '-' )
+      super().save( *args, **kwargs )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_update_fields.<locals>.Wide' ]
+  slugged_model = srv.getTestNS( 'Simple' ).element_map[ 'test_update_fields.<locals>.Slugged' ]
+
+  with _model_tables( Wide, Slugged ):
+    Slugged.objects.create( name='First One' )
+    Slugged.objects.create( name='Second One' )
+    transaction = slugged_model.transaction_class()
+    transaction.update( slugged_model, 1, { 'name': 'New Name' } )
+    assert Slugged.objects.get( pk=1 ).slug == 'new-name'  # save() changed it, so it has to be a full save
+    transaction.update_many( slugged_model, [ '1', '2' ], { 'name': 'Same Name' } )
+    assert [ item.slug for item in Slugged.objects.all().order_by( 'pk' ) ] == [ 'same-name', 'same-name' ]
+
+    Wide.objects.create( status='new', label='a', group=1, rank=1 )
+    Wide.objects.create( status='new', label='b', group=1, rank=2 )
+    transaction = model.transaction_class()
+
+    with CaptureQueriesContext( connection ) as ctx:
+      target_object = transaction.update( model, 1, { 'status': 'done' } )
+
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'SELECT', 'UPDATE' ]  # label's unique check is skipped, it is not being set
+    assert '"label"' not in ctx.captured_queries[1][ 'sql' ]
+    assert '"group"' not in ctx.captured_queries[1][ 'sql' ]
+    assert target_object.status_upper == 'DONE'
+    assert Wide.objects.get( pk=1 ).status_upper == 'DONE'  # changed by clean(), so it is saved too
+
+    with pytest.raises( ValueError ) as e:
+      transaction.update( model, 1, { 'rank': 2 } )  # group is not being set, but is still part of the unique check
+
+    assert list( e.value.args[0].keys() ) == [ '__all__' ]
+
+    with pytest.raises( ValueError ) as e:
+      transaction.update( model, 1, { 'label': 'b' } )
+
+    assert list( e.value.args[0].keys() ) == [ 'label' ]
+    assert Wide.objects.get( pk=1 ).label == 'a'
+
+
+@pytest.mark.django_db( transaction=True )
+def test_delete_many():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Doomed( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  deleted_list = []
+
+  @cinp.model()
+  class Tracked( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    def delete( self, *args, **kwargs ):
+      deleted_list.append( self.name )
+      return super().delete( *args, **kwargs )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_delete_many.<locals>.Doomed' ]
+  tracked_model = srv.getTestNS( 'Simple' ).element_map[ 'test_delete_many.<locals>.Tracked' ]
+
+  with _model_tables( Doomed, Tracked ):
+    for i in range( 0, 10 ):
+      Doomed.objects.create( name='n{0}'.format( i ) )
+
+    transaction = model.transaction_class()
+    with CaptureQueriesContext( connection ) as ctx:
+      assert transaction.delete_many( model, [ '1', '2', '3', '4' ] ) == []
+
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'SELECT', 'BEGIN', 'DELETE', 'COMMIT' ]  # one DELETE for all of them
+    assert Doomed.objects.count() == 6
+
+    assert transaction.delete_many( model, [ '5', '1', 'abc', '6' ] ) == [ '1', 'abc' ]
+    assert Doomed.objects.count() == 6  # nothing deleted
+
+    r = srv.handle( Request( uri='/Simple/test_delete_many.<locals>.Doomed:5:6:', verb='DELETE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 200
+    assert Doomed.objects.count() == 4
+
+    r = srv.handle( Request( uri='/Simple/test_delete_many.<locals>.Doomed:7:5:', verb='DELETE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 404
+    assert r.data == { 'model_path': '/Simple/test_delete_many.<locals>.Doomed', 'object_id': '5' }
+
+    for i in range( 0, 4 ):
+      Tracked.objects.create( name='t{0}'.format( i ) )
+
+    assert transaction.delete_many( tracked_model, [ '1', '3', '1' ] ) == []  # custom delete(), deleted one at a time
+    assert sorted( deleted_list ) == [ 't0', 't2' ]
+    assert list( Tracked.objects.all().order_by( 'pk' ).values_list( 'name', flat=True ) ) == [ 't1', 't3' ]
+
+    r = srv.handle( Request( uri='/Simple/test_delete_many.<locals>.Tracked:2:', verb='DELETE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 200
+    assert deleted_list[-1] == 't1'
+
+
+@pytest.mark.django_db( transaction=True )
+def test_check_auth_objects():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+  auth_calls = []
+
+  @cinp.model()
+  class Guarded( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None, object_map=None ):
+      auth_calls.append( ( verb, action, object_map ) )
+      return object_map is None or all( target_object is None or target_object.name != 'secret' for target_object in object_map.values() )
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+
+  with _model_tables( Guarded ):
+    Guarded.objects.create( name='a' )
+    Guarded.objects.create( name='secret' )
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.handle( Request( uri='/Simple/test_check_auth_objects.<locals>.Guarded:1:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert r.data == { 'id': 1, 'name': 'a' }
+    assert len( ctx.captured_queries ) == 1  # loaded once for checkAuth and GET
+    assert auth_calls[ -1 ][ 2 ][ '1' ].name == 'a'
+
+    r = srv.handle( Request( uri='/Simple/test_check_auth_objects.<locals>.Guarded:1:2:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 403
+
+    r = srv.handle( Request( uri='/Simple/test_check_auth_objects.<locals>.Guarded:3:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+    assert r.http_code == 404
+    assert auth_calls[ -1 ][ 2 ] == { '3': None }
+
+    action_auth = make_action_auth( Guarded.checkAuth, 'hello' )  # actions pass the objects through too
+    assert action_auth( None, 'CALL', [ '1' ], object_map={ '1': None } ) is True
+    assert auth_calls[ -1 ] == ( 'CALL', 'hello', { '1': None } )
+    assert make_action_auth( max, 4 )( 1, 2, 3 ) == 4  # a builtin, no signature to inspect, so no object_map
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.handle( Request( uri='/Simple/test_check_auth_objects.<locals>.Guarded:1:', verb='DELETE', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert [ item[ 'sql' ].split( ' ' )[0] for item in ctx.captured_queries ] == [ 'SELECT', 'SELECT', 'BEGIN', 'DELETE', 'COMMIT' ]  # the write reads the objects again after the transaction is started, sqlite puts off the BEGIN until the first write
+    assert Guarded.objects.count() == 1
+
+
+@pytest.mark.django_db( transaction=True )
+def test_list_total():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Counted( models.Model ):
+    name = models.CharField( max_length=20 )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_list_total.<locals>.Counted' ]
+
+  with _model_tables( Counted ):
+    for i in range( 0, 5 ):
+      Counted.objects.create( name='c{0}'.format( i ) )
+
+    transaction = model.transaction_class()
+    with CaptureQueriesContext( connection ) as ctx:
+      assert transaction.list( model, None, {}, 0, 2 )[ 0:3 ] == ( [ 1, 2 ], 0, 5 )
+
+    assert len( ctx.captured_queries ) == 2  # the page and the COUNT
+
+    with CaptureQueriesContext( connection ) as ctx:
+      assert transaction.list( model, None, {}, 2, 2 )[ 0:3 ] == ( [ 3, 4 ], 2, 5 )
+
+    assert len( ctx.captured_queries ) == 1  # the total is cached
+
+    with CaptureQueriesContext( connection ) as ctx:
+      assert transaction.list( model, None, {}, 4, 2 )[ 0:3 ] == ( [ 5 ], 4, 5 )
+      assert transaction.list( model, None, {}, 0, 2, total_mode='none' )[ 0:3 ] == ( [ 1, 2 ], 0, None )
+      assert transaction.list( model, None, {}, 0, 2, total_mode='estimate' )[ 0:3 ] == ( [ 1, 2 ], 0, 5 )  # no estimate on sqlite, falls back to the cached total
+
+    assert len( ctx.captured_queries ) == 3
+
+    transaction.create( model, { 'name': 'c5' } )
+
+    with CaptureQueriesContext( connection ) as ctx:
+      assert transaction.list( model, None, {}, 0, 2 )[ 0:3 ] == ( [ 1, 2 ], 0, 6 )
+
+    assert len( ctx.captured_queries ) == 2  # CREATE dropped the cached total
+
+    model._django_filter_funcs_map[ 'named' ] = lambda name: Counted.objects.filter( name=name )
+    assert transaction.list( model, 'named', { 'name': 'c1' }, 0, 0 )[2] == 1
+    transaction.update( model, '3', { 'name': 'c1' } )
+    assert transaction.list( model, 'named', { 'name': 'c1' }, 0, 0 )[2] == 2  # UPDATE can change what a filter matches
+    transaction.update_many( model, [ '4', '5' ], { 'name': 'c1' } )
+    assert transaction.list( model, 'named', { 'name': 'c1' }, 0, 0 )[2] == 4
+
+    r = srv.dispatch( Request( uri='/Simple/test_list_total.<locals>.Counted', verb='LIST', header_map={ 'CINP-VERSION': '2.0', 'INCLUDE-TOTAL': 'False', 'COUNT': '2' }, cookie_map={} ) )
+    assert r.http_code == 200
+    assert 'Total' not in r.header_map
+    assert r.data == [ '/Simple/test_list_total.<locals>.Counted:1:', '/Simple/test_list_total.<locals>.Counted:2:' ]
+
+
+@pytest.mark.django_db( transaction=True )
+def test_list_cursor():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Ranked( models.Model ):
+    rank = models.IntegerField()
+    note = models.CharField( max_length=20, null=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+      ordering = [ '-rank' ]
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_list_cursor.<locals>.Ranked' ]
+
+  with _model_tables( Ranked ):
+    for rank in ( 3, 1, 3, 2, 1, 3, 2 ):
+      Ranked.objects.create( rank=rank )
+
+    expected = list( Ranked.objects.order_by( '-rank', 'pk' ).values_list( 'pk', flat=True ) )
+    assert expected == [ 1, 3, 6, 4, 7, 2, 5 ]
+
+    transaction = model.transaction_class()
+    ( id_list, position, total, cursor ) = transaction.list( model, None, {}, 0, 3 )
+    assert ( id_list, position, total ) == ( expected[ 0:3 ], 0, 7 )
+    assert cursor is not None
+
+    ( id_list, position, total, cursor ) = transaction.list( model, None, {}, 3, 3, cursor=cursor )
+    assert id_list == expected[ 3:6 ]
+
+    ( id_list, position, total, cursor ) = transaction.list( model, None, {}, 6, 3, cursor=cursor )
+    assert id_list == expected[ 6: ]
+    assert cursor is None  # short page, nothing more
+
+    with pytest.raises( ValueError ):
+      transaction.list( model, None, {}, 0, 3, cursor='garbage' )
+
+    Ranked._meta.ordering = [ 'note' ]  # nullable, can not seek on it, fall back to offsets
+    try:
+      assert transaction.list( model, None, {}, 0, 3 )[3] is None
+
+      with pytest.raises( ValueError ):
+        transaction.list( model, None, {}, 0, 3, cursor='W1sicGsiXSwgWzJdXQ' )
+
+    finally:
+      Ranked._meta.ordering = [ '-rank' ]
+
+    r = srv.dispatch( Request( uri='/Simple/test_list_cursor.<locals>.Ranked', verb='LIST', header_map={ 'CINP-VERSION': '2.0', 'COUNT': '4', 'ID-ONLY': 'True' }, cookie_map={} ) )
+    assert r.http_code == 200
+    assert r.data == [ str( i ) for i in expected[ 0:4 ] ]
+
+    r = srv.dispatch( Request( uri='/Simple/test_list_cursor.<locals>.Ranked', verb='LIST', header_map={ 'CINP-VERSION': '2.0', 'COUNT': '4', 'POSITION': '4', 'CURSOR': r.header_map[ 'Cursor' ], 'ID-ONLY': 'True' }, cookie_map={} ) )
+    assert r.http_code == 200
+    assert r.data == [ str( i ) for i in expected[ 4: ] ]
+    assert 'Cursor' not in r.header_map
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_list_cursor.<locals>.Ranked', verb='LIST', header_map={ 'CINP-VERSION': '2.0', 'COUNT': '4', 'VALUES': 'True', 'INCLUDE-TOTAL': 'False' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert len( ctx.captured_queries ) == 1  # the ids and the records in one query
+    assert list( r.data.keys() ) == [ '/Simple/test_list_cursor.<locals>.Ranked:{0}:'.format( i ) for i in expected[ 0:4 ] ]
+    assert r.data[ '/Simple/test_list_cursor.<locals>.Ranked:1:' ] == { 'id': 1, 'rank': 3, 'note': None }
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_list_cursor.<locals>.Ranked', verb='LIST', header_map={ 'CINP-VERSION': '2.0', 'COUNT': '4', 'POSITION': '4', 'CURSOR': r.header_map[ 'Cursor' ], 'VALUES': 'True', 'INCLUDE-TOTAL': 'False' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert len( ctx.captured_queries ) == 1
+    assert list( r.data.keys() ) == [ '/Simple/test_list_cursor.<locals>.Ranked:{0}:'.format( i ) for i in expected[ 4: ] ]
+    assert 'Cursor' not in r.header_map
+
+
+@pytest.mark.django_db( transaction=True )
+def test_list_cursor_datetime():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Stamped( models.Model ):
+    created = models.DateTimeField()
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+      ordering = [ 'created' ]
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_list_cursor_datetime.<locals>.Stamped' ]
+  model._django_filter_funcs_map[ 'since' ] = lambda first: Stamped.objects.filter( pk__gte=first )  # list_filter does not work on a class in a function
+
+  with _model_tables( Stamped ):
+    start = datetime( 2020, 1, 2, 3, 4, 5, 0, tzinfo=timezone.utc )
+    for i in range( 0, 6 ):  # all in the same millisecond
+      Stamped.objects.create( created=start + timedelta( microseconds=( 5 - i ) * 10 ) )
+
+    expected = list( Stamped.objects.order_by( 'created', 'pk' ).values_list( 'pk', flat=True ) )
+    assert expected == [ 6, 5, 4, 3, 2, 1 ]
+
+    transaction = model.transaction_class()
+    result = []
+    cursor = None
+    for position in range( 0, 6, 2 ):
+      ( id_list, _, _, cursor ) = transaction.list( model, None, {}, position, 2, cursor=cursor )
+      result += id_list
+
+    assert result == expected
+    assert cursor is not None
+
+    ( id_list, _, _, cursor ) = transaction.list( model, 'since', { 'first': 3 }, 0, 2 )
+    assert id_list == [ 6, 5 ]
+    assert transaction.list( model, 'since', { 'first': 3 }, 2, 2, cursor=cursor )[0] == [ 4, 3 ]
+
+    with pytest.raises( ValueError ):
+      transaction.list( model, None, {}, 2, 2, cursor=cursor )  # a different filter
+
+    with pytest.raises( ValueError ):
+      transaction.list( model, 'since', { 'first': 1 }, 2, 2, cursor=cursor )
+
+
+@pytest.mark.django_db( transaction=True )
+def test_loading_plan():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class PlanOwner( models.Model ):
+    name = models.CharField( max_length=20, primary_key=True )
+    code = models.CharField( max_length=20, unique=True, null=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class PlanTag( models.Model ):
+    name = models.CharField( max_length=20, primary_key=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class PlanGadget( models.Model ):
+    owner = models.ForeignKey( PlanOwner, on_delete=models.CASCADE )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class PlanBundle( models.Model ):
+    owner = models.OneToOneField( PlanOwner, on_delete=models.CASCADE )
+    sponsor = models.ForeignKey( PlanOwner, to_field='code', on_delete=models.CASCADE, related_name='+' )
+    tag_list = models.ManyToManyField( PlanTag )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_loading_plan.<locals>.PlanGadget' ]
+  assert model._django_select_related == ()  # served from owner_id
+  assert model._django_prefetch_related == ()
+  assert model.field_map[ 'owner' ].id_attribute == 'owner_id'
+
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_loading_plan.<locals>.PlanBundle' ]
+  assert model._django_select_related == ( 'sponsor', )  # not pointing at the pk, so the related object is needed
+  assert model._django_prefetch_related == ( 'tag_list', )
+  assert model.field_map[ 'owner' ].id_attribute == 'owner_id'
+  assert model.field_map[ 'sponsor' ].id_attribute is None
+
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_loading_plan.<locals>.PlanTag' ]
+  assert model._django_select_related == ()
+  assert model._django_prefetch_related == ()
+
+  with _model_tables( PlanOwner, PlanGadget ):
+    for i in range( 0, 10 ):
+      PlanGadget.objects.create( owner=PlanOwner.objects.create( name='owner{0}'.format( i ) ) )
+
+    id_list = [ str( i ) for i in range( 1, 11 ) ]
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_loading_plan.<locals>.PlanGadget:{0}:'.format( ':'.join( id_list ) ), verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert r.data[ '/Simple/test_loading_plan.<locals>.PlanGadget:4:' ] == { 'id': 4, 'owner': '/Simple/test_loading_plan.<locals>.PlanOwner:owner3:' }
+    assert len( ctx.captured_queries ) == 1
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_loading_plan.<locals>.PlanGadget:5:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert len( ctx.captured_queries ) == 1
+
+
+@pytest.mark.django_db( transaction=True )
+def test_fk_id_attribute():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class FKTarget( models.Model ):
+    name = models.CharField( max_length=20, primary_key=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  @cinp.model()
+  class FKSource( models.Model ):
+    fk0 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk1 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk2 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk3 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk4 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk5 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk6 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk7 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk8 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+    fk9 = models.ForeignKey( FKTarget, on_delete=models.CASCADE, related_name='+', null=True )
+
+    @cinp.check_auth()
+    @staticmethod
+    def checkAuth( user, verb, id_list, action=None ):
+      return True
+
+    class Meta:
+      app_label = 'testing'
+
+  srv = MockServer( cinp )
+  model = srv.getTestNS( 'Simple' ).element_map[ 'test_fk_id_attribute.<locals>.FKSource' ]
+  converter = DjangoConverter( srv )
+
+  with _model_tables( FKTarget, FKSource ):
+    target_list = [ FKTarget.objects.create( name='target{0}'.format( i ) ) for i in range( 0, 10 ) ]
+    FKSource.objects.create( **dict( ( 'fk{0}'.format( i ), target_list[ i ] ) for i in range( 0, 10 ) ) )
+    FKSource.objects.create()
+
+    source = FKSource.objects.get( pk=1 )
+    with CaptureQueriesContext( connection ) as ctx:
+      result = model._asDict( converter, source )
+
+    assert len( ctx.captured_queries ) == 0  # was one query per foreign key
+    assert result == dict( [ ( 'id', 1 ) ] + [ ( 'fk{0}'.format( i ), '/Simple/test_fk_id_attribute.<locals>.FKTarget:target{0}:'.format( i ) ) for i in range( 0, 10 ) ] )
+
+    source = FKSource.objects.get( pk=2 )
+    with CaptureQueriesContext( connection ) as ctx:
+      result = model._asDict( converter, source )
+
+    assert len( ctx.captured_queries ) == 0
+    assert result == dict( [ ( 'id', 2 ) ] + [ ( 'fk{0}'.format( i ), None ) for i in range( 0, 10 ) ] )
+
+    with CaptureQueriesContext( connection ) as ctx:
+      r = srv.dispatch( Request( uri='/Simple/test_fk_id_attribute.<locals>.FKSource:1:2:', verb='GET', header_map={ 'CINP-VERSION': '2.0' }, cookie_map={} ) )
+
+    assert r.http_code == 200
+    assert len( ctx.captured_queries ) == 1
+
+
 def test_basic_auth_check():
   global last_permission, permission_result
 
@@ -734,3 +1514,95 @@ def test_basic_auth_check():
     permission_result = False
     assert DjangoCInP.basic_auth_check( user, 'CALL', 'please', model, { 'please': [ 'mayi', 'mabeynot' ] } ) is False
     assert last_permission == 'mabeynot'
+
+
+class testCachedAuthUser():
+  def __init__( self, pk, permission_list ):
+    self.pk = pk
+    self.is_superuser = False
+    self.permission_list = permission_list
+    self.lookup_count = 0
+
+  def get_all_permissions( self ):
+    self.lookup_count += 1
+    return set( self.permission_list )
+
+  def has_perm( self, permission ):
+    raise Exception( 'should be using the permission cache' )
+
+
+class ListPermissionsBackend():  # like ModelBackend, with out needing django.contrib.auth installed
+  def has_perm( self, user_obj, permission, obj=None ):
+    return False
+
+  def get_all_permissions( self, user_obj, obj=None ):
+    return set()
+
+
+class HasPermOnlyBackend():  # ie: an object level permission backend
+  def has_perm( self, user_obj, permission, obj=None ):
+    return False
+
+
+def test_basic_auth_check_cache( settings ):
+  model = testAuthModel( 'tlabel', 'tmodel' )
+  permission_cache_invalidate()
+  settings.AUTHENTICATION_BACKENDS = [ 'cinp.orm_django_test.ListPermissionsBackend' ]
+
+  user = testCachedAuthUser( 1, [ 'tlabel.view_tmodel', 'tlabel.add_tmodel', 'mayi' ] )
+  assert DjangoCInP.basic_auth_check( user, 'GET', None, model ) is True
+  assert DjangoCInP.basic_auth_check( user, 'CREATE', None, model ) is True
+  assert DjangoCInP.basic_auth_check( user, 'UPDATE', None, model ) is False
+  assert DjangoCInP.basic_auth_check( user, 'CALL', 'please', model, { 'please': [ 'mabeynot', 'mayi' ] } ) is True
+  assert DjangoCInP.basic_auth_check( user, 'CALL', 'please', model, { 'please': 'mabeynot' } ) is False
+  assert user.lookup_count == 1
+
+  other_user = testCachedAuthUser( 2, [] )
+  assert DjangoCInP.basic_auth_check( other_user, 'CREATE', None, model ) is False
+  assert other_user.lookup_count == 1
+
+  user = testCachedAuthUser( 1, [ 'tlabel.change_tmodel' ] )  # a new user object for the same user, like get_user makes every request
+  assert DjangoCInP.basic_auth_check( user, 'UPDATE', None, model ) is False  # still the cached permissions
+  assert user.lookup_count == 0
+
+  permission_cache_invalidate( 1 )
+  assert DjangoCInP.basic_auth_check( user, 'UPDATE', None, model ) is True
+  assert DjangoCInP.basic_auth_check( other_user, 'CREATE', None, model ) is False
+  assert user.lookup_count == 1
+  assert other_user.lookup_count == 1
+
+  permission_cache_invalidate()
+  assert DjangoCInP.basic_auth_check( other_user, 'CREATE', None, model ) is False
+  assert other_user.lookup_count == 2
+
+
+class testHasPermUser( testCachedAuthUser ):
+  def has_perm( self, permission ):
+    return permission == 'tlabel.change_tmodel'
+
+
+def test_basic_auth_check_cache_backends( settings ):
+  model = testAuthModel( 'tlabel', 'tmodel' )
+  permission_cache_invalidate()
+
+  settings.AUTHENTICATION_BACKENDS = [ 'cinp.orm_django_test.ListPermissionsBackend', 'cinp.orm_django_test.HasPermOnlyBackend' ]
+  user = testHasPermUser( 1, [] )
+  assert DjangoCInP.basic_auth_check( user, 'UPDATE', None, model ) is True  # get_all_permissions would not know about it
+  assert user.lookup_count == 0
+
+  settings.AUTHENTICATION_BACKENDS = [ 'cinp.orm_django_test.ListPermissionsBackend' ]
+  assert DjangoCInP.basic_auth_check( user, 'UPDATE', None, model ) is False
+  assert user.lookup_count == 1
+  permission_cache_invalidate()
+
+
+def test_model_permission_map():
+  cinp = DjangoCInP( 'Simple', '0.1' )
+
+  @cinp.model()
+  class Permed( models.Model ):
+    class Meta:
+      app_label = 'testing'
+
+  assert _model_permission_map( Permed ) == { 'GET': 'testing.view_permed', 'LIST': 'testing.view_permed', 'CREATE': 'testing.add_permed', 'UPDATE': 'testing.change_permed', 'DELETE': 'testing.delete_permed' }
+  assert _model_permission_map( Permed ) is _model_permission_map( Permed )  # computed when it was registered
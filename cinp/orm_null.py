@@ -145,13 +145,16 @@ class NullTransaction():
   def get( self, model, object_id ):
     return None
 
+  def get_many( self, model, id_list ):
+    return dict( [ ( object_id, None ) for object_id in id_list ] )
+
   def create( self, model, value_map ):
     pass
 
   def update( self, model, object_id, value_map ):
     return None
 
-  def list( self, model, filter_name, filter_values, position, count ):
+  def list( self, model, filter_name, filter_values, position, count, total_mode='exact', cursor=None, values=False ):
     return []
 
   def delete( self, model, object_id ):
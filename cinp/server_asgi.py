@@ -0,0 +1,497 @@
+import queue
+import asyncio
+import logging
+import functools
+from http.cookies import SimpleCookie, CookieError
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from cinp import json_codec
+from cinp.server_common import Server, Request, Response, Namespace, Converter, Action, InvalidRequest, STREAM_CHUNK_SIZE, INCREMENTAL_PARSE_SIZE, __MAX_REQUEST_SIZE__
+
+# the sync parts of the request, (ORM, auth, path handlers, etc) are run in a thread pool of this size
+WORKER_COUNT = 10
+
+
+class NoCINP( Exception ):
+  pass
+
+
+class ClientDisconnect( Exception ):
+  pass
+
+
+class AsgiServer( Server ):
+  """
+  ASGI version of WerkzeugServer, for uvicorn and friends, ie:
+
+    app = AsgiServer( root_path='/api/', root_version='0.1' )
+    app.registerNamespace( '/', 'myapp' )
+    app.validate()
+
+    uvicorn <module>:app
+
+  Actions with an async_func (async def actions) are awaited in the event loop,
+  everything else is run in a bounded thread pool of worker_count threads, the
+  same way WerkzeugServer runs it.  A request holds one worker thread while it
+  is handled and its response is sent, the transaction and streamed responses
+  are bound to the thread they were started in, ie: django's connections are
+  per thread.  Async actions let go of the worker before the async_func is
+  awaited, and are not run in a transaction, so a long poll holds neither.
+  """
+  def __init__( self, *args, worker_count=WORKER_COUNT, **kwargs ):
+    super().__init__( *args, **kwargs )
+    self.executor = ThreadPoolExecutor( max_workers=worker_count, thread_name_prefix='cinp-worker' )
+
+  def _isAsyncCall( self, request ):
+    if request.verb != 'CALL':
+      return False
+
+    try:
+      ( route_path, _, _ ) = self._splitURI( request.uri )
+    except ValueError:
+      return False
+
+    route = self.route_map.get( route_path, None )
+    return route is not None and isinstance( route.element, Action ) and route.element.async_func is not None
+
+  def _handleSync( self, scope, stream ):  # run in the request's worker thread, returns ( request, response ), response is None if the request is for an async action
+    request = AsgiRequest( scope, stream, max_request_size=self.maxRequestSize )
+    if self._isAsyncCall( request ):
+      return ( request, None )
+
+    return ( request, self.handle( request ) )
+
+  def _inTransaction( self, transaction, func, *args ):  # like _executeDispatch, for the sync parts of async actions, they each get a transaction of their own
+    transaction.start()
+    try:
+      result = func( *args )
+    except Exception as e:
+      try:
+        transaction.abort()
+      except Exception as inner_e:
+        logging.exception( 'Problem aborting the transaction, "{0}"({1})'.format( inner_e, type( inner_e ).__name__ ) )
+
+      raise e
+
+    transaction.commit()
+    return result
+
+  async def dispatchAsync( self, request, run_sync ):
+    target = await run_sync( self._prepareDispatch, request )
+    if isinstance( target, Response ):
+      return target
+
+    ( element, converter, transaction, id_list, user, multi ) = target
+
+    async def run_sync_transaction( func, *args ):  # the transaction is started and committed in the same run_sync call, so it is in one thread, and is not held open while async_func is awaited
+      return await run_sync( self._inTransaction, transaction, func, *args )
+
+    return await element.callAsync( run_sync_transaction, converter, transaction, id_list, request.data, user, multi )
+
+  async def _handleAsync( self, request, receive, run_sync ):  # returns None if the client goes away before the action is done, long polls get canceled this way
+    call = asyncio.ensure_future( self.dispatchAsync( request, run_sync ) )
+    disconnect = asyncio.ensure_future( _waitDisconnect( receive ) )
+    try:
+      await asyncio.wait( ( call, disconnect ), return_when=asyncio.FIRST_COMPLETED )
+    finally:
+      disconnect.cancel()
+
+    if not call.done():
+      call.cancel()
+      await asyncio.wait( ( call, ) )
+      return None
+
+    try:
+      response = call.result()
+
+    except Exception as e:
+      response = self._exceptionResponse( request, e )
+
+    return self._finishResponse( response )
+
+  async def handleAsync( self, scope, receive, run_sync ):
+    try:
+      ( request, response ) = await run_sync( self._handleSync, scope, _ReceiveStream( receive, asyncio.get_running_loop() ) )
+      if response is None:
+        run_sync.release()  # don't hold a worker while the async_func is awaited, ie: a long poll
+        response = await self._handleAsync( request, receive, run_sync )
+        if response is None:
+          return None
+
+      if not isinstance( response, Response ):
+        if self.debug:
+          message = 'Invalid Response from handle, got "{0}" expected Response'.format( type( response ).__name__ )
+        else:
+          message = 'Invalid Response from handle'
+
+        response = Response( 500, data={ 'message': message } )
+
+    except ClientDisconnect:
+      return None
+
+    except InvalidRequest as e:
+      response = e.asResponse()
+
+    except Exception as e:
+      logging.exception( 'Top level Exception, "{0}"({1})'.format( e, type( e ).__name__ ) )
+      if self.debug:
+        message = 'Top level Exception, "{0}"({1})'.format( e, type( e ).__name__ )
+      else:
+        message = 'Top level Exception'
+
+      response = Response( 500, data={ 'message': message } )
+
+    return response
+
+  async def __call__( self, scope, receive, send ):
+    """
+    called by the ASGI server for every request
+    """
+    if scope[ 'type' ] == 'lifespan':
+      await self._lifespan( receive, send )
+      return
+
+    if scope[ 'type' ] != 'http':
+      raise ValueError( 'Unsupported ASGI scope type "{0}"'.format( scope[ 'type' ] ) )
+
+    run_sync = _PinnedWorker( self.executor, asyncio.get_running_loop() )
+    try:
+      response = await self.handleAsync( scope, receive, run_sync )
+      if response is None:  # nobody to send it to
+        return
+
+      try:
+        asgi_response = AsgiResponse( response )
+
+      except Exception as e:  # last ditch effort, the response it's self could not be converted
+        logging.exception( 'Exception building the response, "{0}"({1})'.format( e, type( e ).__name__ ) )
+        asgi_response = AsgiResponse( Response( 500, data='Error building the response', content_type='text' ) )
+
+      await asgi_response.send( send, run_sync )
+
+    finally:
+      run_sync.release()
+
+  async def _lifespan( self, receive, send ):
+    while True:
+      message = await receive()
+      if message[ 'type' ] == 'lifespan.startup':
+        await send( { 'type': 'lifespan.startup.complete' } )
+
+      elif message[ 'type' ] == 'lifespan.shutdown':
+        self.executor.shutdown( wait=False )
+        await send( { 'type': 'lifespan.shutdown.complete' } )
+        return
+
+  # add a namespace to the path, either from included module, or an empty namespace with name and version
+  def registerNamespace( self, path, module=None, name=None, version=None ):
+    if module is None:
+      if name is None or version is None:
+        raise ValueError( 'name and version must be specified if no module is specified' )
+
+      namespace = Namespace( name=name, version=version, converter=Converter( self.uri ) )
+
+    else:
+      if isinstance( module, Namespace ):
+        namespace = module
+
+      else:
+        module = import_module( '{0}.models'.format( module ) )
+        if not hasattr( module, 'cinp' ):
+          raise NoCINP( 'module "{0}" missing cinp'.format( module ) )
+
+        namespace = module.cinp.getNamespace( self.uri )
+
+    super().registerNamespace( path, namespace )
+
+
+async def _waitDisconnect( receive ):
+  while True:
+    message = await receive()
+    if message[ 'type' ] == 'http.disconnect':
+      return
+
+
+def _setFutureResult( future, result ):
+  if not future.done():
+    future.set_result( result )
+
+
+def _setFutureException( future, exception ):
+  if not future.done():
+    future.set_exception( exception )
+
+
+class _PinnedWorker():  # a run_sync that runs every func in the same one of executor's threads, the thread is held until release, after that each func goes to what ever thread is free
+  def __init__( self, executor, loop ):
+    super().__init__()
+    self._executor = executor
+    self._loop = loop
+    self._queue = queue.SimpleQueue()
+    executor.submit( self._run )
+
+  def _run( self ):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+
+      ( future, func, args ) = item
+      try:
+        result = func( *args )
+      except BaseException as e:
+        self._loop.call_soon_threadsafe( _setFutureException, future, e )
+      else:
+        self._loop.call_soon_threadsafe( _setFutureResult, future, result )
+
+  async def __call__( self, func, *args ):
+    if self._queue is None:
+      return await self._loop.run_in_executor( self._executor, functools.partial( func, *args ) )
+
+    future = self._loop.create_future()
+    self._queue.put( ( future, func, args ) )
+    return await future
+
+  def release( self ):
+    if self._queue is not None:
+      self._queue.put( None )
+      self._queue = None
+
+
+class _ReceiveStream():  # file like reader of the request body, read from the worker threads, the receive calls are run in the event loop
+  def __init__( self, receive, loop ):
+    super().__init__()
+    self._receive = receive
+    self._loop = loop
+    self._buff = bytearray()
+    self._done = False
+    self.limit = None  # if set, reading more than limit bytes raises InvalidRequest
+
+  def _next( self ):
+    message = asyncio.run_coroutine_threadsafe( self._receive(), self._loop ).result()
+    if message[ 'type' ] == 'http.disconnect':
+      raise ClientDisconnect()
+
+    self._done = not message.get( 'more_body', False )
+    return message.get( 'body', b'' )
+
+  def read( self, size=-1 ):
+    while not self._done and ( size < 0 or len( self._buff ) < size ):
+      self._buff += self._next()
+      if self.limit is not None and len( self._buff ) > self.limit:
+        raise InvalidRequest( 'Request body too large' )
+
+    if size < 0 or size >= len( self._buff ):
+      result = bytes( self._buff )
+      self._buff.clear()
+    else:
+      result = bytes( self._buff[ 0:size ] )
+      del self._buff[ 0:size ]
+
+    if self.limit is not None:
+      self.limit -= len( result )
+
+    return result
+
+  def readinto( self, buff ):  # returns what has arrived, up to len( buff ), 0 at the end
+    while not self._buff and not self._done:
+      chunk = self._next()
+      if self.limit is not None and len( chunk ) > self.limit:
+        raise InvalidRequest( 'Request body too large' )
+
+      count = min( len( chunk ), len( buff ) )
+      if count:
+        buff[ :count ] = memoryview( chunk )[ :count ]
+        self._buff += memoryview( chunk )[ count: ]
+        if self.limit is not None:
+          self.limit -= count
+
+        return count
+
+    count = min( len( self._buff ), len( buff ) )
+    buff[ :count ] = self._buff[ :count ]
+    del self._buff[ :count ]
+    if self.limit is not None:
+      self.limit -= count
+
+    return count
+
+  def readall( self ):
+    return self.read()
+
+
+class AsgiRequest( Request ):
+  def __init__( self, scope, stream, max_request_size=__MAX_REQUEST_SIZE__, *args, **kwargs ):  # max_request_size can also be a function that takes the uri, ie: Server.maxRequestSize
+    header_map = {}
+    for ( key, value ) in scope[ 'headers' ]:
+      header_map[ key.decode( 'latin-1' ).upper().replace( '_', '-' ) ] = value.decode( 'latin-1' )
+
+    cookie_map = {}
+    if 'COOKIE' in header_map:
+      try:
+        cookie_map = dict( ( key, morsel.value ) for ( key, morsel ) in SimpleCookie( header_map[ 'COOKIE' ] ).items() )
+      except CookieError:
+        pass
+
+    # root_path is the ASGI version of script_root, some servers include it in path, some don't
+    root_path = scope.get( 'root_path', '' )
+    uri = scope[ 'path' ]
+    if not uri.startswith( root_path ):
+      uri = root_path + uri
+
+    if callable( max_request_size ):
+      max_request_size = max_request_size( uri )
+
+    self.max_request_size = max_request_size
+
+    super().__init__( verb=scope[ 'method' ].upper(), uri=uri, header_map=header_map, cookie_map=cookie_map, *args, **kwargs )
+
+    content_type = self.header_map.get( 'CONTENT-TYPE', None )
+    try:
+      content_length = int( self.header_map[ 'CONTENT-LENGTH' ] )
+    except ( KeyError, ValueError ):
+      content_length = None
+
+    if content_length is not None and content_length > self.max_request_size and content_type is not None and not content_type.startswith( 'application/octet-stream' ):
+      raise InvalidRequest( 'Request body too large' )
+
+    if content_type is not None:  # if it is none, there isn't (or shouldn't) be anything to bring in anyway
+      if content_type.startswith( 'application/octet-stream' ):
+        self.stream = stream  # down stream is going to have to read from the stream
+
+      else:
+        stream.limit = self.max_request_size
+        if content_type.startswith( 'application/json' ):
+          self.fromJSON( stream, incremental=content_length is None or content_length > INCREMENTAL_PARSE_SIZE )
+
+        elif content_type.startswith( 'text/plain' ):
+          self.fromText( stream )
+
+        elif content_type.startswith( 'application/xml' ):
+          self.fromXML( stream )
+
+        elif content_type.startswith( 'application/x-www-form-urlencoded' ):
+          self.fromURLEncodedForm( stream )
+
+        else:
+          raise InvalidRequest( message='Unknown Content-Type "{0}"'.format( content_type ) )
+
+    client = scope.get( 'client', None )
+    self.remote_addr = client[0] if client else None
+    self.is_secure = scope.get( 'scheme', 'http' ) in ( 'https', 'wss' )
+
+  def read( self, size ):
+    return self.stream.read( size )
+
+  def readinto( self, buff ):
+    return self.stream.readinto( buff )
+
+
+def _dumpCookie( key, value, max_age, expires, path, domain, secure, httponly, samesite ):
+  cookie = SimpleCookie()
+  cookie[ key ] = value
+  morsel = cookie[ key ]
+  for ( name, attribute ) in ( ( 'max-age', max_age ), ( 'expires', expires ), ( 'path', path ), ( 'domain', domain ), ( 'samesite', samesite ) ):
+    if attribute is not None:
+      morsel[ name ] = attribute
+
+  morsel[ 'secure' ] = secure
+  morsel[ 'httponly' ] = httponly
+
+  return morsel.OutputString()
+
+
+def _iterChunks( body ):  # body is a file like object or an iterable of bytes/str
+  if hasattr( body, 'read' ):
+    try:
+      for buff in iter( functools.partial( body.read, STREAM_CHUNK_SIZE ), b'' ):
+        yield buff
+    finally:
+      body.close()
+
+  else:
+    for buff in body:
+      if isinstance( buff, str ):
+        buff = buff.encode( 'utf-8' )
+
+      if buff:
+        yield buff
+
+
+class AsgiResponse():
+  def __init__( self, response ):
+    if not isinstance( response, Response ):
+      raise ValueError( 'response must be of type Response' )
+
+    super().__init__()
+    self.status = response.http_code
+    self.header_list = []
+    for name in response.header_map:
+      self.header_list.append( ( name.encode( 'latin-1' ), str( response.header_map[ name ] ).encode( 'latin-1' ) ) )
+
+    for ( key, value, max_age, expires, path, domain, secure, httponly, samesite ) in response.cookie_list:
+      self.header_list.append( ( b'set-cookie', _dumpCookie( key, value, max_age, expires, path, domain, secure, httponly, samesite ).encode( 'latin-1' ) ) )
+
+    if response.content_type == 'json':
+      content_type = 'application/json;charset=utf-8'
+      if response.stream is not None:
+        self.body = response.stream.encoded() or response.stream  # streamed by send if it's more than one chunk
+      elif response.encoded_data is not None:
+        self.body = response.encoded_data
+      elif response.data is None:
+        self.body = b''
+      else:
+        self.body = json_codec.dumps( response.data )
+
+    elif response.content_type == 'xml':
+      content_type = 'application/xml;charset=utf-8'
+      self.body = b'<xml>Not Implemented</xml>'
+
+    elif response.content_type == 'bytes':
+      content_type = 'application/octet-stream'
+      if response.data is None:
+        self.body = b''
+      elif isinstance( response.data, str ):
+        self.body = response.data.encode( 'utf-8' )
+      else:
+        self.body = response.data
+
+    else:
+      if response.content_type == 'text':
+        content_type = 'text/plain;charset=utf-8'
+      else:
+        content_type = response.content_type + ';charset=utf-8'
+
+      if response.data is None:
+        self.body = b''
+      else:
+        self.body = response.data.encode( 'utf-8' )
+
+    self.header_list.append( ( b'content-type', content_type.encode( 'latin-1' ) ) )
+
+  async def send( self, send, run_sync ):
+    """
+    send the response with the ASGI send callable.  bytes bodies go in one
+    message, file like and iterable bodies are streamed, iterated in one
+    run_sync call, which is expected to run it in a worker thread, so the body is
+    iterated start to end in the same thread, ie: a RecordStream's queryset.
+    """
+    if isinstance( self.body, ( bytes, bytearray ) ):
+      await send( { 'type': 'http.response.start', 'status': self.status, 'headers': self.header_list + [ ( b'content-length', str( len( self.body ) ).encode( 'latin-1' ) ) ] } )
+      await send( { 'type': 'http.response.body', 'body': bytes( self.body ), 'more_body': False } )
+      return
+
+    await send( { 'type': 'http.response.start', 'status': self.status, 'headers': self.header_list } )
+    await run_sync( _sendChunks, self.body, send, asyncio.get_running_loop() )
+    await send( { 'type': 'http.response.body', 'body': b'', 'more_body': False } )
+
+
+def _sendChunks( body, send, loop ):  # run in a worker thread, each chunk is sent from the event loop, waiting for it to be sent before getting the next
+  chunk_iter = _iterChunks( body )
+  try:
+    for buff in chunk_iter:
+      asyncio.run_coroutine_threadsafe( send( { 'type': 'http.response.body', 'body': buff, 'more_body': True } ), loop ).result()
+
+  finally:
+    chunk_iter.close()
@@ -0,0 +1,342 @@
+import pytest
+import json
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cinp import json_codec, server_common
+from cinp.server_common import Response, RecordStream, Namespace, Model, Action, Parameter, Converter, InvalidRequest, AnonymousUser
+from cinp.server_asgi import AsgiServer, AsgiRequest, AsgiResponse, _ReceiveStream
+
+
+@pytest.fixture( autouse=True )
+def stdlib_json():  # the expected bodies are in the stdlib's formatting
+  json_codec.setCodec( 'json' )
+  yield
+  json_codec.setCodec()
+
+
+def getUser( cookie_map, header_map ):
+  return AnonymousUser()
+
+
+class FakeTransaction():
+  def start( self ):
+    pass
+
+  def commit( self ):
+    pass
+
+  def abort( self ):
+    pass
+
+
+class Client():  # plays the part of the ASGI server
+  def __init__( self, app ):
+    super().__init__()
+    self.app = app
+    self.disconnect = asyncio.Event()
+
+  async def __call__( self, verb, path, header_map=None, body_list=None, root_path='' ):
+    message_list = [ { 'type': 'http.request', 'body': body, 'more_body': True } for body in ( body_list or [] ) ]
+    message_list.append( { 'type': 'http.request', 'body': b'', 'more_body': False } )
+    sent_list = []
+
+    async def receive():
+      if message_list:
+        return message_list.pop( 0 )
+
+      await self.disconnect.wait()
+      return { 'type': 'http.disconnect' }
+
+    async def send( message ):
+      sent_list.append( message )
+
+    scope = { 'type': 'http', 'method': verb, 'path': path, 'root_path': root_path, 'scheme': 'http', 'client': ( '127.0.0.1', 4321 ), 'headers': [ ( k.lower().encode(), v.encode() ) for k, v in ( header_map or {} ).items() ] }
+    await self.app( scope, receive, send )
+
+    if not sent_list:
+      return None
+
+    assert sent_list[0][ 'type' ] == 'http.response.start'
+    assert sent_list[-1][ 'more_body' ] is False
+    return ( sent_list[0][ 'status' ], dict( ( k.decode(), v.decode() ) for k, v in sent_list[0][ 'headers' ] ), b''.join( i[ 'body' ] for i in sent_list[ 1: ] ) )
+
+
+async def _buildRequest( scope, body_list ):
+  message_list = [ { 'type': 'http.request', 'body': body, 'more_body': True } for body in body_list ]
+  message_list.append( { 'type': 'http.request', 'body': b'', 'more_body': False } )
+
+  async def receive():
+    return message_list.pop( 0 )
+
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor( None, AsgiRequest, scope, _ReceiveStream( receive, loop ) )
+
+
+@pytest.mark.asyncio
+async def test_asgi_request():
+  scope = {
+            'type': 'http',
+            'method': 'call',
+            'root_path': '',
+            'path': '/api/v1/model(act)',
+            'scheme': 'https',
+            'client': ( '10.0.0.1', 1234 ),
+            'headers': [ ( b'cinp-version', b'2.0' ), ( b'content-type', b'application/json;charset=utf-8' ), ( b'cookie', b'session=abc123; other=x' ), ( b'auth_id', b'root' ) ]
+          }
+  req = await _buildRequest( scope, [ b'{ "this": ', b'"works" }' ] )
+  assert req.verb == 'CALL'
+  assert req.uri == '/api/v1/model(act)'
+  assert req.header_map == { 'CINP-VERSION': '2.0', 'CONTENT-TYPE': 'application/json;charset=utf-8', 'COOKIE': 'session=abc123; other=x', 'AUTH-ID': 'root' }
+  assert req.cookie_map == { 'session': 'abc123', 'other': 'x' }
+  assert req.data == { 'this': 'works' }
+  assert req.remote_addr == '10.0.0.1'
+  assert req.is_secure is True
+
+  scope[ 'root_path' ] = '/api'
+  scope[ 'path' ] = '/v1/model'
+  scope[ 'headers' ] = []
+  req = await _buildRequest( scope, [ b'ignored' ] )
+  assert req.uri == '/api/v1/model'
+  assert req.data is None
+  assert req.cookie_map == {}
+
+  scope[ 'path' ] = '/api/v1/model'  # some servers include the root_path
+  req = await _buildRequest( scope, [] )
+  assert req.uri == '/api/v1/model'
+
+  scope[ 'headers' ] = [ ( b'content-type', b'application/json' ), ( b'content-length', b'600000' ) ]
+  with pytest.raises( InvalidRequest ):
+    await _buildRequest( scope, [] )
+
+  scope[ 'headers' ] = [ ( b'content-type', b'application/json' ) ]  # lying about, or not sending the length still stops at the limit
+  with pytest.raises( InvalidRequest ):
+    await _buildRequest( scope, [ b' ' * 300000, b' ' * 300000 ] )
+
+  scope[ 'headers' ] = [ ( b'content-type', b'application/octet-stream' ) ]
+  req = await _buildRequest( scope, [ b'1234', b'5678', b'9' ] )
+  loop = asyncio.get_running_loop()
+  assert await loop.run_in_executor( None, req.read, 6 ) == b'123456'
+  assert await loop.run_in_executor( None, req.read, 6 ) == b'789'
+  assert await loop.run_in_executor( None, req.read, 6 ) == b''
+
+  req = await _buildRequest( scope, [ b'1234', b'', b'5678', b'9' ] )
+  buff = bytearray( 3 )
+  result = []
+  count = await loop.run_in_executor( None, req.readinto, buff )
+  while count:
+    result.append( bytes( buff[ :count ] ) )
+    count = await loop.run_in_executor( None, req.readinto, buff )
+
+  assert result == [ b'123', b'4', b'567', b'8', b'9' ]  # what ever has arrived, not waiting to fill buff
+
+  scope[ 'headers' ] = [ ( b'content-type', b'image/png' ) ]
+  with pytest.raises( InvalidRequest ):
+    await _buildRequest( scope, [] )
+
+
+@pytest.mark.asyncio
+async def test_asgi_response( monkeypatch ):
+  sent_list = []
+
+  async def send( message ):
+    sent_list.append( message )
+
+  executor = ThreadPoolExecutor( max_workers=4 )
+
+  async def run_sync( func, *args ):
+    return await asyncio.get_running_loop().run_in_executor( executor, functools.partial( func, *args ) )
+
+  resp = Response( 201, { 'hi': 'there' }, { 'hdr': 'big', 'count': 20 } )
+  resp.setCookie( 'session', 'abc', max_age=60, httponly=True )
+  await AsgiResponse( resp ).send( send, run_sync )
+  assert sent_list == [
+                        { 'type': 'http.response.start', 'status': 201, 'headers': [ ( b'hdr', b'big' ), ( b'count', b'20' ), ( b'set-cookie', b'session=abc; HttpOnly; Max-Age=60; Path=/' ), ( b'content-type', b'application/json;charset=utf-8' ), ( b'content-length', b'15' ) ] },
+                        { 'type': 'http.response.body', 'body': b'{"hi": "there"}', 'more_body': False }
+                      ]
+
+  sent_list.clear()
+  await AsgiResponse( Response( 200, data=iter( [ b'one', 'two', b'' ] ), content_type='bytes' ) ).send( send, run_sync )
+  assert sent_list == [
+                        { 'type': 'http.response.start', 'status': 200, 'headers': [ ( b'content-type', b'application/octet-stream' ) ] },
+                        { 'type': 'http.response.body', 'body': b'one', 'more_body': True },
+                        { 'type': 'http.response.body', 'body': b'two', 'more_body': True },
+                        { 'type': 'http.response.body', 'body': b'', 'more_body': False }
+                      ]
+
+  sent_list.clear()
+  await AsgiResponse( Response( 400, data='bad', content_type='text' ) ).send( send, run_sync )
+  assert sent_list[0][ 'headers' ] == [ ( b'content-type', b'text/plain;charset=utf-8' ), ( b'content-length', b'3' ) ]
+  assert sent_list[1][ 'body' ] == b'bad'
+
+  sent_list.clear()
+  await AsgiResponse( Response( 200, data=RecordStream( iter( [ ( 'a', 1 ) ] ) ) ) ).send( send, run_sync )
+  assert sent_list[0][ 'headers' ] == [ ( b'content-type', b'application/json;charset=utf-8' ), ( b'content-length', b'8' ) ]
+  assert sent_list[1][ 'body' ] == b'{"a": 1}'
+
+  monkeypatch.setattr( server_common, 'STREAM_CHUNK_SIZE', 10 )
+  sent_list.clear()
+  await AsgiResponse( Response( 200, data=RecordStream( ( str( i ), 'value' ) for i in range( 5 ) ) ) ).send( send, run_sync )
+  assert sent_list[0][ 'headers' ] == [ ( b'content-type', b'application/json;charset=utf-8' ) ]
+  assert len( sent_list ) == 8  # start, a chunk per record, the closing }, and the end
+  assert json.loads( b''.join( i[ 'body' ] for i in sent_list[ 1: ] ) ) == dict( ( str( i ), 'value' ) for i in range( 5 ) )
+
+  thread_list = []
+
+  def record_gen():
+    for i in range( 5 ):
+      thread_list.append( threading.get_ident() )
+      yield ( str( i ), 'value' )
+
+  sent_list.clear()
+  await AsgiResponse( Response( 200, data=RecordStream( record_gen() ) ) ).send( send, run_sync )
+  assert json.loads( b''.join( i[ 'body' ] for i in sent_list[ 1: ] ) ) == dict( ( str( i ), 'value' ) for i in range( 5 ) )
+  assert thread_list[0] == threading.get_ident()  # the first chunk was encoded building the AsgiResponse, the server primes it in the request's worker thread
+  assert len( set( thread_list[ 1: ] ) ) == 1  # the rest are iterated in the same worker thread
+  assert thread_list[1] != threading.get_ident()
+
+  with pytest.raises( ValueError ):
+    AsgiResponse( 'test' )
+
+
+@pytest.mark.asyncio
+async def test_asgi_server():
+  thread_map = {}
+
+  def sync_func( value ):
+    thread_map[ 'sync' ] = threading.get_ident()
+    return 'sync {0}'.format( value )
+
+  async def async_func( value ):
+    thread_map[ 'async' ] = threading.get_ident()
+    if value == 'wait':
+      await asyncio.sleep( 60 )
+
+    if value == 'bad':
+      raise ValueError( 'is bad' )
+
+    return 'async {0}'.format( value )
+
+  transaction_list = []
+
+  class RecordTransaction( FakeTransaction ):
+    def start( self ):
+      transaction_list.append( ( 'start', threading.get_ident() ) )
+
+    def commit( self ):
+      transaction_list.append( ( 'commit', threading.get_ident() ) )
+
+    def abort( self ):
+      transaction_list.append( ( 'abort', threading.get_ident() ) )
+
+  server = AsgiServer( root_path='/api/', root_version='0.0', debug=True, get_user=getUser, worker_count=2 )
+  ns = Namespace( name='ns1', version='0.1', converter=Converter( server.uri ) )
+  ns.checkAuth = lambda user, verb, id_list: True
+  model = Model( name='model1', field_list=[], transaction_class=RecordTransaction )
+  ns.addElement( model )
+  for ( name, kwargs ) in ( ( 'sync', {} ), ( 'async', { 'async_func': async_func } ) ):
+    action = Action( name=name, return_parameter=Parameter( type='String' ), parameter_list=[ Parameter( name='value', type='String' ) ], func=sync_func, **kwargs )
+    action.checkAuth = lambda user, verb, id_list: True
+    model.addAction( action )
+
+  server.registerNamespace( '/', ns )
+  server.validate()
+  client = Client( server )
+
+  ( status, header_map, body ) = await client( 'DESCRIBE', '/api/', { 'Cinp-Version': '2.0' } )
+  assert status == 200
+  assert header_map[ 'Type' ] == 'Namespace'
+  assert header_map[ 'Cinp-Version' ] == '2.0'
+  assert json.loads( body )[ 'namespaces' ] == [ '/api/ns1/' ]
+
+  ( status, header_map, body ) = await client( 'DESCRIBE', '/api/', { 'Cinp-Version': '2.0', 'If-None-Match': header_map[ 'ETag' ] } )
+  assert status == 304
+  assert body == b''
+
+  call_header_map = { 'Cinp-Version': '2.0', 'Content-Type': 'application/json' }
+  ( status, header_map, body ) = await client( 'CALL', '/api/ns1/model1(sync)', call_header_map, [ b'{"value": "a"}' ] )
+  assert status == 200
+  assert json.loads( body ) == 'sync a'
+  assert thread_map[ 'sync' ] != threading.get_ident()  # in the thread pool
+
+  ( status, header_map, body ) = await client( 'CALL', '/api/ns1/model1(async)', call_header_map, [ b'{"value": "b"}' ] )
+  assert status == 200
+  assert header_map[ 'Verb' ] == 'CALL'
+  assert header_map[ 'Cinp-Version' ] == '2.0'
+  assert json.loads( body ) == 'async b'
+  assert thread_map[ 'async' ] == threading.get_ident()  # awaited in the event loop, not wrapped to sync
+  assert [ item[0] for item in transaction_list ] == [ 'start', 'commit', 'start', 'commit', 'start', 'commit' ]  # the sync one, then the async one, before and after async_func
+  for index in ( 2, 4 ):
+    assert transaction_list[ index ][1] == transaction_list[ index + 1 ][1]  # started and committed in the same worker thread
+    assert transaction_list[ index ][1] != threading.get_ident()
+
+  ( status, header_map, body ) = await client( 'CALL', '/api/ns1/model1(async)', call_header_map, [ b'{"value": "bad"}' ] )
+  assert status == 400
+  assert json.loads( body ) == { 'message': 'is bad' }
+  assert [ item[0] for item in transaction_list[ 6: ] ] == [ 'start', 'commit' ]  # async_func is not run in the transaction
+
+  ( status, header_map, body ) = await client( 'CALL', '/api/ns1/model1(async)', call_header_map, [ b'{}' ] )
+  assert status == 400
+  assert json.loads( body ) == { 'value': 'Required Parameter' }
+
+  ( status, header_map, body ) = await client( 'CALL', '/api/ns1/model1(async)', call_header_map, [ b'{"value": ' ] )
+  assert status == 400
+
+  call = asyncio.ensure_future( client( 'CALL', '/api/ns1/model1(async)', call_header_map, [ b'{"value": "wait"}' ] ) )  # a long poll, that the client gives up on
+  await asyncio.sleep( 0.2 )
+  assert not call.done()
+  client.disconnect.set()
+  assert await asyncio.wait_for( call, 5 ) is None
+  assert transaction_list[-1][0] == 'commit'  # nothing was held open while it waited
+
+
+@pytest.mark.asyncio
+async def test_asgi_server_long_poll():  # a long poll holds no worker, other requests still get answered
+  waiting = asyncio.Queue()
+
+  async def async_func( value ):
+    waiting.put_nowait( value )
+    await asyncio.sleep( 60 )
+
+  server = AsgiServer( root_path='/api/', root_version='0.0', get_user=getUser, worker_count=1 )
+  ns = Namespace( name='ns1', version='0.1', converter=Converter( server.uri ) )
+  ns.checkAuth = lambda user, verb, id_list: True
+  model = Model( name='model1', field_list=[], transaction_class=FakeTransaction )
+  ns.addElement( model )
+  action = Action( name='poll', return_parameter=Parameter( type='String' ), parameter_list=[ Parameter( name='value', type='String' ) ], func=lambda value: value, async_func=async_func )
+  action.checkAuth = lambda user, verb, id_list: True
+  model.addAction( action )
+  server.registerNamespace( '/', ns )
+  server.validate()
+
+  poll_client = Client( server )
+  call_header_map = { 'Cinp-Version': '2.0', 'Content-Type': 'application/json' }
+  call_list = [ asyncio.ensure_future( poll_client( 'CALL', '/api/ns1/model1(poll)', call_header_map, [ '{{"value": "{0}"}}'.format( i ).encode() ] ) ) for i in range( 3 ) ]
+  assert sorted( [ await asyncio.wait_for( waiting.get(), 5 ) for _ in range( 3 ) ] ) == [ '0', '1', '2' ]  # all three are waiting, with one worker
+
+  ( status, header_map, body ) = await asyncio.wait_for( Client( server )( 'DESCRIBE', '/api/', { 'Cinp-Version': '2.0' } ), 5 )
+  assert status == 200
+
+  poll_client.disconnect.set()
+  assert await asyncio.wait_for( asyncio.gather( *call_list ), 5 ) == [ None, None, None ]
+
+
+@pytest.mark.asyncio
+async def test_asgi_lifespan():
+  server = AsgiServer( root_path='/api/', root_version='0.0' )
+  message_list = [ { 'type': 'lifespan.startup' }, { 'type': 'lifespan.shutdown' } ]
+  sent_list = []
+
+  async def receive():
+    return message_list.pop( 0 )
+
+  async def send( message ):
+    sent_list.append( message )
+
+  await server( { 'type': 'lifespan' }, receive, send )
+  assert sent_list == [ { 'type': 'lifespan.startup.complete' }, { 'type': 'lifespan.shutdown.complete' } ]
+
+  with pytest.raises( ValueError ):
+    await server( { 'type': 'websocket' }, receive, send )
@@ -1,16 +1,32 @@
 import traceback
-import json
-import copy
 import sys
 import uuid
-from dateutil import parser as datetimeparser
+import hashlib
+import inspect
+import operator
+import itertools
+import functools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from types import MappingProxyType
 from urllib import parse
 
 from cinp.common import URI, docstring_prep
+from cinp import json_codec
 from cinp.readers import READER_REGISTRY
 
 __CINP_VERSION__ = '2.0'
 __MULTI_URI_MAX__ = 100
+__MULTI_CREATE_MAX__ = __MULTI_URI_MAX__  # the created ids come back in the Object-Id header as a multi uri, which is held to the same max
+__URI_CACHE_SIZE__ = 1024
+__MAX_REQUEST_SIZE__ = 524288  # 512k bytes, the default limit for request bodies that are not application/octet-stream
+
+# streamed responses are sent in chunks of about this many bytes
+STREAM_CHUNK_SIZE = 65536
+# JSON request bodies larger than this ( or of unknown length ) that are arrays are parsed an item at a time, see RecordReader
+INCREMENTAL_PARSE_SIZE = 1048576
 
 FIELD_TYPE_LIST = ( 'String', 'Integer', 'Float', 'Boolean', 'DateTime', 'Map', 'Model', 'File' )
 FILTER_OPERATION_LIST = ( '=', '<', '>', '<=', '>=', 'startswith', 'endswith', 'contains' )  # I wonder how much work it would be to do "in", also "null" and "notnull" and/or blank?
@@ -137,6 +153,52 @@ def _debugDump( location, request, exception, id, auth_header_list=None, auth_co
     traceback.print_exception( None, exception, exception.__traceback__, file=fp )
 
 
+@functools.lru_cache( maxsize=None )
+def _listKwargs( list_func ):  # the optional LIST arguments a transaction's list() accepts
+  parameter_map = inspect.signature( list_func ).parameters
+  if any( parameter.kind == parameter.VAR_KEYWORD for parameter in parameter_map.values() ):
+    return frozenset( ( 'total_mode', 'cursor', 'values' ) )
+
+  return frozenset( name for name in ( 'total_mode', 'cursor', 'values' ) if name in parameter_map )
+
+
+@functools.lru_cache( maxsize=None )
+def _checkAuthObjects( check_auth ):  # if the checkAuth function takes object_map, the objects in id_list are loaded for it and shared with the transaction
+  try:
+    return 'object_map' in inspect.signature( check_auth ).parameters
+  except ( TypeError, ValueError ):  # no signature to inspect
+    return False
+
+
+def _toPythonDateTime( value, strict ):  # parsed as ISO-8601, if that fails and not strict, dateutil gets a try
+  try:
+    if value[ -1: ] in ( 'Z', 'z' ):  # fromisoformat only takes "Z" as of python 3.11
+      return datetime.fromisoformat( value[ :-1 ] + '+00:00' )
+
+    return datetime.fromisoformat( value )
+  except ( TypeError, ValueError ):
+    if strict:
+      raise ValueError( 'DateTime value must be an ISO-8601 string' )
+
+  from dateutil import parser as datetimeparser  # only needed for the odd non ISO-8601 value, so not imported up front
+
+  try:
+    return datetimeparser.parse( value )
+  except ( AttributeError, TypeError, ValueError, KeyError, OverflowError ):
+    raise ValueError( 'DateTime value must be a string in a format dateutil can understand' )
+
+
+def _passThrough( parameter, python_value ):
+  return python_value
+
+
+def _idToURI( path, object_id ):
+  if object_id is None:
+    return None
+
+  return '{0}:{1}:'.format( path, object_id )
+
+
 def _fromPythonMap_converter( value ):
   try:
     return MAP_TYPE_CONVERTER[ type( value ).__name__ ]( value )
@@ -147,34 +209,49 @@ def _fromPythonMap_converter( value ):
       raise ValueError( 'unable to convert type "{0}" in map converter'.format( type( value ).__name__ ) )
 
 
-def _fromPythonList( value ):
-  for index in range( 0, len( value ) ):
-    value[ index ] = _fromPythonMap_converter( value[ index ] )
+def _fromPythonList( value ):  # value is not modified, what is returned only differs from value where something needed converting
+  result = None
+  for index, item in enumerate( value ):
+    new_item = _fromPythonMap_converter( item )
+    if result is None:
+      if new_item is item:
+        continue
+
+      result = list( value )
+
+    result[ index ] = new_item
 
-  return value
+  return value if result is None else result
 
 
-def _fromPythonMap( value ):
-  for key in list( value.keys() ):
+def _fromPythonMap( value ):  # see _fromPythonList
+  result = None
+  for index, ( key, item ) in enumerate( value.items() ):
+    new_key = key
     if not isinstance( key, str ):
       new_key = str( _fromPythonMap_converter( key ) )  # some types still convert to non-strings(int, float, etc.), JSON requires string
-      value[ new_key ] = value[ key ]
-      del value[ key ]
-      key = new_key
 
-    if isinstance( value[ key ], dict ):
-      value[ key ] = _fromPythonMap( value[ key ] )
+    if isinstance( item, dict ):
+      new_item = _fromPythonMap( item )
 
-    elif isinstance( value[ key ], list ):
-      value[ key ] = _fromPythonList( value[ key ] )
+    elif isinstance( item, list ):
+      new_item = _fromPythonList( item )
 
-    elif isinstance( value[ key ], tuple ):
-      value[ key ] = _fromPythonList( list( value[ key ] ) )
+    elif isinstance( item, tuple ):
+      new_item = list( _fromPythonList( item ) )
 
     else:
-      value[ key ] = _fromPythonMap_converter( value[ key ] )
+      new_item = _fromPythonMap_converter( item )
+
+    if result is None:
+      if new_key is key and new_item is item:
+        continue
+
+      result = dict( itertools.islice( value.items(), index ) )
+
+    result[ new_key ] = new_item
 
-  return value
+  return value if result is None else result
 
 
 MAP_TYPE_CONVERTER = {
@@ -191,220 +268,246 @@ MAP_TYPE_CONVERTER = {
 
 
 class Converter():
-  def __init__( self, uri ):
+  def __init__( self, uri, datetime_strict=False ):  # datetime_strict: DateTime values must be ISO-8601, no dateutil fallback
     super().__init__()
     self.uri = uri
+    self.datetime_strict = datetime_strict
+    # the conversion method for each type, so converting a value is a dict lookup instead of walking the types
+    self._to_python_map = dict( [ ( type_name, getattr( self, '_toPython{0}'.format( type_name ) ) ) for type_name in FIELD_TYPE_LIST ] )
+    self._from_python_map = dict( [ ( type_name, getattr( self, '_fromPython{0}'.format( type_name ) ) ) for type_name in FIELD_TYPE_LIST ] )
 
-  def _toPython( self, parameter, cinp_value, transaction ):
-    if parameter.type == 'String':
-      if cinp_value is None:
-        return None
-
-      cinp_value = str( cinp_value )
-      if parameter.length is not None and len( cinp_value ) > parameter.length:
-        raise ValueError( 'Value too long' )
+  def _toPythonString( self, parameter, cinp_value, transaction ):
+    if cinp_value is None:
+      return None
 
-      return cinp_value
+    cinp_value = str( cinp_value )
+    if parameter.length is not None and len( cinp_value ) > parameter.length:
+      raise ValueError( 'Value too long' )
 
-    if parameter.type == 'Integer':
-      if cinp_value is None or cinp_value == '':
-        return None
+    return cinp_value
 
-      try:
-        return int( cinp_value )
-      except ( TypeError, ValueError ):
-        raise ValueError( 'Unable to convert to an int' )
+  def _toPythonInteger( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-    if parameter.type == 'Float':
-      if cinp_value is None or cinp_value == '':
-        return None
+    try:
+      return int( cinp_value )
+    except ( TypeError, ValueError ):
+      raise ValueError( 'Unable to convert to an int' )
 
-      try:
-        return float( cinp_value )
-      except ( TypeError, ValueError ):
-        raise ValueError( 'Unable to convert to an float' )
+  def _toPythonFloat( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-    if parameter.type == 'Boolean':
-      if cinp_value is None or cinp_value == '':
-        return None
+    try:
+      return float( cinp_value )
+    except ( TypeError, ValueError ):
+      raise ValueError( 'Unable to convert to an float' )
 
-      if isinstance( cinp_value, bool ):
-        return cinp_value
+  def _toPythonBoolean( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-      cinp_value = str( cinp_value ).lower()
+    if isinstance( cinp_value, bool ):
+      return cinp_value
 
-      if cinp_value in ( 'true', 't', '1' ):
-        return True
+    cinp_value = str( cinp_value ).lower()
 
-      if cinp_value in ( 'false', 'f', '0' ):
-        return False
+    if cinp_value in ( 'true', 't', '1' ):
+      return True
 
-      raise ValueError( 'Unable to convert to boolean' )
+    if cinp_value in ( 'false', 'f', '0' ):
+      return False
 
-    if parameter.type == 'DateTime':
-      if cinp_value is None or cinp_value == '':
-        return None
+    raise ValueError( 'Unable to convert to boolean' )
 
-      try:
-        return datetimeparser.parse( cinp_value )
-      except ( AttributeError, ValueError, KeyError, OverflowError ):
-        raise ValueError( 'DateTime value must be a string in a format dateutil can understand' )
+  def _toPythonDateTime( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-    if parameter.type == 'Map':
-      if cinp_value is None or cinp_value == '':
-        return {}
+    return _toPythonDateTime( cinp_value, self.datetime_strict )
 
-      if not isinstance( cinp_value, dict ):
-        raise ValueError( 'Map must be a dict' )
+  def _toPythonMap( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return {}
 
-      return cinp_value
+    if not isinstance( cinp_value, dict ):
+      raise ValueError( 'Map must be a dict' )
 
-    if parameter.type == 'Model':
-      if cinp_value is None or cinp_value == '':
-        return None
+    return cinp_value
 
-      if not isinstance( cinp_value, str ):
-        raise ValueError( 'Model reference must be a string uri' )
+  def _toPythonModel( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-      ( path, model, action, id_list, multi ) = self.uri.split( cinp_value )
+    if not isinstance( cinp_value, str ):
+      raise ValueError( 'Model reference must be a string uri' )
 
-      if self.uri.build( path, model ) != parameter.model.path:
-        raise ValueError( 'Object "{0}" is for a model other than "{1}"'.format( cinp_value, parameter.model.path )  )
+    ( path, model, action, id_list, multi ) = self.uri.split( cinp_value )
 
-      result = transaction.get( parameter.model, id_list[0] )   # TODO: handle multi id id_lists right
-      if result is None:
-        raise ValueError( 'Object "{0}" for model "{1}" NotFound'.format( cinp_value, parameter.model.path ) )
+    if self.uri.build( path, model ) != parameter.model.path:
+      raise ValueError( 'Object "{0}" is for a model other than "{1}"'.format( cinp_value, parameter.model.path )  )
 
-      return result
+    result = transaction.get( parameter.model, id_list[0] )   # TODO: handle multi id id_lists right
+    if result is None:
+      raise ValueError( 'Object "{0}" for model "{1}" NotFound'.format( cinp_value, parameter.model.path ) )
 
-    if parameter.type == 'File':
-      if cinp_value is None or cinp_value == '':
-        return None
+    return result
 
-      scheme = parse.urlparse( cinp_value ).scheme
+  def _toPythonFile( self, parameter, cinp_value, transaction ):
+    if cinp_value is None or cinp_value == '':
+      return None
 
-      reader = READER_REGISTRY.get( scheme, None )
+    scheme = parse.urlparse( cinp_value ).scheme
 
-      if reader is None or scheme not in parameter.allowed_scheme_list:
-        raise ValueError( 'Unknown or Invalid scheme "{0}"'.format( scheme ) )
+    reader = READER_REGISTRY.get( scheme, None )
 
-      ( file_reader, filename ) = reader( cinp_value )
-      file_reader.seek( 0 )  # some upstream process might of left the cursor at the end of the file
+    if reader is None or scheme not in parameter.allowed_scheme_list:
+      raise ValueError( 'Unknown or Invalid scheme "{0}"'.format( scheme ) )
 
-      return ( file_reader, filename )
+    ( file_reader, filename ) = reader( cinp_value )
+    file_reader.seek( 0 )  # some upstream process might of left the cursor at the end of the file
 
-    raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+    return ( file_reader, filename )
 
-  def _fromPython( self, parameter, python_value ):
-    if parameter.type == 'String':
-      if python_value is None:
-        return None
+  def _toPython( self, parameter, cinp_value, transaction ):
+    try:
+      func = self._to_python_map[ parameter.type ]
+    except KeyError:
+      raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
 
-      python_value = str( python_value )
-      if parameter.length is not None and len( python_value ) > parameter.length:
-        raise ValueError( 'String value to long' )
+    return func( parameter, cinp_value, transaction )
 
-      return str( python_value )
+  def _fromPythonString( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-    if parameter.type == 'Boolean':
-      if python_value is None:
-        return None
+    python_value = str( python_value )
+    if parameter.length is not None and len( python_value ) > parameter.length:
+      raise ValueError( 'String value to long' )
 
-      return python_value
+    return python_value
 
-    if parameter.type == 'Integer':
-      if python_value is None:
-        return None
+  def _fromPythonBoolean( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-      try:
-        return int( python_value )
-      except ( TypeError, ValueError ):
-        raise ValueError( 'Invalid int' )
+    return python_value
 
-    if parameter.type == 'Float':
-      if python_value is None:
-        return None
+  def _fromPythonInteger( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-      try:
-        return float( python_value )
-      except ( TypeError, ValueError ):
-        raise ValueError( 'Invalid float' )
+    try:
+      return int( python_value )
+    except ( TypeError, ValueError ):
+      raise ValueError( 'Invalid int' )
 
-    if parameter.type == 'DateTime':
-      if python_value is None:
-        return None
+  def _fromPythonFloat( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-      return python_value.isoformat()
+    try:
+      return float( python_value )
+    except ( TypeError, ValueError ):
+      raise ValueError( 'Invalid float' )
 
-    if parameter.type == 'Map':
-      if python_value is None:
-        return None
+  def _fromPythonDateTime( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-      if not isinstance( python_value, dict ):
-        raise ValueError( 'Map must be dict' )
+    return python_value.isoformat()
 
-      result = copy.deepcopy( python_value )
-      _fromPythonMap( result )
+  def _fromPythonMap( self, parameter, python_value ):
+    if python_value is None:
+      return None
 
-      return result
+    if not isinstance( python_value, dict ):
+      raise ValueError( 'Map must be dict' )
 
-    if parameter.type == 'Model':
-      raise NotImplementedError( 'Unimplemented' )
+    return _fromPythonMap( python_value )
 
-    if parameter.type == 'File':
-      raise NotImplementedError( 'Unimplemented' )
+  def _fromPythonModel( self, parameter, python_value ):
+    raise NotImplementedError( 'Unimplemented' )
 
-    raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
+  def _fromPythonFile( self, parameter, python_value ):
+    raise NotImplementedError( 'Unimplemented' )
 
-  def toPython( self, parameter, cinp_value, transaction ):
-    # KeyError is reserved for callers to detect a parameter missing from the request
-    # data, so any KeyError raised during conversion is re-raised as a ServerError
+  def _fromPython( self, parameter, python_value ):
     try:
-      if parameter.type is None:
-        return None
+      func = self._from_python_map[ parameter.type ]
+    except KeyError:
+      raise TypeError( 'Unknown type "{0}"'.format( parameter.type ) )
 
-      if parameter.is_array:
-        if cinp_value is None or cinp_value == '':
-          return []
+    return func( parameter, python_value )
 
-        if not isinstance( cinp_value, list ):
-          raise ValueError( 'Must be an Array/List, got "{0}"'.format( type( cinp_value ).__name__ ) )
+  def compileParameter( self, parameter ):
+    """
+    returns ( to_python( cinp_value, transaction ), from_python( python_value ) )
+    for parameter, with the type and array handling worked out ahead of time
+    """
+    if parameter.type is None:
+      return ( lambda cinp_value, transaction: None, lambda python_value: None )
 
-        result = []
-        for value in cinp_value:
-          result.append( self._toPython( parameter, value, transaction ) )
+    # sub classes that override _toPython/_fromPython them selves need everything to go through them
+    to_convert = self._toPython
+    if type( self )._toPython is Converter._toPython and parameter.type in self._to_python_map:
+      to_convert = self._to_python_map[ parameter.type ]
 
-        return result
+    from_convert = self._fromPython
+    if type( self )._fromPython is Converter._fromPython and parameter.type in self._from_python_map:
+      from_convert = self._from_python_map[ parameter.type ]
 
-      else:
-        return self._toPython( parameter, cinp_value, transaction )
+    if getattr( parameter, 'json_native', False ):  # trusted to already be JSON ready, nothing to convert on the way out
+      from_convert = _passThrough
 
-    except KeyError as e:
-      raise ServerError( 'Unexpected KeyError converting value for parameter "{0}": {1}'.format( parameter.name, e ) )
+    if not parameter.is_array:
+      return ( functools.partial( to_convert, parameter ), functools.partial( from_convert, parameter ) )
 
-  def fromPython( self, parameter, python_value ):
-    if parameter.type is None:
-      return None
+    def to_python( cinp_value, transaction ):
+      if cinp_value is None or cinp_value == '':
+        return []
 
-    if parameter.is_array:
+      if not isinstance( cinp_value, list ):
+        raise ValueError( 'Must be an Array/List, got "{0}"'.format( type( cinp_value ).__name__ ) )
+
+      return [ to_convert( parameter, value, transaction ) for value in cinp_value ]
+
+    is_model = parameter.type == 'Model'
+
+    def from_python( python_value ):
       if python_value is None:
         return []
 
-      result = []
-      if parameter.type == 'Model':
-        if hasattr( python_value, 'all' ):  # ie: is QueryString or a ManyRelatedManager or similar
-          python_value = list( python_value.all() )  # django specific again, and really should only get the pk
+      if is_model and hasattr( python_value, 'all' ):  # ie: is QueryString or a ManyRelatedManager or similar
+        python_value = list( python_value.all() )  # django specific again, and really should only get the pk
 
       if not isinstance( python_value, list ):
         raise ValueError( 'Must be an Array/List, got "{0}"'.format( type( python_value ).__name__ ) )
 
-      for value in python_value:
-        result.append( self._fromPython( parameter, value ) )
+      return [ from_convert( parameter, value ) for value in python_value ]
 
-      return result
+    return ( to_python, from_python )
 
-    else:
-      return self._fromPython( parameter, python_value )
+  def toPython( self, parameter, cinp_value, transaction ):
+    # KeyError is reserved for callers to detect a parameter missing from the request
+    # data, so any KeyError raised during conversion is re-raised as a ServerError
+    try:
+      compiled = parameter._compiled
+      if compiled is None or compiled[0] is not self:  # not compiled by Server.validate() for this converter
+        compiled = ( self, ) + self.compileParameter( parameter )
+
+      return compiled[1]( cinp_value, transaction )
+
+    except KeyError as e:
+      raise ServerError( 'Unexpected KeyError converting value for parameter "{0}": {1}'.format( parameter.name, e ) )
+
+  def fromPython( self, parameter, python_value ):
+    compiled = parameter._compiled
+    if compiled is None or compiled[0] is not self:
+      compiled = ( self, ) + self.compileParameter( parameter )
+
+    return compiled[2]( python_value )
 
 
 class Parameter():
@@ -412,6 +515,7 @@ class Parameter():
     super().__init__()
     self.name = name
     self.doc = docstring_prep( doc )
+    self._compiled = None  # ( converter, to_python, from_python ) from Converter.compileParameter(), set by Server.validate()
     if type is None:
       self.type = None
 
@@ -474,13 +578,21 @@ class Parameter():
 
 
 class Field( Parameter ):
-  def __init__( self, mode='RW', required=True, *args, **kwargs ):
+  def __init__( self, mode='RW', required=True, id_attribute=None, json_native=False, *args, **kwargs ):
     if mode not in ( 'RW', 'RC', 'RO' ):
       raise ValueError( 'Mode must be RW, RC, or RO' )
 
     super().__init__( *args, **kwargs )
     self.mode = mode
     self.required = required
+    if id_attribute is not None and ( self.type != 'Model' or self.is_array ):
+      raise ValueError( 'id_attribute is only valid for non array Model fields' )
+
+    if json_native and self.type != 'Map':
+      raise ValueError( 'json_native is only valid for Map fields' )
+
+    self.id_attribute = id_attribute  # attribute on the object that holds the related object's id, so the related object does not have to be loaded to serialize it
+    self.json_native = json_native  # the value is known to only hold JSON types with string keys, so it is sent as is
 
   def describe( self, converter ):
     result = super().describe( converter )
@@ -640,9 +752,10 @@ class Namespace( Element ):
 
 
 class Model( Element ):
-  def __init__( self, field_list, transaction_class, id_field_name=None, list_filter_map=None, list_query_filter_map=None, list_query_sort_list=None, constant_set_map=None, not_allowed_verb_list=None, *args, **kwargs ):
+  def __init__( self, field_list, transaction_class, id_field_name=None, list_filter_map=None, list_query_filter_map=None, list_query_sort_list=None, constant_set_map=None, not_allowed_verb_list=None, max_request_size=None, *args, **kwargs ):  # max_request_size overrides the Server's max_request_size
     super().__init__( *args, **kwargs )
     self.transaction_class = transaction_class
+    self.max_request_size = max_request_size
     self.id_field_name = id_field_name
     self.field_map = {}
     for field in field_list:
@@ -666,6 +779,8 @@ class Model( Element ):
 
       self.not_allowed_verb_list.append( verb )
 
+    self._serializer = None  # ( converter, [ ( field_name, getter, from_python ) ] ), set by compile()
+
   @property
   def path( self ):
     if self.parent is None:
@@ -673,6 +788,29 @@ class Model( Element ):
 
     return '{0}{1}'.format( self.parent.path, self.name )
 
+  def compile( self, converter ):  # called by Server.validate() once the models are resolved, precompiles the conversion of the fields and filter parameters
+    for field in self.field_map.values():
+      field._compiled = ( converter, ) + converter.compileParameter( field )
+
+    for parameter_map in self.list_filter_map.values():
+      for parameter in parameter_map.values():
+        parameter._compiled = ( converter, ) + converter.compileParameter( parameter )
+
+    for parameter in self.list_query_filter_map.values():
+      parameter._compiled = ( converter, ) + converter.compileParameter( parameter )
+
+    self._serializer = ( converter, self._buildSerializer( converter ) )
+
+  def _buildSerializer( self, converter ):
+    result = []
+    for field_name, field in self.field_map.items():
+      if field.id_attribute is not None and isinstance( field.model, Model ):  # the model is not resolved if the server has not been validated yet
+        result.append( ( field_name, operator.attrgetter( field.id_attribute ), functools.partial( _idToURI, field.model.path ) ) )
+      else:
+        result.append( ( field_name, operator.attrgetter( field_name ), converter.compileParameter( field )[1] ) )
+
+    return result
+
   def getElement( self, path ):
     if path is None or len( path ) < 1:
       return self
@@ -725,14 +863,20 @@ class Model( Element ):
     if isinstance( target_object, dict ):
       return target_object
 
+    if self._serializer is not None and self._serializer[0] is converter:
+      serializer = self._serializer[1]
+    else:
+      serializer = self._buildSerializer( converter )
+
     result = {}
-    for field_name in self.field_map:
-      try:
-        result[ field_name ] = converter.fromPython( self.field_map[ field_name ], getattr( target_object, field_name ) )  # TODO: distinguish between the AttributeError of looking up the field, and any errors pulling the field value might cause
-      except ValueError as e:
-        raise ValueError( 'Error with "{0}": "{1}"'.format( field_name, e ) )
-      except AttributeError:
-        raise ServerError( 'target_object("{0}") missing field "{1}"'.format( target_object.__class__.__name__, field_name ) )  # yes, internal server error, target_object comes from inside the house
+    field_name = None
+    try:
+      for ( field_name, getter, from_python ) in serializer:
+        result[ field_name ] = from_python( getter( target_object ) )  # TODO: distinguish between the AttributeError of looking up the field, and any errors pulling the field value might cause
+    except ValueError as e:
+      raise ValueError( 'Error with "{0}": "{1}"'.format( field_name, e ) )
+    except AttributeError:
+      raise ServerError( 'target_object("{0}") missing field "{1}"'.format( target_object.__class__.__name__, field_name ) )  # yes, internal server error, target_object comes from inside the house
 
     return result
 
@@ -743,18 +887,38 @@ class Model( Element ):
 
     return result
 
+  def _loadObjects( self, transaction, id_list, preload=True ):  # returns a dict of object_id -> object ( None if not found ) for checkAuth, if preload the transaction keeps them if it can, so they are not loaded again
+    if hasattr( transaction, 'get_many' ):
+      object_map = transaction.get_many( self, id_list )
+    else:
+      object_map = dict( [ ( object_id, transaction.get( self, object_id ) ) for object_id in id_list ] )
+
+    if preload and hasattr( transaction, 'preload' ):
+      transaction.preload( self, object_map )
+
+    return object_map
+
+  def _getMany( self, transaction, id_list ):  # returns a list of ( object_id, object ) in id_list order
+    if not hasattr( transaction, 'get_many' ):
+      return [ ( object_id, self._get( transaction, object_id ) ) for object_id in id_list ]
+
+    result = transaction.get_many( self, id_list )
+    for object_id in id_list:
+      if result.get( object_id, None ) is None:
+        raise ObjectNotFound( self.path, object_id )
+
+    return [ ( object_id, result[ object_id ] ) for object_id in id_list ]
+
   def get( self, converter, transaction, id_list, multi ):
-    result = {}
     if multi:
-      for object_id in id_list:
-        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._asDict( converter, self._get( transaction, object_id ) )
+      result = RecordStream( ( '{0}:{1}:'.format( self.path, object_id ), self._asDict( converter, target_object ) ) for ( object_id, target_object ) in self._getMany( transaction, id_list ) )
 
     else:
       result = self._asDict( converter, self._get( transaction, id_list[0] ) )
 
     return Response( 200, data=result, header_map={ 'Verb': 'GET', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
 
-  def list( self, converter, transaction, data, header_map ):
+  def list( self, converter, transaction, data, header_map, get_auth=None ):  # get_auth( id_list ) is called before returning records for Values mode, if it returns False NotAuthorized is raised
     if data is not None and not isinstance( data, dict ):
       raise InvalidRequest( 'LIST data must be a dict or None' )
 
@@ -764,6 +928,18 @@ class Model( Element ):
     else:
       id_only = False
 
+    values = header_map.get( 'VALUES', 'FALSE' ).upper() == 'TRUE'  # return the records like a multi-object GET instead of the list of ids
+    if values and 'GET' in self.not_allowed_verb_list:
+      raise NotAuthorized()
+
+    total_mode = header_map.get( 'INCLUDE-TOTAL', 'TRUE' ).upper()
+    try:
+      total_mode = { 'TRUE': 'exact', 'FALSE': 'none', 'ESTIMATE': 'estimate' }[ total_mode ]
+    except KeyError:
+      raise InvalidRequest( 'Include-Total must be one of "True", "False", or "Estimate"' )
+
+    cursor = header_map.get( 'CURSOR', None ) or None
+
     filter_name = header_map.get( 'FILTER', None )
     try:
       count = int( header_map.get( 'COUNT', 10 ) )
@@ -816,24 +992,71 @@ class Model( Element ):
       if error_map != {}:
         raise InvalidRequest( data=error_map )
 
+    kwargs = {}  # transactions that do not take total_mode and/or cursor always return the total and do offset paging
+    supported_set = _listKwargs( type( transaction ).list )
+    if total_mode != 'exact' and 'total_mode' in supported_set:
+      kwargs[ 'total_mode' ] = total_mode
+
+    if cursor is not None and 'cursor' in supported_set:
+      kwargs[ 'cursor' ] = cursor
+
+    if values and 'values' in supported_set:
+      kwargs[ 'values' ] = True
+
     try:
-      result = transaction.list( self, filter_name, filter_values, position, count )
+      result = transaction.list( self, filter_name, filter_values, position, count, **kwargs )
     except ValueError as e:
       if isinstance( e.args[0], dict ):
         raise InvalidRequest( data=e.args[0] )
       else:
         raise InvalidRequest( e )
 
-    if result is None or not isinstance( result, tuple ) or len( result ) != 3:
+    if result is None or not isinstance( result, tuple ) or len( result ) not in ( 3, 4 ):
       raise ServerError( 'List result is not a valid tuple' )
 
-    ( id_list, position, total ) = result
-    if id_only is True:
-      id_list = [ '{0}'.format( item ) for item in id_list ]
+    if len( result ) == 4:  # the transaction supports cursors, next_cursor is None when there are no more pages
+      ( id_list, position, total, next_cursor ) = result
     else:
-      id_list = [ '{0}:{1}:'.format( self.path, item ) for item in id_list ]
+      ( id_list, position, total ) = result
+      next_cursor = None
 
-    return Response( 200, data=id_list, header_map={ 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Count': str( len( id_list ) ), 'Position': str( position ), 'Total': str( total ), 'Id-Only': str( id_only ) } )
+    if values:
+      if 'values' in kwargs:  # the transaction loaded the objects with the list
+        object_list = id_list
+      else:
+        object_list = self._listValues( transaction, id_list )
+
+      if get_auth is not None and not get_auth( [ '{0}'.format( item[0] ) for item in object_list ] ):
+        raise NotAuthorized()
+
+      result = RecordStream( ( '{0}:{1}:'.format( self.path, object_id ), self._asDict( converter, target_object ) ) for ( object_id, target_object ) in object_list )
+
+      header_map = { 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Count': str( len( id_list ) ), 'Position': str( position ), 'Values': 'True' }
+
+    else:
+      if id_only is True:
+        result = [ '{0}'.format( item ) for item in id_list ]
+      else:
+        result = [ '{0}:{1}:'.format( self.path, item ) for item in id_list ]
+
+      header_map = { 'Verb': 'LIST', 'Cache-Control': 'no-cache', 'Count': str( len( id_list ) ), 'Position': str( position ), 'Id-Only': str( id_only ) }
+
+    if total is not None:  # None when the total was not asked for
+      header_map[ 'Total' ] = str( total )
+
+    if next_cursor is not None:
+      header_map[ 'Cursor' ] = next_cursor
+
+    return Response( 200, data=result, header_map=header_map )
+
+  def _listValues( self, transaction, id_list ):  # like _getMany, but objects that have gone away since they were listed are skipped
+    if hasattr( transaction, 'get_many' ):
+      object_map = transaction.get_many( self, id_list )
+      object_list = [ ( object_id, object_map.get( object_id, None ) ) for object_id in id_list ]
+    else:
+      object_list = [ ( object_id, transaction.get( self, object_id ) ) for object_id in id_list ]
+
+    return [ item for item in object_list if item[1] is not None ]
 
   def _filterConvert( self, filter_spec_map, parameter_map, converter, transaction, depth=0 ):
     if depth >= 20:
@@ -889,10 +1112,7 @@ class Model( Element ):
 
     return {}, [ 'Operation and/or Field not Defined' ]
 
-  def create( self, converter, transaction, data ):
-    if not isinstance( data, dict ):
-      raise InvalidRequest( 'CREATE data must be a dict' )
-
+  def _createValues( self, converter, transaction, data ):  # returns ( value_map, update_value_map, error_map ) for one object's CREATE data
     value_map = {}
     update_value_map = {}
     error_map = {}
@@ -931,6 +1151,34 @@ class Model( Element ):
         elif field.required:
           error_map[ field_name ] = 'Required Field'
 
+    return ( value_map, update_value_map, error_map )
+
+  def _createUpdate( self, converter, transaction, object_id, result, update_value_map ):  # the many to many values can only be set after the object exists
+    if not update_value_map:
+      return self._asDict( converter, result )
+
+    try:
+      result = self._asDict( converter, transaction.update( self, object_id, update_value_map ) )
+    except ValueError as e:
+      if isinstance( e.args[0], dict ):
+        raise InvalidRequest( data=e.args[0] )
+      else:
+        raise InvalidRequest( e )
+
+    if result is None:
+      raise ServerError( 'Newly created object disapeared' )
+
+    return result
+
+  def create( self, converter, transaction, data ):
+    if isinstance( data, ( list, RecordReader ) ):
+      return self._createMany( converter, transaction, data )
+
+    if not isinstance( data, dict ):
+      raise InvalidRequest( 'CREATE data must be a dict, or a list of dicts' )
+
+    ( value_map, update_value_map, error_map ) = self._createValues( converter, transaction, data )
+
     if error_map != {}:
       raise InvalidRequest( data=error_map )
 
@@ -947,22 +1195,58 @@ class Model( Element ):
 
     ( object_id, result ) = result
 
-    if update_value_map:
-      try:
-        result = self._asDict( converter, transaction.update( self, object_id, update_value_map ) )
-      except ValueError as e:
-        if isinstance( e.args[0], dict ):
-          raise InvalidRequest( data=e.args[0] )
-        else:
-          raise InvalidRequest( e )
+    result = self._createUpdate( converter, transaction, object_id, result, update_value_map )
 
-      if result is None:
-        raise ServerError( 'Newly created object disapeared' )
+    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Object-Id': '{0}:{1}:'.format( self.path, object_id ) } )
 
-    else:
-      result = self._asDict( converter, result )
+  def _createMany( self, converter, transaction, data_list ):  # data_list can be a RecordReader, so the length is not known till the end
+    if isinstance( data_list, list ) and len( data_list ) > __MULTI_CREATE_MAX__:
+      raise InvalidRequest( 'CREATE data list longer than supported length of "{0}"'.format( __MULTI_CREATE_MAX__ ) )
 
-    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Object-Id': '{0}:{1}:'.format( self.path, object_id ) } )
+    value_map_list = []
+    update_value_map_list = []
+    error_map = {}
+    for index, data in enumerate( data_list ):
+      if index >= __MULTI_CREATE_MAX__:
+        raise InvalidRequest( 'CREATE data list longer than supported length of "{0}"'.format( __MULTI_CREATE_MAX__ ) )
+
+      if not isinstance( data, dict ):
+        raise InvalidRequest( 'CREATE data list entries must be dicts' )
+
+      ( value_map, update_value_map, item_error_map ) = self._createValues( converter, transaction, data )
+      if item_error_map:
+        error_map[ str( index ) ] = item_error_map  # keyed by the position in the request
+
+      value_map_list.append( value_map )
+      update_value_map_list.append( update_value_map )
+
+    if not value_map_list:
+      raise InvalidRequest( 'CREATE data list is empty' )
+
+    if error_map != {}:
+      raise InvalidRequest( data=error_map )
+
+    try:
+      if hasattr( transaction, 'create_many' ):
+        result_list = transaction.create_many( self, value_map_list )
+      else:
+        result_list = [ transaction.create( self, value_map ) for value_map in value_map_list ]
+    except ValueError as e:
+      if isinstance( e.args[0], dict ):
+        raise InvalidRequest( data=e.args[0] )
+      else:
+        raise InvalidRequest( e )
+
+    if not isinstance( result_list, list ) or len( result_list ) != len( value_map_list ) or not all( isinstance( item, tuple ) and len( item ) == 2 for item in result_list ):
+      raise ServerError( 'Create result is not a valid list of tuples' )
+
+    result = {}
+    for ( ( object_id, target_object ), update_value_map ) in zip( result_list, update_value_map_list ):
+      result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._createUpdate( converter, transaction, object_id, target_object, update_value_map )
+
+    object_id = '{0}:{1}:'.format( self.path, ':'.join( [ str( item[0] ) for item in result_list ] ) )
+
+    return Response( 201, data=result, header_map={ 'Verb': 'CREATE', 'Cache-Control': 'no-cache', 'Multi-Object': 'True', 'Object-Id': object_id } )
 
   def _update( self, converter, transaction, object_id, value_map ):
     try:
@@ -1010,7 +1294,23 @@ class Model( Element ):
       raise InvalidRequest( data=error_map )
 
     result = {}
-    if multi:
+    if multi and hasattr( transaction, 'update_many' ):
+      try:
+        object_map = transaction.update_many( self, id_list, value_map )
+      except ValueError as e:
+        if isinstance( e.args[0], dict ):
+          raise InvalidRequest( data=e.args[0] )
+        else:
+          raise InvalidRequest( e )
+
+      for object_id in id_list:
+        target_object = object_map.get( object_id, None )
+        if target_object is None:
+          raise ObjectNotFound( self.path, object_id )
+
+        result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._asDict( converter, target_object )
+
+    elif multi:
       for object_id in id_list:
         result[ '{0}:{1}:'.format( self.path, object_id ) ] = self._update( converter, transaction, object_id, value_map )
 
@@ -1020,20 +1320,38 @@ class Model( Element ):
     return Response( 200, data=result, header_map={ 'Verb': 'UPDATE', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
 
   def delete( self, transaction, id_list ):
-    for object_id in id_list:
-      if transaction.delete( self, object_id ) is False:
-        raise ObjectNotFound( self.path, object_id )
+    if hasattr( transaction, 'delete_many' ):
+      missing_list = transaction.delete_many( self, id_list )
+      if missing_list:
+        raise ObjectNotFound( self.path, missing_list[0] )
+
+    else:
+      for object_id in id_list:
+        if transaction.delete( self, object_id ) is False:
+          raise ObjectNotFound( self.path, object_id )
 
     return Response( 200, header_map={ 'Verb': 'DELETE', 'Cache-Control': 'no-cache' } )
 
 
+def _raiseValueError( e ):  # a ValueError from an action, the first arg can be a dict of field -> error
+  if isinstance( e.args[0], dict ):
+    raise InvalidRequest( data=e.args[0] )
+  else:
+    raise InvalidRequest( e )
+
+
 class Action( Element ):
-  def __init__( self, func, return_parameter=None, parameter_list=None, static=True, *args, **kwargs ):
+  def __init__( self, func, return_parameter=None, parameter_list=None, static=True, async_func=None, max_request_size=None, *args, **kwargs ):  # async_func is the coroutine function func wraps, if there is one, see callAsync
     if return_parameter is not None and not isinstance( return_parameter, Parameter ):
       raise ValueError( 'return_parameter must be a Parameter' )
 
+    if async_func is not None and not inspect.iscoroutinefunction( async_func ):
+      raise ValueError( 'async_func must be a coroutine function' )
+
     super().__init__( *args, **kwargs )
     self.func = func
+    self.async_func = async_func
+    self.max_request_size = max_request_size
     self.parameter_map = {}
     for parameter in parameter_list or []:
       if not isinstance( parameter, Parameter ):
@@ -1056,6 +1374,13 @@ class Action( Element ):
 
     return '{0}({1})'.format( self.parent.path, self.name )
 
+  def compile( self, converter ):  # see Model.compile
+    for parameter in self.parameter_map.values():
+      if parameter.type != '_USER_':
+        parameter._compiled = ( converter, ) + converter.compileParameter( parameter )
+
+    self.return_parameter._compiled = ( converter, ) + converter.compileParameter( self.return_parameter )
+
   def describe( self, converter ):
     return_type = self.return_parameter.describe( converter )
     del return_type[ 'name' ]
@@ -1066,7 +1391,7 @@ class Action( Element ):
 
     return Response( 200, data=data, header_map={ 'Verb': 'DESCRIBE', 'Type': 'Action', 'Cache-Control': 'max-age=0' } )
 
-  def call( self, converter, transaction, id_list, data, user, multi ):
+  def _callValues( self, converter, transaction, data, user ):
     #  TODO: deal with data when None, and in other places
     error_map = {}
     value_map = {}
@@ -1094,46 +1419,97 @@ class Action( Element ):
     if error_map != {}:
       raise InvalidRequest( data=error_map )
 
-    result = {}
+    return value_map
+
+  def _callTargets( self, transaction, id_list, multi ):  # returns a list of ( object_id, target_object ), None for static actions
     if id_list:
       if self.static:
         raise InvalidRequest( 'Static Actions should not be passed ids' )
 
       if multi:
-        for object_id in id_list:
-          try:
-            result_value = self.func( self.parent._get( transaction, object_id ), **value_map )
-          except ValueError as e:
-            if isinstance( e.args[0], dict ):
-              raise InvalidRequest( data=e.args[0] )
-            else:
-              raise InvalidRequest( e )
+        return self.parent._getMany( transaction, id_list )
+
+      return [ ( id_list[0], self.parent._get( transaction, id_list[0] ) ) ]
+
+    if not self.static:
+      raise InvalidRequest( 'Non-Static Actions should be passed ids' )
 
+    return None
+
+  def _callPrepare( self, converter, transaction, id_list, data, user, multi ):  # returns ( value_map, target_list ), for callAsync, both in one run_sync call
+    return ( self._callValues( converter, transaction, data, user ), self._callTargets( transaction, id_list, multi ) )
+
+  def _callResult( self, converter, result_value ):
+    try:
+      return converter.fromPython( self.return_parameter, result_value )
+    except ValueError as e:
+      raise InvalidRequest( 'Invalid Result Value: "{0}"'.format( e ) )
+
+  def _callResponse( self, result, multi ):
+    return Response( 200, data=result, header_map={ 'Verb': 'CALL', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
+
+  def call( self, converter, transaction, id_list, data, user, multi ):
+    value_map = self._callValues( converter, transaction, data, user )
+    target_list = self._callTargets( transaction, id_list, multi )
+
+    result = {}
+    if target_list is not None:
+      if multi:
+        for ( object_id, target_object ) in target_list:
           try:
-            result[ '{0}:{1}:'.format( self.parent.path, object_id ) ] = converter.fromPython( self.return_parameter, result_value )
+            result_value = self.func( target_object, **value_map )
           except ValueError as e:
-            raise InvalidRequest( 'Invalid Result Value: "{0}"'.format( e ) )
+            _raiseValueError( e )
+
+          result[ '{0}:{1}:'.format( self.parent.path, object_id ) ] = self._callResult( converter, result_value )
       else:
-        result = converter.fromPython( self.return_parameter, self.func( self.parent._get( transaction, id_list[0] ), **value_map ) )
+        result = converter.fromPython( self.return_parameter, self.func( target_list[0][1], **value_map ) )
 
     else:
-      if not self.static:
-        raise InvalidRequest( 'Non-Static Actions should be passed ids' )
-
       try:
         result_value = self.func( **value_map )
       except ValueError as e:
-        if isinstance( e.args[0], dict ):
-          raise InvalidRequest( data=e.args[0] )
-        else:
-          raise InvalidRequest( e )
+        _raiseValueError( e )
+
+      result = self._callResult( converter, result_value )
+
+    return self._callResponse( result, multi )
+
+  async def callAsync( self, run_sync, converter, transaction, id_list, data, user, multi ):
+    """
+    like call, but async_func is awaited in the running event loop.  Everything
+    that may touch the database is run with "await run_sync( func, *args )",
+    which is expected to run func in a worker thread, each call in a
+    transaction of its own.  NOTE: the async_func is not run inside the
+    request's transaction, it is awaited, possibly for a long time, between the
+    database work, so anything it writes needs its own.
+    """
+    ( value_map, target_list ) = await run_sync( self._callPrepare, converter, transaction, id_list, data, user, multi )
+
+    result = {}
+    if target_list is not None:
+      for ( object_id, target_object ) in target_list:
+        try:
+          result_value = await self.async_func( target_object, **value_map )
+        except ValueError as e:
+          _raiseValueError( e )
+
+        result_value = await run_sync( self._callResult, converter, result_value )
+        if not multi:
+          result = result_value
+          break
 
+        result[ '{0}:{1}:'.format( self.parent.path, object_id ) ] = result_value
+
+    else:
       try:
-        result = converter.fromPython( self.return_parameter, result_value )
+        result_value = await self.async_func( **value_map )
       except ValueError as e:
-        raise InvalidRequest( 'Invalid Result Value: "{0}"'.format( e ) )
+        _raiseValueError( e )
 
-    return Response( 200, data=result, header_map={ 'Verb': 'CALL', 'Cache-Control': 'no-cache', 'Multi-Object': str( multi ) } )
+      result = await run_sync( self._callResult, converter, result_value )
+
+    return self._callResponse( result, multi )
 
   def options( self ):
     header_map = {}
@@ -1146,23 +1522,153 @@ def defaultGetUser( cookie_map, header_map ):
   return AnonymousUser()
 
 
+class UserCache():
+  """
+  Wraps a get_user function, caching the users it returns keyed by the auth
+  header and cookie values, so the session lookup is not done on every request.
+  Users expire after ttl seconds, None results ( invalid sessions ) after negative_ttl
+  seconds, past size entries the least recently used are dropped.  The cached user
+  objects are shared between requests, treat them as read only.
+  Call invalidate when a session ends ( ie: logout ) so it stops working right away.
+  """
+  def __init__( self, get_user, ttl=60, size=1024, negative_ttl=5 ):
+    super().__init__()
+    self.get_user = get_user
+    self.ttl = ttl
+    self.size = size
+    self.negative_ttl = negative_ttl
+    self._cache = OrderedDict()  # ( cookie items, header items ) -> ( expires, user ), oldest used first
+    self._generation = 0  # bumped by invalidate, so a lookup that was running at the time is not cached
+    self._lock = threading.Lock()
+
+  def __call__( self, cookie_map, header_map ):
+    key = ( tuple( sorted( cookie_map.items() ) ), tuple( sorted( header_map.items() ) ) )
+    now = time.monotonic()
+    with self._lock:
+      entry = self._cache.get( key, None )
+      if entry is not None:
+        if entry[0] > now:
+          self._cache.move_to_end( key )
+          return entry[1]
+
+        del self._cache[ key ]
+
+      generation = self._generation
+
+    user = self.get_user( cookie_map, header_map )
+
+    ttl = self.ttl if user is not None else self.negative_ttl
+    if ttl > 0:
+      with self._lock:
+        if generation == self._generation:
+          self._cache[ key ] = ( now + ttl, user )
+          self._cache.move_to_end( key )
+          while len( self._cache ) > self.size:
+            self._cache.popitem( last=False )
+
+    return user
+
+  def invalidate( self, cookie_map=None, header_map=None ):
+    """
+    drop the cached users for the requests that had all the values in cookie_map
+    and header_map, ie: header_map={ 'AUTH-TOKEN': token } drops the entries for
+    that token, if neither are specified everything is dropped
+    """
+    cookie_set = set( ( cookie_map or {} ).items() )
+    header_set = set( ( header_map or {} ).items() )
+    with self._lock:
+      self._generation += 1
+      if not cookie_set and not header_set:
+        self._cache.clear()
+        return
+
+      for key in [ key for key in self._cache if cookie_set.issubset( key[0] ) and header_set.issubset( key[1] ) ]:
+        del self._cache[ key ]
+
+
+class Route():
+  """
+  Precompiled dispatch information for an Element, see Server.route_map
+  """
+  def __init__( self, element ):
+    super().__init__()
+    self.element = element
+    self.path = element.path
+    if isinstance( element, Action ):
+      self.converter = element.parent.parent.converter
+      self.transaction_class = element.parent.transaction_class
+      self.allowed_verb_set = frozenset( ( 'OPTIONS', 'DESCRIBE', 'CALL' ) )
+      self.not_allowed_verb_set = frozenset( element.parent.not_allowed_verb_list )
+
+    elif isinstance( element, Model ):
+      self.converter = element.parent.converter
+      self.transaction_class = element.transaction_class
+      self.allowed_verb_set = frozenset( ( 'OPTIONS', 'DESCRIBE', 'GET', 'LIST', 'CREATE', 'UPDATE', 'DELETE' ) )
+      self.not_allowed_verb_set = frozenset( element.not_allowed_verb_list )
+
+    else:
+      self.converter = element.converter
+      self.transaction_class = None  # do not need a transaction anyway
+      self.allowed_verb_set = frozenset( ( 'OPTIONS', 'DESCRIBE' ) )
+      self.not_allowed_verb_set = frozenset()
+
+    self.max_request_size = getattr( element, 'max_request_size', None )  # None for the Server's
+    self._describe_cache = None
+
+  def describe( self, if_none_match=None ):
+    """
+    returns the DESCRIBE Response for the element, the element is only described
+    once, after that the already encoded response is re-used.  If if_none_match
+    (the value of the If-None-Match header) matches the ETag, a 304 is returned.
+    """
+    if self._describe_cache is None:
+      response = self.element.describe( self.converter )
+      encoded_data = json_codec.dumps( response.data )
+      response.header_map[ 'ETag' ] = '"{0}"'.format( hashlib.sha256( encoded_data ).hexdigest()[ 0:32 ] )
+      self._describe_cache = ( response.data, encoded_data, response.header_map )
+
+    ( data, encoded_data, header_map ) = self._describe_cache
+
+    if if_none_match is not None:
+      etag = header_map[ 'ETag' ]
+      for item in if_none_match.split( ',' ):
+        item = item.strip()
+        if item.startswith( 'W/' ):
+          item = item[ 2: ]
+
+        if item in ( etag, '*' ):
+          return Response( 304, data=None, header_map=header_map.copy() )
+
+    return Response( 200, data=data, header_map=header_map.copy(), encoded_data=encoded_data )  # data is shared between requests, treat it as read only
+
+  def __str__( self ):
+    return 'Route:\n  Path: "{0}"\n  Element: "{1}"\n  Allowed Verbs: "{2}"\n  Not Allowed Verbs: "{3}"'.format( self.path, self.element.name, sorted( self.allowed_verb_set ), sorted( self.not_allowed_verb_set ) )
+
+
 class Server():
-  def __init__( self, root_path, root_version, get_user=None, auth_header_list=None, auth_cookie_list=None, cors_allow_origin=None, debug=False, debug_dump_location=None ):
+  def __init__( self, root_path, root_version, get_user=None, auth_header_list=None, auth_cookie_list=None, cors_allow_origin=None, debug=False, debug_dump_location=None, uri_cache_size=__URI_CACHE_SIZE__, user_cache_ttl=0, user_cache_size=1024, user_cache_negative_ttl=5, max_request_size=__MAX_REQUEST_SIZE__, datetime_strict=False ):
     super().__init__()
     if get_user is None and ( auth_header_list or auth_cookie_list ):
       raise ValueError( 'get_user is required when auth_header_list and/or auth_cookie_list is specified' )
 
     self.uri = URI( root_path )
     self.get_user = get_user or defaultGetUser
+    if user_cache_ttl > 0:  # see UserCache, or pass a UserCache ( or anything with an invalidate ) in as get_user
+      self.get_user = UserCache( self.get_user, ttl=user_cache_ttl, size=user_cache_size, negative_ttl=user_cache_negative_ttl )
+
     self.auth_header_list = auth_header_list or []
     self.auth_cookie_list = auth_cookie_list or []
     self.cors_allow_origin = cors_allow_origin
     self.debug = debug
     self.debug_dump_location = debug_dump_location
+    self.max_request_size = max_request_size
+    self.datetime_strict = datetime_strict  # passed on to the converters of the namespaces, see Converter
 
-    self.root_namespace = Namespace( name=None, version=root_version, root_path=root_path, converter=Converter( self.uri ) )
+    self.root_namespace = Namespace( name=None, version=root_version, root_path=root_path, converter=Converter( self.uri, datetime_strict=datetime_strict ) )
     self.root_namespace.checkAuth = checkAuth_true
     self.path_handlers = {}
+    self._route_map = None
+    self._splitURI = functools.lru_cache( maxsize=uri_cache_size )( self._splitURI )
 
   def _validateModel( self, model ):
     for field_name in model.field_map:
@@ -1235,8 +1741,74 @@ class Server():
 
   def validate( self ):
     self._validateNamespace( self.root_namespace )
+    self._route_map = None  # rebuilt and compiled by route_map
+    self._buildDescribeCache()
+
+  def _compileConverters( self ):
+    for route in self._route_map.values():
+      if route.converter is not None and isinstance( route.element, ( Model, Action ) ):
+        route.element.compile( route.converter )
+
+  def _buildRouteMap( self ):
+    route_map = {}
+
+    def _walk( namespace ):
+      route_map[ namespace.path ] = Route( namespace )
+      if namespace.name != 'root':
+        route_map[ namespace.path.rstrip( '/' ) ] = route_map[ namespace.path ]  # URI.split sees "/ns" as a model, getElement has always tolerated it
+
+      for element in namespace.element_map.values():
+        if isinstance( element, Namespace ):
+          _walk( element )
+
+        else:
+          route_map[ element.path ] = Route( element )
+          for action in element.action_map.values():
+            route_map[ action.path ] = Route( action )
+
+    _walk( self.root_namespace )
+    self._route_map = MappingProxyType( route_map )
+
+  def _buildDescribeCache( self ):
+    for route in self.route_map.values():
+      if isinstance( route.element, Model ) and 'DESCRIBE' in route.element.not_allowed_verb_list:
+        continue
+
+      route.describe()
+
+  @property
+  def route_map( self ):
+    """
+    read only map of full path -> Route for every Namespace, Model and Action
+    this server dispatches to.  Built by validate(), or on the first dispatch.
+    """
+    if self._route_map is None:
+      self._buildRouteMap()
+      self._compileConverters()
+
+    return self._route_map
+
+  def _splitURI( self, uri ):  # wrapped in an lru_cache by __init__, the return value is shared, keep it immutable
+    ( path, model, action, id_list, _ ) = self.uri.split( uri )
+    if id_list is not None:
+      id_list = tuple( id_list )
+
+    return ( self.uri.build( path, model, action ), action, id_list )
 
   def handle( self, request ):
+    response = self._pathHandle( request )
+    if response is None:
+      try:
+        response = self.dispatch( request )
+        if response.stream is not None:
+          response.stream.prime()
+
+      except Exception as e:
+        response = self._exceptionResponse( request, e )
+
+    return self._finishResponse( response )
+
+  def _pathHandle( self, request ):  # returns None if no path handler took the request
     response = None
     try:
       for path in self.path_handlers:
@@ -1250,78 +1822,77 @@ class Server():
         _debugDump( self.debug_dump_location, request, e, id, self.auth_header_list, self.auth_cookie_list )
 
       if self.debug:
-        response = Response( 500, data={ 'message': 'Path Handler Exception ({0})"{1}". Reference Id: {2}'.format( type( e ).__name__, e, id ), 'trace': traceback.format_exc() } )
+        return Response( 500, data={ 'message': 'Path Handler Exception ({0})"{1}". Reference Id: {2}'.format( type( e ).__name__, e, id ), 'trace': traceback.format_exc() } )
       else:
-        response = Response( 500, data={ 'message': 'Path Handler Exception. Reference Id: {0}'.format( id ) } )
+        return Response( 500, data={ 'message': 'Path Handler Exception. Reference Id: {0}'.format( id ) } )
 
-    if response is None:
-      try:
-        response = self.dispatch( request )
-
-      except ObjectNotFound as e:
-        response = e.asResponse()
-
-      except InvalidRequest as e:
-        response = e.asResponse()
+    if response is not None and not isinstance( response, Response ):
+      if self.debug:
+        response = Response( 500, data={ 'message': 'Path Handler Return an Invalid Response: ({0})"{1}"'.format( type( response ).__name__, response ) } )
+      else:
+        response = Response( 500, data={ 'message': 'Path Handler Return an Invalid Response' } )
 
-      except ServerError as e:
-        response = e.asResponse()
+    return response
 
-      except NotAuthorized:
-        response = Response( 403, data={ 'message': 'Not Authorized' } )
+  def _exceptionResponse( self, request, e ):  # must be called from the except block, for the traceback
+    if isinstance( e, ( ObjectNotFound, InvalidRequest, ServerError ) ):
+      return e.asResponse()
 
-      except Exception as e:
-        id = uuid.uuid4().hex
-        if self.debug_dump_location is not None:
-          _debugDump( self.debug_dump_location, request, e, id, self.auth_header_list, self.auth_cookie_list )
+    if isinstance( e, NotAuthorized ):
+      return Response( 403, data={ 'message': 'Not Authorized' } )
 
-        if self.debug:
-          response = Response( 500, data={ 'message': 'Exception ({0})"{1}". Reference Id: {2}'.format( type( e ).__name__, e, id ), 'trace': traceback.format_exc() } )
-        else:
-          response = Response( 500, data={ 'message': 'Exception. Reference Id: {0}'.format( id ) } )
+    id = uuid.uuid4().hex
+    if self.debug_dump_location is not None:
+      _debugDump( self.debug_dump_location, request, e, id, self.auth_header_list, self.auth_cookie_list )
 
+    if self.debug:
+      return Response( 500, data={ 'message': 'Exception ({0})"{1}". Reference Id: {2}'.format( type( e ).__name__, e, id ), 'trace': traceback.format_exc() } )
     else:
-      if not isinstance( response, Response ):
-        if self.debug:
-          response = Response( 500, data={ 'message': 'Path Handler Return an Invalid Response: ({0})"{1}"'.format( type( response ).__name__, response ) } )
-        else:
-          response = Response( 500, data={ 'message': 'Path Handler Return an Invalid Response' } )
+      return Response( 500, data={ 'message': 'Exception. Reference Id: {0}'.format( id ) } )
 
+  def _finishResponse( self, response ):
     response.header_map[ 'Cinp-Version' ] = __CINP_VERSION__
     if self.cors_allow_origin is not None:
       response.header_map[ 'Access-Control-Allow-Origin' ] = self.cors_allow_origin
-      response.header_map[ 'Access-Control-Expose-Headers' ] = 'Method, Type, Cinp-Version, Count, Position, Total, Multi-Object, Object-Id, Id-Only'  # what is exposed to script in the browser
+      response.header_map[ 'Access-Control-Expose-Headers' ] = 'Method, Type, Cinp-Version, Count, Position, Total, Multi-Object, Object-Id, Id-Only, Values, ETag, Cursor'  # what is exposed to script in the browser
       if len( self.auth_cookie_list ) > 0:
         response.header_map[ 'Access-Control-Allow-Credentials' ] = 'true'
 
     return response
 
   def dispatch( self, request ):
+    target = self._prepareDispatch( request )
+    if isinstance( target, Response ):
+      return target
+
+    return self._executeDispatch( request, *target )
+
+  def _prepareDispatch( self, request ):  # everything up to and including the auth check, returns a Response to send right away, or ( element, converter, transaction, id_list, user, multi ) for _executeDispatch
     if request.verb not in ( 'GET', 'LIST', 'CALL', 'CREATE', 'UPDATE', 'DELETE', 'DESCRIBE', 'OPTIONS' ):
       return Response( 400, data={ 'message': 'Invalid Verb (HTTP Method) "{0}"'.format( request.verb ) } )
 
     try:
-      ( path, model, action, id_list, multi ) = self.uri.split( request.uri )
+      ( route_path, action, id_list ) = self._splitURI( request.uri )
     except ValueError:
       return Response( 400, data={ 'message': 'Unable to Parse "{0}"'.format( request.uri ) } )
 
-    if id_list is not None and len( id_list ) > __MULTI_URI_MAX__:
-      return Response( 400, data={ 'message': 'id_list longer than supported length of "{0}"'.format( __MULTI_URI_MAX__ ) } )
+    if id_list is not None:
+      if len( id_list ) > __MULTI_URI_MAX__:
+        return Response( 400, data={ 'message': 'id_list longer than supported length of "{0}"'.format( __MULTI_URI_MAX__ ) } )
+
+      id_list = list( id_list )
 
-    element = self.root_namespace.getElement( ( path, model, action ) )
-    if element is None:
+    route = self.route_map.get( route_path, None )
+    if route is None:
       return Response( 404, data={ 'message': 'path not found "{0}"'.format( request.uri ) } )
-    if not isinstance( element, Element ):
-      if self.debug:
-        return Response( 500, data={ 'message': 'confused, path ("{0}") yielded non-element "{1}"'.format( request.uri, element ) } )
-      else:
-        return Response( 500, data={ 'message': 'confused, path yielded non-element' } )
+
+    element = route.element
 
     if request.verb == 'OPTIONS':  # options never need auth, nor is the Cinp-Version header required, we can take care of it early
       response = element.options()
       if self.cors_allow_origin is not None:  # these are "preflight request" check headers
         response.header_map[ 'Access-Control-Allow-Methods' ] = response.header_map[ 'Allow' ]
-        response.header_map[ 'Access-Control-Allow-Headers' ] = ', '.join( ['Accept, Cinp-Version, Filter, Content-Type, Count, Position, Multi-Object, Id-Only' ] + self.auth_header_list )  # in a perfect world we would take the request 'Access-Control-Request-Headers' and take a union with this list, but we will leave that to the browser
+        response.header_map[ 'Access-Control-Allow-Headers' ] = ', '.join( ['Accept, Cinp-Version, Filter, Content-Type, Count, Position, Cursor, Multi-Object, Id-Only, Values, Include-Total, If-None-Match' ] + self.auth_header_list )  # in a perfect world we would take the request 'Access-Control-Request-Headers' and take a union with this list, but we will leave that to the browser
 
       return response
 
@@ -1352,7 +1923,7 @@ class Server():
     if ( request.verb in ( 'GET', 'LIST', 'UPDATE', 'CREATE', 'DELETE' ) ) and not isinstance( element, Model ):
       return Response( 400, data={ 'message': 'Verb "{0}" requires model'.format( request.verb ) } )
 
-    if ( isinstance( element, Model ) and ( request.verb in element.not_allowed_verb_list ) ) or ( isinstance( element, Action ) and ( request.verb in element.parent.not_allowed_verb_list ) ):
+    if request.verb in route.not_allowed_verb_set:
       raise NotAuthorized()
 
     multi = id_list is not None and len( id_list ) > 1
@@ -1370,24 +1941,28 @@ class Server():
     if user is None:
       return Response( 401, data={ 'message': 'Invalid Session' } )
 
+    converter = route.converter
+    if route.transaction_class is not None:
+      transaction = route.transaction_class()
+    else:
+      transaction = None
+
     # we don't check auth for superuser's, same as root... becarefull who you give superuser to
     if not user.is_superuser:
-      if not element.checkAuth( user, request.verb, id_list ):
-        raise NotAuthorized()
+      auth_kwargs = {}
+      if id_list is not None and transaction is not None and _checkAuthObjects( element.checkAuth ):
+        # these are loaded before the transaction is started, so only GET can reuse them, the writing verbs load their own in the transaction
+        auth_kwargs[ 'object_map' ] = ( element if isinstance( element, Model ) else element.parent )._loadObjects( transaction, id_list, preload=request.verb == 'GET' )
 
-    if isinstance( element, Action ):
-      transaction = element.parent.transaction_class()
-      converter = element.parent.parent.converter
-    elif isinstance( element, Model ):
-      transaction = element.transaction_class()
-      converter = element.parent.converter
-    else:
-      transaction = None  # do not need a transaction anyway
-      converter = element.converter
+      if not element.checkAuth( user, request.verb, id_list, **auth_kwargs ):
+        raise NotAuthorized()
 
     if request.verb == 'DESCRIBE':
-      return element.describe( converter )
+      return route.describe( request.header_map.get( 'IF-NONE-MATCH', None ) )
 
+    return ( element, converter, transaction, id_list, user, multi )
+
+  def _executeDispatch( self, request, element, converter, transaction, id_list, user, multi ):
     result = None
     try:
       in_transaction = False
@@ -1399,14 +1974,16 @@ class Server():
         result = element.get( converter, transaction, id_list, multi )
 
       elif request.verb == 'LIST':
-        result = element.list( converter, transaction, request.data, request.header_map )
+        if user.is_superuser:
+          get_auth = None
+        else:
+          get_auth = functools.partial( element.checkAuth, user, 'GET' )
+
+        result = element.list( converter, transaction, request.data, request.header_map, get_auth )
 
       # some CREATE thoughts
       #    pass back the re_id has a header
-      #    allow list of dicts to create more than one at a time
-      #    if multi create, then mutli-object header options
-      #    if multi create, return values like multi GET
-      elif request.verb == 'CREATE':
+      elif request.verb == 'CREATE':  # a list of dicts creates more than one at a time, returning values like multi GET
           result = element.create( converter, transaction, request.data )
 
       elif request.verb == 'UPDATE':
@@ -1450,7 +2027,11 @@ class Server():
     if parent is None:
       raise ValueError( 'path "{0}" is not found'.format( path ) )
 
+    if namespace.converter is not None:
+      namespace.converter.datetime_strict = self.datetime_strict
+
     parent.addElement( namespace )
+    self._route_map = None
 
   def registerPathHandler( self, path, handler ):
     if path.startswith( self.uri.root_path ):
@@ -1458,6 +2039,42 @@ class Server():
 
     self.path_handlers[ path ] = handler
 
+  def maxRequestSize( self, uri ):  # the body size limit for a request to uri, the Model/Action's max_request_size if it has one
+    try:
+      ( route_path, _, _ ) = self._splitURI( uri )
+    except ValueError:
+      return self.max_request_size
+
+    route = self.route_map.get( route_path, None )
+    if route is None or route.max_request_size is None:
+      return self.max_request_size
+
+    return route.max_request_size
+
+  def invalidateUser( self, cookie_map=None, header_map=None ):  # drop cached users, see UserCache.invalidate, does nothing if get_user is not cached
+    if hasattr( self.get_user, 'invalidate' ):
+      self.get_user.invalidate( cookie_map, header_map )
+
+
+class RecordReader():
+  """
+  a JSON array request body, the items are parsed as it is iterated, so they can
+  be dealt with as they arrive, instead of holding the whole body and all of the
+  items in memory at once.  Can only be iterated once.
+  """
+  def __init__( self, item_iter ):
+    super().__init__()
+    self._item_iter = item_iter
+
+  def __iter__( self ):
+    try:
+      yield from self._item_iter
+    except json_codec.DecodeError as e:
+      raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
+
+  def __str__( self ):
+    return '<RecordReader>'
+
 
 class Request():
   def __init__( self, verb, uri, header_map, cookie_map ):
@@ -1467,20 +2084,31 @@ class Request():
     self.header_map = header_map
     self.cookie_map = cookie_map
     self.data = None
+    self.body_file = None  # ( file, offset, length ) if the server has the raw request body in a regular file, see server_werkzeug
 
   def fromText( self, stream ):
     self.data = str( stream.readall(), 'utf-8' )
 
-  def fromJSON( self, stream ):
+  def fromJSON( self, stream, incremental=False ):  # if incremental, an array is left as a RecordReader, to be parsed as it is iterated
+    self.data = None
+    if incremental:
+      try:
+        self.data = json_codec.iterload( stream, STREAM_CHUNK_SIZE )
+      except json_codec.DecodeError as e:
+        raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
+
+      if isinstance( self.data, json_codec.ArrayReader ):
+        self.data = RecordReader( self.data )
+
+      return
+
+    buff = stream.read()
+    if not buff or buff.isspace():
+      return
+
     try:
-      self.data = json.load( stream )
-    except json.JSONDecodeError as e:
-      self.data = None
-      if e.doc == '':
-        return
-      raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
-    except ValueError as e:
-      self.data = None
+      self.data = json_codec.loads( buff )
+    except json_codec.DecodeError as e:
       raise InvalidRequest( 'Error Parsing JSON Request data: "{0}"'.format( e ) )
 
   def fromXML( self, stream ):
@@ -1493,15 +2121,90 @@ class Request():
     return 'Request:\n  Verb: "{0}"\n  URI: "{1}"\n  Header Map: "{2}"\n  Data: "{3}"'.format( self.verb, self.uri, self.header_map, self.data )
 
 
+class RecordStream():
+  """
+  Response data that is converted and JSON encoded a record at a time as the
+  response is sent, so the whole payload is never in memory at once.
+  record_iter yields ( key, record ) for a JSON object (keyed), or records for
+  a JSON array.  Iterating yields the encoded bytes in chunks of about
+  STREAM_CHUNK_SIZE.
+  """
+  def __init__( self, record_iter, keyed=True ):
+    super().__init__()
+    self._chunk_iter = self._encode( record_iter, keyed )
+    self._first = None
+    self._done = False
+
+  def _encode( self, record_iter, keyed ):
+    dumps = json_codec.dumps
+    buff = bytearray( b'{' if keyed else b'[' )
+    separator = b''
+    for record in record_iter:
+      buff += separator
+      if keyed:
+        buff += dumps( record[0] )
+        buff += b': '
+        buff += dumps( record[1] )
+      else:
+        buff += dumps( record )
+
+      separator = b', '
+      if len( buff ) >= STREAM_CHUNK_SIZE:
+        yield bytes( buff )
+        buff.clear()
+
+    buff += b'}' if keyed else b']'
+    self._done = True
+    yield bytes( buff )
+
+  def prime( self ):  # encode the first chunk now, while a problem with the first records can still be sent as an error response
+    if self._first is None:
+      self._first = next( self._chunk_iter )
+
+  def encoded( self ):  # the whole encoded value if it fit in the first chunk, otherwise None, it really needs to be streamed
+    self.prime()
+    if self._done:
+      return self._first
+
+    return None
+
+  def __iter__( self ):
+    self.prime()
+    yield self._first
+    yield from self._chunk_iter
+
+  def resolve( self ):  # for anything that wants the data as a python value after all
+    return json_codec.loads( b''.join( self ) )
+
+
 class Response():
-  def __init__( self, http_code, data=None, header_map=None, content_type='json' ):
+  def __init__( self, http_code, data=None, header_map=None, content_type='json', encoded_data=None ):
     super().__init__()
     self.content_type = content_type
     self.http_code = http_code
-    self.data = data
+    self.data = data  # can be a RecordStream when content_type is json
+    self.encoded_data = encoded_data  # optional pre-encoded (bytes) version of data, must match content_type
     self.header_map = header_map or {}
     self.cookie_list = []
 
+  @property
+  def data( self ):
+    if isinstance( self._data, RecordStream ):
+      self._data = self._data.resolve()
+
+    return self._data
+
+  @data.setter
+  def data( self, value ):
+    self._data = value
+
+  @property
+  def stream( self ):  # the RecordStream, None if the data is not (or no longer) streamed
+    if isinstance( self._data, RecordStream ):
+      return self._data
+
+    return None
+
   def buildNativeResponse( self ):
     if self.content_type == 'json':
       return self.asJSON()
@@ -1,8 +1,11 @@
 import pytest
-from io import StringIO
+import json
+from io import StringIO, BytesIO
+from datetime import datetime, timezone
 
+from cinp import server_common, json_codec
 from cinp.common import URI
-from cinp.server_common import __CINP_VERSION__, FILTER_OPERATION_LIST, Converter, Parameter, Field, FilterParameter, Namespace, Model, Action, Request, Response, Server, InvalidRequest, ServerError, ObjectNotFound, AnonymousUser
+from cinp.server_common import __CINP_VERSION__, FILTER_OPERATION_LIST, Converter, Parameter, Field, FilterParameter, Namespace, Model, Action, Request, Response, RecordStream, RecordReader, Server, Route, InvalidRequest, ServerError, ObjectNotFound, NotAuthorized, AnonymousUser, UserCache
 
 # TODO: test CORS header stuff
 
@@ -59,7 +62,13 @@ class TestTransaction():
 
     return result
 
-  def list( self, model, filter_name, filter_values, position, count ):
+  def list( self, model, filter_name, filter_values, position, count, total_mode='exact', cursor=None ):
+    if cursor is not None:
+      return ( [ 'after {0}'.format( cursor ) ], position, 1000, None if cursor == 'last' else 'next' )
+
+    if total_mode != 'exact':
+      return ( [ total_mode ], position, None if total_mode == 'none' else 1000 )
+
     if filter_name == 'lots':
       return ( [ 'a', 'b', 'c', 'd', filter_values[ 'more' ], 'at {0}'.format( position ), 'for {0}'.format( count ), 'combined {0}'.format( position + count ) ], 50, 100 )
 
@@ -90,6 +99,41 @@ class TestTransaction():
     pass
 
 
+class BulkTransaction( TestTransaction ):
+  def __init__( self ):
+    super().__init__()
+    self.get_many_calls = []
+    self.create_many_calls = []
+    self.update_many_calls = []
+    self.delete_many_calls = []
+
+  def get_many( self, model, id_list ):
+    self.get_many_calls.append( id_list )
+    return dict( [ ( object_id, self.get( model, object_id ) ) for object_id in id_list ] )
+
+  def create_many( self, model, value_map_list ):
+    self.create_many_calls.append( value_map_list )
+    return [ ( 'new_{0}'.format( index ), dict( value_map, _extra_='bulk' ) ) for index, value_map in enumerate( value_map_list ) ]
+
+  def update_many( self, model, id_list, value_map ):
+    self.update_many_calls.append( ( id_list, value_map ) )
+    if 'BAD' in id_list:
+      raise ValueError( { 'field1': 'is bad' } )
+
+    return dict( [ ( object_id, None if object_id == 'NOT FOUND' else dict( value_map, _extra_='bulk update "{0}"'.format( object_id ) ) ) for object_id in id_list ] )
+
+  def delete_many( self, model, id_list ):
+    self.delete_many_calls.append( id_list )
+    return [ object_id for object_id in id_list if object_id.startswith( 'NOT FOUND' ) ]
+
+
+class PreloadTransaction( BulkTransaction ):
+  preload_calls = []
+
+  def preload( self, model, object_map ):
+    self.preload_calls.append( object_map )
+
+
 class testUser():
   def __init__( self, mode ):
     self.mode = mode
@@ -201,6 +245,9 @@ def test_field():
   with pytest.raises( ValueError ):
     Field( name='test1', type='Integer', mode='R' )
 
+  with pytest.raises( ValueError ):
+    Field( name='test1', type='Integer', id_attribute='test1_id' )
+
   field = Field( name='test1', type='String', length=10 )
   assert converter.toPython( field, 'asdf', None ) == 'asdf'
   assert converter.toPython( field, 123, None ) == '123'
@@ -247,8 +294,35 @@ def test_field():
     converter.fromPython( field, 'yhn' )
   converter.fromPython( field, None ) is None
 
+  field = Field( name='test5', type='DateTime' )
+  assert converter.toPython( field, '2021-03-04T05:06:07', None ) == datetime( 2021, 3, 4, 5, 6, 7 )
+  assert converter.toPython( field, '2021-03-04T05:06:07.123456+00:00', None ) == datetime( 2021, 3, 4, 5, 6, 7, 123456, tzinfo=timezone.utc )
+  assert converter.toPython( field, '2021-03-04T05:06:07Z', None ) == datetime( 2021, 3, 4, 5, 6, 7, tzinfo=timezone.utc )
+  assert converter.toPython( field, '2021-03-04', None ) == datetime( 2021, 3, 4 )
+  assert converter.toPython( field, 'March 4 2021 5:06:07', None ) == datetime( 2021, 3, 4, 5, 6, 7 )  # not ISO-8601, dateutil takes care of it
+  assert converter.toPython( field, None, None ) is None
+  assert converter.toPython( field, '', None ) is None
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 'not a date', None )
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 12, None )
+  assert converter.fromPython( field, datetime( 2021, 3, 4, 5, 6, 7 ) ) == '2021-03-04T05:06:07'
+
+  strict_converter = Converter( None, datetime_strict=True )
+  assert strict_converter.toPython( field, '2021-03-04T05:06:07', None ) == datetime( 2021, 3, 4, 5, 6, 7 )
+  assert strict_converter.toPython( field, '2021-03-04T05:06:07z', None ) == datetime( 2021, 3, 4, 5, 6, 7, tzinfo=timezone.utc )
+  with pytest.raises( ValueError ):
+    strict_converter.toPython( field, 'March 4 2021 5:06:07', None )
+
+  server = Server( root_path='/api/', root_version='0.0', datetime_strict=True )
+  ns = Namespace( name='ns1', version='0.1', converter=Converter( server.uri ) )
+  server.registerNamespace( '/', ns )
+  assert server.root_namespace.converter.datetime_strict is True
+  assert ns.converter.datetime_strict is True
+  assert Server( root_path='/api/', root_version='0.0' ).root_namespace.converter.datetime_strict is False
+
   field = Field( name='test4', type='Boolean' )
-  # TODO: test boolean, datatime, map, model(includeing model_resolve er) and file
+  # TODO: test boolean, map, model(includeing model_resolve er) and file
 
 
 def test_model():
@@ -406,6 +480,52 @@ def test_create():
   with pytest.raises( ServerError ):
     model.create( converter, transaction, { 'field1': 'BAD', 'field2': 5 } )
 
+  resp = model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'by', 'field2': 30, 'field3': 'good by' } ] )
+  assert resp.http_code == 201
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Multi-Object': 'True', 'Object-Id': 'None:new_id:new_id:' }
+  assert resp.data == { 'None:new_id:': { '_extra_': 'created', 'field1': 'by', 'field2': 30, 'field3': 'good by' } }  # TestTransaction gives everything the same id
+
+  transaction = BulkTransaction()
+  resp = model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'by', 'field2': 30, 'field3': 'good by' } ] )
+  assert resp.http_code == 201
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Multi-Object': 'True', 'Object-Id': 'None:new_0:new_1:' }
+  assert resp.data == { 'None:new_0:': { '_extra_': 'bulk', 'field1': 'hello', 'field2': 5, 'field3': 'Hello World' }, 'None:new_1:': { '_extra_': 'bulk', 'field1': 'by', 'field2': 30, 'field3': 'good by' } }
+  assert transaction.create_many_calls == [ [ { 'field1': 'hello', 'field2': 5, 'field3': 'Hello World' }, { 'field1': 'by', 'field2': 30, 'field3': 'good by' } ] ]
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, { 'field1': 'hello', 'field2': 'sdf' }, { 'field1': 'hello' } ] )
+
+  assert e.value.data == { '1': { 'field2': 'Invalid Value "Unable to convert to an int"' }, '2': { 'field2': 'Required Field' } }
+  assert len( transaction.create_many_calls ) == 1  # nothing is created if any of them are bad
+
+  with pytest.raises( InvalidRequest ):
+    model.create( converter, transaction, [] )
+
+  with pytest.raises( InvalidRequest ):
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 }, 'hello' ] )
+
+  with pytest.raises( InvalidRequest ):
+    model.create( converter, transaction, [ { 'field1': 'hello', 'field2': 5 } ] * 101 )
+
+  transaction = BulkTransaction()
+  req = Request( 'CREATE', '/api/v1/ns/model', {}, {} )
+  req.fromJSON( BytesIO( b'[ { "field1": "hello", "field2": 5 }, { "field1": "by", "field2": 30, "field3": "good by" } ]' ), incremental=True )
+  assert isinstance( req.data, RecordReader )
+  resp = model.create( converter, transaction, req.data )
+  assert resp.http_code == 201
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'CREATE', 'Multi-Object': 'True', 'Object-Id': 'None:new_0:new_1:' }
+  assert transaction.create_many_calls == [ [ { 'field1': 'hello', 'field2': 5, 'field3': 'Hello World' }, { 'field1': 'by', 'field2': 30, 'field3': 'good by' } ] ]
+
+  for ( body, message ) in ( ( b'[]', 'CREATE data list is empty' ), ( b'[ { "field1": "hello", "field2": 5 }, { "field1": ', None ), ( b'[' + b', '.join( [ b'{ "field1": "a", "field2": 1 }' ] * 101 ) + b']', 'CREATE data list longer than supported length of "100"' ) ):
+    req.fromJSON( BytesIO( body ), incremental=True )
+    with pytest.raises( InvalidRequest ) as e:
+      model.create( converter, transaction, req.data )
+
+    if message is not None:
+      assert e.value.data == { 'message': message }
+
+  assert len( transaction.create_many_calls ) == 1
+
 
 def test_list():
   converter = Converter( None )
@@ -432,6 +552,68 @@ def test_list():
   with pytest.raises( InvalidRequest ):
     model.list( converter, transaction, { 'more': 'bob' }, { 'FILTER': 'lots', 'POSITION': '23', 'COUNT': 'rf' } )
 
+  resp = model.list( converter, transaction, {}, { 'INCLUDE-TOTAL': 'false', 'ID-ONLY': 'true' } )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '0', 'Count': '1', 'Id-Only': 'True' }
+  assert resp.data == [ 'none' ]
+
+  resp = model.list( converter, transaction, {}, { 'INCLUDE-TOTAL': 'Estimate', 'ID-ONLY': 'true' } )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '0', 'Count': '1', 'Total': '1000', 'Id-Only': 'True' }
+  assert resp.data == [ 'estimate' ]
+
+  resp = model.list( converter, transaction, {}, { 'INCLUDE-TOTAL': 'True' } )
+  assert resp.header_map[ 'Total' ] == '2'
+
+  with pytest.raises( InvalidRequest ):
+    model.list( converter, transaction, {}, { 'INCLUDE-TOTAL': 'sometimes' } )
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': 'abc', 'POSITION': '10', 'ID-ONLY': 'true' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '10', 'Count': '1', 'Total': '1000', 'Cursor': 'next', 'Id-Only': 'True' }
+  assert resp.data == [ 'after abc' ]
+
+  resp = model.list( converter, transaction, {}, { 'CURSOR': 'last', 'ID-ONLY': 'true' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '0', 'Count': '1', 'Total': '1000', 'Id-Only': 'True' }
+
+  class OffsetTransaction( TestTransaction ):  # a transaction that only does offset paging with totals
+    def list( self, model, filter_name, filter_values, position, count ):
+      return super().list( model, filter_name, filter_values, position, count )
+
+  resp = model.list( converter, OffsetTransaction(), {}, { 'CURSOR': 'abc', 'INCLUDE-TOTAL': 'False' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '0', 'Count': '2', 'Total': '2', 'Id-Only': 'False' }
+  assert resp.data == [ 'None:a:', 'None:b:' ]
+
+  auth_list = []
+
+  def get_auth( id_list ):
+    auth_list.append( id_list )
+    return id_list != [ 'a', 'b' ]
+
+  resp = model.list( converter, transaction, {}, { 'VALUES': 'True' }, lambda id_list: True )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '0', 'Count': '2', 'Total': '2', 'Values': 'True' }
+  assert resp.data == { 'None:a:': { '_extra_': 'get "a"' }, 'None:b:': { '_extra_': 'get "b"' } }
+
+  with pytest.raises( NotAuthorized ):
+    model.list( converter, transaction, {}, { 'VALUES': 'True' }, get_auth )
+
+  assert auth_list == [ [ 'a', 'b' ] ]
+
+  class ValuesTransaction( TestTransaction ):  # a transaction that loads the objects with the list
+    def list( self, model, filter_name, filter_values, position, count, values=False ):
+      assert values is True
+      return ( [ ( 'x', { 'field': 'x' } ), ( 'y', { 'field': 'y' } ) ], position, 2 )
+
+  resp = model.list( converter, ValuesTransaction(), {}, { 'VALUES': 'True', 'POSITION': '4' } )
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'LIST', 'Position': '4', 'Count': '2', 'Total': '2', 'Values': 'True' }
+  assert resp.data == { 'None:x:': { 'field': 'x' }, 'None:y:': { 'field': 'y' } }
+
+  model = Model( name='model1', field_list=field_list, transaction_class=TestTransaction, not_allowed_verb_list=[ 'GET' ] )
+  with pytest.raises( NotAuthorized ):
+    model.list( converter, transaction, {}, { 'VALUES': 'True' } )
+
+  resp = model.list( converter, transaction, {}, {} )
+  assert resp.data == [ 'None:a:', 'None:b:' ]
+
   with pytest.raises( InvalidRequest ):
     model.list( converter, transaction, {}, { 'FILTER': 'not exist' } )
 
@@ -533,6 +715,28 @@ def test_get():
     model.get( converter, transaction, [ 'NOT FOUND' ], True )
 
 
+def test_get_many():
+  converter = Converter( None )
+  field_list = []
+  field_list.append( Field( name='field1', mode='RW', type='String', length=50 ) )
+  model = Model( name='model1', field_list=field_list, transaction_class=BulkTransaction )
+  transaction = model.transaction_class()
+
+  resp = model.get( converter, transaction, [ 'bob' ], False )
+  assert resp.data == { '_extra_': 'get "bob"' }
+  assert transaction.get_many_calls == []
+
+  resp = model.get( converter, transaction, [ 'sue', 'bob', 'martha' ], True )
+  assert resp.http_code == 200
+  assert list( resp.data.keys() ) == [ 'None:sue:', 'None:bob:', 'None:martha:' ]
+  assert resp.data == { 'None:bob:': { '_extra_': 'get "bob"' }, 'None:martha:': { '_extra_': 'get "martha"' }, 'None:sue:': { '_extra_': 'get "sue"' } }
+  assert transaction.get_many_calls == [ [ 'sue', 'bob', 'martha' ] ]
+
+  with pytest.raises( ObjectNotFound ) as e:
+    model.get( converter, transaction, [ 'bob', 'NOT FOUND', 'sue' ], True )
+  assert e.value.object_id == 'NOT FOUND'
+
+
 def test_update():
   converter = Converter( None )
   field_list = []
@@ -575,6 +779,25 @@ def test_update():
   assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'UPDATE', 'Multi-Object': 'True' }
   assert resp.data == { 'None:bob:': { '_extra_': 'update "bob"', 'field1': 'goodies' }, 'None:martha:': { '_extra_': 'update "martha"', 'field1': 'goodies' }, 'None:sue:': { '_extra_': 'update "sue"', 'field1': 'goodies' } }
 
+  transaction = BulkTransaction()
+  resp = model.update( converter, transaction, [ 'bob', 'martha' ], { 'field1': 'goodies' }, True )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'UPDATE', 'Multi-Object': 'True' }
+  assert resp.data == { 'None:bob:': { '_extra_': 'bulk update "bob"', 'field1': 'goodies' }, 'None:martha:': { '_extra_': 'bulk update "martha"', 'field1': 'goodies' } }
+  assert transaction.update_many_calls == [ ( [ 'bob', 'martha' ], { 'field1': 'goodies' } ) ]
+
+  resp = model.update( converter, transaction, [ 'bob' ], { 'field1': 'goodies' }, False )
+  assert resp.data == { '_extra_': 'update "bob"', 'field1': 'goodies' }
+  assert len( transaction.update_many_calls ) == 1  # single object updates do not go through update_many
+
+  with pytest.raises( ObjectNotFound ):
+    model.update( converter, transaction, [ 'bob', 'NOT FOUND' ], { 'field1': 'goodies' }, True )
+
+  with pytest.raises( InvalidRequest ) as e:
+    model.update( converter, transaction, [ 'bob', 'BAD' ], { 'field1': 'goodies' }, True )
+
+  assert e.value.data == { 'field1': 'is bad' }
+
 
 def test_delete():
   field_list = []
@@ -597,6 +820,17 @@ def test_delete():
   with pytest.raises( ObjectNotFound ):
     model.delete( transaction, [ 'NOT FOUND' ] )
 
+  transaction = BulkTransaction()
+  resp = model.delete( transaction, [ 'bob', 'sue' ] )
+  assert resp.http_code == 200
+  assert resp.header_map == { 'Cache-Control': 'no-cache', 'Verb': 'DELETE' }
+  assert transaction.delete_many_calls == [ [ 'bob', 'sue' ] ]
+
+  with pytest.raises( ObjectNotFound ) as e:
+    model.delete( transaction, [ 'bob', 'NOT FOUND 1', 'NOT FOUND 2' ] )
+
+  assert e.value.object_id == 'NOT FOUND 1'
+
 
 def test_getElement():
   uri = URI( root_path='/api/' )
@@ -641,6 +875,54 @@ def test_getElement():
   assert root_ns.getElement( uri.split( '/api/mdl1(actX)' ) ) is None
 
 
+def test_route_map():
+  server = Server( root_path='/api/', root_version='0.0' )
+  ns1 = Namespace( name='ns1', version='0.1', converter=None )
+  ns1_1 = Namespace( name='ns1_1', version='0.1', converter=None )
+  ns1.addElement( ns1_1 )
+  model1 = Model( name='model1', field_list=[], not_allowed_verb_list=[ 'DELETE' ], transaction_class=TestTransaction )
+  model1.checkAuth = lambda user, verb, id_list: True
+  ns1_1.addElement( model1 )
+  action1 = Action( name='act1', return_parameter=Parameter( type='String' ), func=fake_func )
+  model1.addAction( action1 )
+  server.registerNamespace( '/', ns1 )
+  server.validate()
+
+  assert sorted( server.route_map.keys() ) == [ '/api/', '/api/ns1', '/api/ns1/', '/api/ns1/ns1_1', '/api/ns1/ns1_1/', '/api/ns1/ns1_1/model1', '/api/ns1/ns1_1/model1(act1)' ]
+  assert server.route_map[ '/api/' ].element == server.root_namespace
+  assert server.route_map[ '/api/ns1' ].element == ns1
+  assert server.route_map[ '/api/ns1/ns1_1/' ].element == ns1_1
+  assert isinstance( server.route_map[ '/api/ns1/ns1_1/model1' ], Route )
+  assert server.route_map[ '/api/ns1/ns1_1/model1' ].element == model1
+  assert server.route_map[ '/api/ns1/ns1_1/model1' ].transaction_class == TestTransaction
+  assert server.route_map[ '/api/ns1/ns1_1/model1' ].not_allowed_verb_set == frozenset( [ 'DELETE' ] )
+  assert server.route_map[ '/api/ns1/ns1_1/model1(act1)' ].element == action1
+  assert server.route_map[ '/api/ns1/ns1_1/model1(act1)' ].allowed_verb_set == frozenset( [ 'OPTIONS', 'DESCRIBE', 'CALL' ] )
+  assert server.route_map[ '/api/ns1/ns1_1/model1(act1)' ].not_allowed_verb_set == frozenset( [ 'DELETE' ] )
+
+  with pytest.raises( TypeError ):
+    server.route_map[ '/api/other' ] = None
+
+  assert server._splitURI( '/api/ns1/ns1_1/model1:a:b:' ) == ( '/api/ns1/ns1_1/model1', None, ( 'a', 'b' ) )
+  assert server._splitURI( '/api/ns1/ns1_1/model1(act1)' ) == ( '/api/ns1/ns1_1/model1(act1)', 'act1', None )
+  assert server._splitURI.cache_info().currsize == 2
+
+  res = server.dispatch( Request( 'GET', '/api/ns1/ns1_1/model1:a:b:', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert res.http_code == 200
+  assert res.data == { '/api/ns1/ns1_1/model1:a:': { '_extra_': 'get "a"' }, '/api/ns1/ns1_1/model1:b:': { '_extra_': 'get "b"' } }
+
+  res = server.dispatch( Request( 'GET', '/api/ns1/ns1_1/model1:a:b:', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert res.http_code == 200
+  assert server._splitURI.cache_info().hits == 2
+
+  res = server.dispatch( Request( 'GET', '/api/ns1/model1:a:', { 'CINP-VERSION': __CINP_VERSION__ }, {} ) )
+  assert res.http_code == 404
+
+  ns2 = Namespace( name='ns2', version='0.2', converter=None )
+  server.registerNamespace( '/', ns2 )
+  assert '/api/ns2/' in server.route_map
+
+
 def test_request():
   req = Request( 'DESCRIBE', '/api/v1/ns/model', { 'CINP-VERSION': '2.0', 'CONTENT-TYPE': 'text/plain', 'FILTER': 'stuff', 'POSITION': 0, 'COUNT': 50, 'MULTI-OBJECT': 'True', 'ID-ONLY': 'True' }, { 'Flavor': 'Yumm' } )
   assert req.verb == 'DESCRIBE'
@@ -660,6 +942,23 @@ def test_request():
   req.fromJSON( StringIO( '[ 1 ,2 ,3 ]' ) )
   assert req.data == [ 1, 2, 3 ]
 
+  req.fromJSON( BytesIO( b'{ "key": "value" }' ), incremental=True )  # only arrays are left to be parsed as they are used
+  assert req.data == { 'key': 'value' }
+
+  req.fromJSON( BytesIO( b'  ' ), incremental=True )
+  assert req.data is None
+
+  req.fromJSON( BytesIO( b'[ 1 ,2 ,3 ]' ), incremental=True )
+  assert isinstance( req.data, RecordReader )
+  assert list( req.data ) == [ 1, 2, 3 ]
+
+  req.fromJSON( BytesIO( b'[ 1 ,2 3 ]' ), incremental=True )
+  with pytest.raises( InvalidRequest ):
+    list( req.data )
+
+  with pytest.raises( InvalidRequest ):
+    req.fromJSON( BytesIO( b'{ "key": ' ), incremental=True )
+
 
 def test_response():
   resp = Response( 200 )
@@ -681,6 +980,79 @@ def test_response():
   assert resp.asJSON() is None  # yea, still none, base Responose dosen't asXXXX anything
 
 
+def test_record_stream( monkeypatch ):
+  monkeypatch.setattr( json_codec, 'dumps', json_codec._CODEC_MAP[ 'json' ][0] )  # for the separators
+  stream = RecordStream( ( '/api/m:{0}:'.format( i ), { 'v': i } ) for i in range( 3 ) )
+  assert b''.join( stream ) == b'{"/api/m:0:": {"v": 0}, "/api/m:1:": {"v": 1}, "/api/m:2:": {"v": 2}}'
+
+  stream = RecordStream( iter( [] ) )
+  assert stream.encoded() == b'{}'
+  assert stream.resolve() == {}
+
+  stream = RecordStream( ( '/api/m:{0}:'.format( i ) for i in range( 3 ) ), keyed=False )
+  assert stream.encoded() == b'["/api/m:0:", "/api/m:1:", "/api/m:2:"]'
+
+  monkeypatch.setattr( server_common, 'STREAM_CHUNK_SIZE', 30 )
+  converted_list = []
+
+  def record_iter():
+    for i in range( 10 ):
+      converted_list.append( i )
+      yield ( str( i ), { 'value': 'x' * 40 } )
+
+  stream = RecordStream( record_iter() )
+  assert converted_list == []  # nothing is done till it is sent
+  stream.prime()
+  assert converted_list == [ 0 ]  # one record is over the chunk size
+  assert stream.encoded() is None
+  chunk_list = list( stream )
+  assert len( chunk_list ) == 11
+  assert max( len( i ) for i in chunk_list ) < 80
+  assert json.loads( b''.join( chunk_list ) ) == dict( ( str( i ), { 'value': 'x' * 40 } ) for i in range( 10 ) )
+
+  def bad_iter():
+    yield ( 'a', 1 )
+    raise ValueError( 'bad record' )
+
+  stream = RecordStream( bad_iter() )
+  with pytest.raises( ValueError ):
+    stream.prime()
+
+  resp = Response( 200, data=RecordStream( iter( [ ( 'a', 1 ), ( 'b', [ 2 ] ) ] ) ) )
+  assert resp.stream is not None
+  assert resp.data == { 'a': 1, 'b': [ 2 ] }
+  assert resp.stream is None  # data resolved the stream
+
+  resp = Response( 200, data={ 'a': 1 } )
+  assert resp.stream is None
+
+
+def test_max_request_size():
+  server = Server( root_path='/api/', root_version='0.0' )
+  assert server.max_request_size == 524288
+  server = Server( root_path='/api/', root_version='0.0', max_request_size=1000 )
+  ns = Namespace( name='ns1', version='0.1', converter=None )
+  model1 = Model( name='model1', field_list=[], transaction_class=TestTransaction )
+  model2 = Model( name='model2', field_list=[], transaction_class=TestTransaction, max_request_size=5000 )
+  action1 = Action( name='act1', func=fake_func )
+  action2 = Action( name='act2', func=fake_func, max_request_size=10 )
+  model2.addAction( action1 )
+  model2.addAction( action2 )
+  ns.addElement( model1 )
+  ns.addElement( model2 )
+  server.registerNamespace( '/', ns )
+
+  assert server.maxRequestSize( '/api/' ) == 1000
+  assert server.maxRequestSize( '/api/ns1/' ) == 1000
+  assert server.maxRequestSize( '/api/ns1/model1' ) == 1000
+  assert server.maxRequestSize( '/api/ns1/model2' ) == 5000
+  assert server.maxRequestSize( '/api/ns1/model2:1:2:' ) == 5000
+  assert server.maxRequestSize( '/api/ns1/model2(act1)' ) == 1000
+  assert server.maxRequestSize( '/api/ns1/model2(act2)' ) == 10
+  assert server.maxRequestSize( '/api/ns1/model3' ) == 1000
+  assert server.maxRequestSize( '/not/api' ) == 1000
+
+
 def test_sanity_checks():
   server = Server( root_path='/api/', root_version='0.0' )
   ns = Namespace( name='ns', version='0.1', converter=None )
@@ -801,6 +1173,7 @@ def test_server():
   res = server.handle( req )
   assert res.http_code == 200
   assert sort_dsc( res.data ) == desc_ref
+  assert res.header_map.pop( 'ETag' ).startswith( '"' )
   assert res.header_map == { 'Type': 'Namespace', 'Verb': 'DESCRIBE', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0' }
 
   path = '/api/ns1/'
@@ -810,6 +1183,7 @@ def test_server():
   res = server.handle( req )
   assert res.http_code == 200
   assert sort_dsc( res.data ) == desc_ref
+  assert res.header_map.pop( 'ETag' ).startswith( '"' )
   assert res.header_map == { 'Type': 'Namespace', 'Verb': 'DESCRIBE', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0' }
 
   path = '/api/ns1/model1'
@@ -819,8 +1193,25 @@ def test_server():
   res = server.handle( req )
   assert res.http_code == 200
   assert sort_dsc( res.data ) == desc_ref
+  etag = res.header_map.pop( 'ETag' )
   assert res.header_map == { 'Type': 'Model', 'Verb': 'DESCRIBE', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0' }
 
+  req = Request( 'DESCRIBE', path, { 'CINP-VERSION': __CINP_VERSION__, 'IF-NONE-MATCH': etag }, {} )
+  res = server.handle( req )
+  assert res.http_code == 304
+  assert res.data is None
+  assert res.header_map == { 'Type': 'Model', 'Verb': 'DESCRIBE', 'Cache-Control': 'max-age=0', 'Cinp-Version': '2.0', 'ETag': etag }
+
+  req = Request( 'DESCRIBE', path, { 'CINP-VERSION': __CINP_VERSION__, 'IF-NONE-MATCH': '"other", W/{0}'.format( etag ) }, {} )
+  res = server.handle( req )
+  assert res.http_code == 304
+
+  req = Request( 'DESCRIBE', path, { 'CINP-VERSION': __CINP_VERSION__, 'IF-NONE-MATCH': '"other"' }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert res.header_map[ 'ETag' ] == etag
+  assert sort_dsc( json.loads( res.encoded_data ) ) == desc_ref
+
   # TODO: more more more
 
 
@@ -864,6 +1255,189 @@ def test_multi():
   assert res.data == { 'message': 'requested non multi-object, however multiple ids where sent' }
 
 
+def test_map_convert():
+  converter = Converter( None )
+  field = Field( name='config', type='Map' )
+
+  value = { 'a': 1, 'b': [ 'x', { 'c': None } ], 'd': { 'e': True, 'f': 2.5 } }
+  assert converter.fromPython( field, value ) is value  # nothing to convert, nothing copied
+
+  when = datetime( 2021, 3, 4, 5, 6, 7 )
+  untouched = { 'g': [ 1, 2 ] }
+  value = { 'a': 1, 'b': [ 'x', when ], 1: 'one', 'd': untouched, 't': ( 1, when ) }
+  result = converter.fromPython( field, value )
+  assert result == { 'a': 1, 'b': [ 'x', '2021-03-04T05:06:07' ], '1': 'one', 'd': { 'g': [ 1, 2 ] }, 't': [ 1, '2021-03-04T05:06:07' ] }
+  assert result[ 'd' ] is untouched  # only what needed converting is rebuilt
+  assert value == { 'a': 1, 'b': [ 'x', when ], 1: 'one', 'd': { 'g': [ 1, 2 ] }, 't': ( 1, when ) }  # the original is not modified
+
+  assert converter.fromPython( field, None ) is None
+  with pytest.raises( ValueError ):
+    converter.fromPython( field, [ 1, 2 ] )
+
+  with pytest.raises( ValueError ):
+    Field( name='config', type='String', json_native=True )
+
+  field = Field( name='config', type='Map', json_native=True )
+  value = { 'a': when }
+  assert converter.fromPython( field, value ) is value  # trusted, not even looked at
+  assert converter.toPython( field, { 'a': 1 }, None ) == { 'a': 1 }
+  with pytest.raises( ValueError ):
+    converter.toPython( field, 'a', None )
+
+
+class FakeObject():
+  def __init__( self, **kwargs ):
+    for name, value in kwargs.items():
+      setattr( self, name, value )
+
+
+class LegacyConverter( Converter ):  # overrides _fromPython the old way, compiling has to still go through it
+  def _fromPython( self, parameter, python_value ):
+    if parameter.type == 'Integer':
+      return 'legacy {0}'.format( python_value )
+
+    return super()._fromPython( parameter, python_value )
+
+
+def test_compile():
+  server = Server( root_path='/api/', root_version='0.0' )
+  converter = Converter( URI( '/api/' ) )
+  ns1 = Namespace( name='ns1', version='0.1', converter=converter )
+  ns1.checkAuth = lambda user, verb, id_list: True
+  field_list = []
+  field_list.append( Field( name='name', type='String', length=10 ) )
+  field_list.append( Field( name='size', type='Integer' ) )
+  field_list.append( Field( name='tags', type='String', is_array=True ) )
+  model1 = Model( name='model1', field_list=field_list, list_filter_map={ 'big': { 'size': Parameter( name='size', type='Integer' ) } }, transaction_class=TestTransaction )
+  model2 = Model( name='model2', field_list=[ Field( name='owner', type='Model', model=model1, id_attribute='owner_id' ) ], transaction_class=TestTransaction )
+  action1 = Action( name='act', return_parameter=Parameter( type='Integer' ), parameter_list=[ Parameter( name='count', type='Integer' ) ], func=fake_func )
+  model1.addAction( action1 )
+  ns1.addElement( model1 )
+  ns1.addElement( model2 )
+  server.registerNamespace( '/', ns1 )
+
+  target_object = FakeObject( name='bob', size=5, tags=[ 'a', 2 ] )
+  assert model1._asDict( converter, target_object ) == { 'name': 'bob', 'size': 5, 'tags': [ 'a', '2' ] }  # works before compiling
+  assert model1._serializer is None
+
+  server.validate()
+  assert model1._serializer[0] is converter
+  assert model1.field_map[ 'size' ]._compiled[0] is converter
+  assert model1.list_filter_map[ 'big' ][ 'size' ]._compiled[0] is converter
+  assert action1.parameter_map[ 'count' ]._compiled[0] is converter
+  assert action1.return_parameter._compiled[0] is converter
+
+  assert model1._asDict( converter, target_object ) == { 'name': 'bob', 'size': 5, 'tags': [ 'a', '2' ] }
+  assert model2._asDict( converter, FakeObject( owner_id=12 ) ) == { 'owner': '/api/ns1/model1:12:' }
+  assert model2._asDict( converter, FakeObject( owner_id=None ) ) == { 'owner': None }
+  assert converter.toPython( model1.field_map[ 'size' ], '42', None ) == 42
+  assert converter.toPython( model1.field_map[ 'tags' ], [ 'x', 3 ], None ) == [ 'x', '3' ]
+  with pytest.raises( ValueError ):
+    converter.toPython( model1.field_map[ 'tags' ], 'x', None )
+
+  with pytest.raises( ValueError ) as e:
+    model1._asDict( converter, FakeObject( name='much to long', size=5, tags=[] ) )
+
+  assert str( e.value ) == 'Error with "name": "String value to long"'
+
+  with pytest.raises( ServerError ):
+    model1._asDict( converter, FakeObject( name='bob', size=5 ) )
+
+  legacy_converter = LegacyConverter( URI( '/api/' ) )
+  assert model1._asDict( legacy_converter, target_object ) == { 'name': 'bob', 'size': 'legacy 5', 'tags': [ 'a', '2' ] }  # compiled for a different converter, so not used
+  assert legacy_converter.fromPython( model1.field_map[ 'size' ], 3 ) == 'legacy 3'
+
+
+def test_user_cache():
+  call_list = []
+
+  def get_user( cookie_map, header_map ):
+    call_list.append( header_map[ 'TOKEN' ] )
+    if header_map[ 'TOKEN' ] == 'bad':
+      return None
+
+    return 'user {0}'.format( header_map[ 'TOKEN' ] )
+
+  cache = UserCache( get_user, ttl=60, size=2, negative_ttl=0 )
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'a' } ) == 'user a'
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'a' } ) == 'user a'
+  assert call_list == [ 'a' ]
+
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'bad' } ) is None
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'bad' } ) is None
+  assert call_list == [ 'a', 'bad', 'bad' ]  # negative_ttl is 0, so None is not cached
+
+  assert cache( { 'CID': 'x' }, { 'HID': 'me', 'TOKEN': 'a' } ) == 'user a'  # cookies are part of the key
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'b' } ) == 'user b'
+  assert call_list == [ 'a', 'bad', 'bad', 'a', 'b' ]
+
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'a' } ) == 'user a'  # was the least recently used, dropped for 'b'
+  assert call_list == [ 'a', 'bad', 'bad', 'a', 'b', 'a' ]
+
+  cache.invalidate( header_map={ 'TOKEN': 'a' } )
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'b' } ) == 'user b'
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'a' } ) == 'user a'
+  assert call_list == [ 'a', 'bad', 'bad', 'a', 'b', 'a', 'a' ]
+
+  cache.invalidate()
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'b' } ) == 'user b'
+  assert call_list == [ 'a', 'bad', 'bad', 'a', 'b', 'a', 'a', 'b' ]
+
+  cache = UserCache( get_user, ttl=60, negative_ttl=60 )
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'bad' } ) is None
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'bad' } ) is None
+  assert call_list[ -1: ] == [ 'bad' ] and len( call_list ) == 9
+
+  cache.ttl = -1  # already expired
+  cache.invalidate()
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'b' } ) == 'user b'
+  assert cache( {}, { 'HID': 'me', 'TOKEN': 'b' } ) == 'user b'
+  assert len( call_list ) == 11
+
+  server = Server( root_path='/api/', root_version='0.0', get_user=getUser, auth_header_list=[ 'HID', 'TOKEN' ], user_cache_ttl=30 )
+  assert isinstance( server.get_user, UserCache )
+  assert server.get_user.get_user is getUser
+  server.invalidateUser( header_map={ 'TOKEN': 'a' } )
+
+  server = Server( root_path='/api/', root_version='0.0', get_user=getUser, auth_header_list=[ 'HID', 'TOKEN' ] )
+  assert server.get_user is getUser
+  server.invalidateUser()
+
+
+def test_check_auth_objects():
+  server = Server( root_path='/api/', root_version='0.0', debug=True )
+  ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
+  ns1.checkAuth = lambda user, verb, id_list: True
+  model1 = Model( name='model1', field_list=[], transaction_class=PreloadTransaction )
+  auth_calls = []
+
+  def checkAuth( user, verb, id_list, object_map=None ):
+    auth_calls.append( ( verb, id_list, object_map ) )
+    return object_map is None or 'bad' not in object_map
+
+  model1.checkAuth = checkAuth
+  ns1.addElement( model1 )
+  server.registerNamespace( '/', ns1 )
+
+  PreloadTransaction.preload_calls = []
+  req = Request( 'GET', '/api/ns1/model1:abc:def:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert auth_calls == [ ( 'GET', [ 'abc', 'def' ], { 'abc': { '_extra_': 'get "abc"' }, 'def': { '_extra_': 'get "def"' } } ) ]
+  assert PreloadTransaction.preload_calls == [ auth_calls[0][2] ]
+
+  req = Request( 'GET', '/api/ns1/model1:abc:bad:', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 403
+
+  auth_calls.clear()
+  req = Request( 'LIST', '/api/ns1/model1', { 'CINP-VERSION': __CINP_VERSION__ }, {} )
+  res = server.handle( req )
+  assert res.http_code == 200
+  assert auth_calls == [ ( 'LIST', None, None ) ]  # nothing to load without ids
+  assert len( PreloadTransaction.preload_calls ) == 2
+
+
 def test_not_allowed_verbs():
   server = Server( root_path='/api/', root_version='0.0', debug=True )
   ns1 = Namespace( name='ns1', version='0.1', converter=Converter( URI( '/api/' ) ) )
@@ -1,9 +1,11 @@
+import os
+import stat
 import werkzeug
-import json
 import logging
 from importlib import import_module
 
-from cinp.server_common import Server, Request, Response, Namespace, Converter, InvalidRequest
+from cinp import json_codec
+from cinp.server_common import Server, Request, Response, Namespace, Converter, InvalidRequest, __MAX_REQUEST_SIZE__, INCREMENTAL_PARSE_SIZE
 
 
 class NoCINP( Exception ):
@@ -13,7 +15,7 @@ class NoCINP( Exception ):
 class WerkzeugServer( Server ):
   def handle( self, environment ):
     try:
-      response = super().handle( WerkzeugRequest( environment ) )
+      response = super().handle( WerkzeugRequest( environment, max_request_size=self.maxRequestSize ) )
 
       if not isinstance( response, Response ):
         if self.debug:
@@ -70,30 +72,53 @@ class WerkzeugServer( Server ):
     super().registerNamespace( path, namespace )
 
 
+class _LimitedStream( werkzeug.wsgi.LimitedStream ):
+  def on_exhausted( self ):  # instead of werkzeug's RequestEntityTooLarge
+    raise InvalidRequest( 'Request body too large' )
+
+
+def _bodyFile( stream, content_length ):  # some servers spool large bodies to a temp file, if so the fd can be handed off, see django_file_handler
+  if content_length is None:
+    return None
+
+  try:
+    if not stat.S_ISREG( os.fstat( stream.fileno() ).st_mode ):  # sockets and pipes have to be read
+      return None
+
+    return ( stream, stream.tell(), content_length )
+
+  except ( AttributeError, OSError, ValueError ):
+    return None
+
+
 class WerkzeugRequest( Request ):
-  def __init__( self, environment, *args, **kwargs ):
+  def __init__( self, environment, max_request_size=__MAX_REQUEST_SIZE__, *args, **kwargs ):  # max_request_size can also be a function that takes the uri, ie: Server.maxRequestSize
     werkzeug_request = werkzeug.wrappers.Request( environment )
     header_map = {}
     for ( key, value ) in werkzeug_request.headers:
       header_map[ key.upper().replace( '_', '-' ) ] = value
 
-    self.max_request_size = 524288  # 512k bytes
-
     # script_root should be what ever path was consumed by the script handler configuration
     # ie: the  "/api" of: WSGIScriptAlias /api <path to wsgi script>
     uri = werkzeug_request.script_root + werkzeug_request.path
+
+    if callable( max_request_size ):
+      max_request_size = max_request_size( uri )
+
+    self.max_request_size = max_request_size
+
     super().__init__( verb=werkzeug_request.method.upper(), uri=uri, header_map=header_map, cookie_map=werkzeug_request.cookies, *args, **kwargs )
 
     content_type = self.header_map.get( 'CONTENT-TYPE', None )
     content_length = werkzeug_request.content_length
     if content_length is not None and content_length > self.max_request_size and content_type is not None and not content_type.startswith( 'application/octet-stream' ):
-      raise InvalidRequest( 'Request body too large' )  # hopefully the request isn't larger than 512k, if so, we may need to rethink things
+      raise InvalidRequest( 'Request body too large' )
 
-    stream = werkzeug.wsgi.LimitedStream( werkzeug_request.stream, self.max_request_size, is_max=True )
+    stream = _LimitedStream( werkzeug_request.stream, self.max_request_size, is_max=True )
 
     if content_type is not None:  # if it is none, there isn't (or shouldn't) be anything to bring in anyway
       if content_type.startswith( 'application/json' ):
-        self.fromJSON( stream )
+        self.fromJSON( stream, incremental=content_length is None or content_length > INCREMENTAL_PARSE_SIZE )
 
       elif content_type.startswith( 'text/plain' ):
         self.fromText( stream )
@@ -103,6 +128,7 @@ class WerkzeugRequest( Request ):
 
       elif content_type.startswith( 'application/octet-stream' ):
         self.stream = werkzeug_request.stream
+        self.body_file = _bodyFile( environment[ 'wsgi.input' ], content_length )
         if 'CONTENT-DISPOSITION' in header_map:  # cheat a little, Content-Disposition isn't pure CInP, but this is a bolt on file uploader
           self.header_map[ 'CONTENT-DISPOSITION' ] = header_map[ 'CONTENT-DISPOSITION' ]
         pass  # do nothing, down stream is going to have to read from the stream
@@ -121,6 +147,14 @@ class WerkzeugRequest( Request ):
   def read( self, size ):
     return self.stream.read( size )
 
+  def readinto( self, buff ):
+    if hasattr( self.stream, 'readinto' ):
+      return self.stream.readinto( buff )
+
+    data = self.stream.read( len( buff ) )  # not all WSGI servers' input have readinto
+    buff[ :len( data ) ] = data
+    return len( data )
+
 
 class WerkzeugResponse():  # TODO: this should be a subclass of the server_common Response, to much redundant stuff
   def __init__( self, response ):
@@ -129,7 +163,12 @@ class WerkzeugResponse():  # TODO: this should be a subclass of the server_commo
 
     super().__init__()
     self.content_type = response.content_type
-    self.data = response.data
+    self.stream = response.stream
+    self.data = response.data if self.stream is None else None  # don't resolve the stream
+    self.encoded_data = response.encoded_data
+    if self.stream is not None and self.stream.encoded() is not None:  # small enough to send the normal way
+      self.encoded_data = self.stream.encoded()
+      self.stream = None
     self.status = response.http_code
     self.header_list = []
     for name in response.header_map:
@@ -162,10 +201,14 @@ class WerkzeugResponse():  # TODO: this should be a subclass of the server_commo
     return werkzeug.wrappers.Response( response=response, status=self.status, headers=self.header_list, content_type=content_type )
 
   def asJSON( self ):
-    if self.data is None:
+    if self.stream is not None:
+      response = self.stream  # werkzeug sends an iterable without a Content-Length, ie chunked
+    elif self.encoded_data is not None:
+      response = self.encoded_data
+    elif self.data is None:
       response = ''.encode( 'utf-8' )
     else:
-      response = json.dumps( self.data ).encode( 'utf-8' )
+      response = json_codec.dumps( self.data )
 
     return werkzeug.wrappers.Response( response=response, status=self.status, headers=self.header_list, content_type='application/json;charset=utf-8'  )
 
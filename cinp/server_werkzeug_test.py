@@ -1,13 +1,22 @@
 import pytest
 import json
+import tempfile
 from io import BytesIO
 
 from werkzeug.datastructures import Headers
 
-from cinp.server_common import Response, Namespace, Model, AnonymousUser
+from cinp import json_codec, server_common
+from cinp.server_common import Response, RecordStream, RecordReader, InvalidRequest, Namespace, Model, AnonymousUser
 from cinp.server_werkzeug import WerkzeugServer, WerkzeugRequest, WerkzeugResponse
 
 
+@pytest.fixture( autouse=True )
+def stdlib_json():  # the expected bodies are in the stdlib's formatting
+  json_codec.setCodec( 'json' )
+  yield
+  json_codec.setCodec()
+
+
 def getUser( auth_id, auth_token ):
   return AnonymousUser()
 
@@ -103,6 +112,127 @@ def test_werkzeug_request():
   assert req.data is None
 
 
+def test_werkzeug_request_size():
+  def _env( data, content_length=True ):
+    env = {
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'PATH_INFO': '/api/ns/model',
+            'SCRIPT_NAME': '',
+            'REQUEST_METHOD': 'CREATE',
+            'CONTENT_TYPE': 'application/json',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input_terminated': True,
+            'wsgi.input': BytesIO( data )
+          }
+    if content_length:
+      env[ 'CONTENT_LENGTH' ] = str( len( data ) )
+
+    return env
+
+  data = b'[' + b', '.join( [ b'{ "name": "a long enough name" }' ] * 20 ) + b']'
+  assert len( data ) > 600
+
+  with pytest.raises( InvalidRequest ):
+    WerkzeugRequest( _env( data ), max_request_size=500 )
+
+  req = WerkzeugRequest( _env( data, False ), max_request_size=500 )  # the client does not have to say how big it is
+  with pytest.raises( InvalidRequest ):
+    list( req.data )
+
+  uri_list = []
+
+  def max_request_size( uri ):
+    uri_list.append( uri )
+    return 1000
+
+  req = WerkzeugRequest( _env( data ), max_request_size=max_request_size )
+  assert uri_list == [ '/api/ns/model' ]
+  assert req.max_request_size == 1000
+  assert req.data == [ { 'name': 'a long enough name' } ] * 20
+
+  req = WerkzeugRequest( _env( data, False ), max_request_size=1000 )  # no length, could be big, so parsed as it is used
+  assert isinstance( req.data, RecordReader )
+  assert list( req.data ) == [ { 'name': 'a long enough name' } ] * 20
+
+
+def test_werkzeug_request_body():
+  def _env( stream, content_length ):
+    env = {
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'PATH_INFO': '/api/ns/model',
+            'SCRIPT_NAME': '',
+            'REQUEST_METHOD': 'UPLOAD',
+            'CONTENT_TYPE': 'application/octet-stream',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': stream
+          }
+    if content_length is not None:
+      env[ 'CONTENT_LENGTH' ] = str( content_length )
+
+    return env
+
+  class Stream():  # like some WSGI server's input, only read
+    def __init__( self, data ):
+      self.buff = BytesIO( data )
+
+    def read( self, size=-1 ):
+      return self.buff.read( size )
+
+  data = b'0123456789' * 100000  # bigger than the json limit is fine
+  req = WerkzeugRequest( _env( Stream( data ), len( data ) ) )
+  assert req.body_file is None
+  buff = bytearray( 300000 )
+  result = b''
+  count = req.readinto( buff )
+  while count:
+    result += buff[ :count ]
+    count = req.readinto( buff )
+
+  assert result == data
+
+  env = _env( Stream( data ), None )
+  env[ 'wsgi.input_terminated' ] = True
+  req = WerkzeugRequest( env )
+  assert req.readinto( buff ) == 300000
+  assert buff[ :10 ] == b'0123456789'
+
+  with tempfile.TemporaryFile() as body:  # the server spooled the body to disk
+    body.write( b'headers' + data )
+    body.seek( 7 )
+    req = WerkzeugRequest( _env( body, len( data ) ) )
+    assert req.body_file == ( body, 7, len( data ) )
+
+    body.seek( 7 )
+    req = WerkzeugRequest( _env( body, None ) )  # the length is needed to know where the body stops
+    assert req.body_file is None
+
+
+def test_werkzeug_server_request_size():
+  server = WerkzeugServer( root_path='/api/', root_version='0.0', debug=True, get_user=getUser, max_request_size=10 )
+  ns = Namespace( name='ns1', version='0.1', converter=None )
+  ns.addElement( Model( name='model1', field_list=[], transaction_class=None ) )
+  model2 = Model( name='model2', field_list=[], transaction_class=None, max_request_size=100 )
+  model2.checkAuth = lambda user, verb, id_list: False
+  ns.addElement( model2 )
+  server.registerNamespace( '/', ns )
+
+  for ( path, http_code ) in ( ( '/api/ns1/model1', 400 ), ( '/api/ns1/model2', 403 ) ):
+    env = {
+            'PATH_INFO': path,
+            'HTTP_CINP_VERSION': '2.0',
+            'REQUEST_METHOD': 'CREATE',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': '50',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input_terminated': True,
+            'wsgi.input': BytesIO( b'{ "name": "' + b'a' * 37 + b'" }' )
+          }
+    wresp = server.handle( env )
+    assert wresp.status_code == http_code  # model2 gets past the size check, to the auth check
+
+  assert json.loads( wresp.data ) == { 'message': 'Not Authorized' }
+
+
 def test_werkzeug_response():
   resp = Response( 201, { 'hi': 'there' }, { 'hdr': 'big' } )
   assert resp.header_map == { 'hdr': 'big' }
@@ -127,6 +257,22 @@ def test_werkzeug_response():
     WerkzeugResponse( 'test' )
 
 
+def test_werkzeug_response_stream( monkeypatch ):
+  resp = Response( 200, RecordStream( iter( [ ( 'a', 1 ), ( 'b', 2 ) ] ) ) )
+  wresp = WerkzeugResponse( resp ).asJSON()  # fits in one chunk, sent like any other
+  assert wresp.headers == Headers( [ ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '16' ) ] )
+  assert wresp.data == b'{"a": 1, "b": 2}'
+
+  monkeypatch.setattr( server_common, 'STREAM_CHUNK_SIZE', 100 )
+  resp = Response( 200, RecordStream( ( 'key{0}'.format( i ), 'v' * 50 ) for i in range( 20 ) ) )
+  wresp = WerkzeugResponse( resp ).asJSON()
+  assert wresp.is_streamed
+  assert wresp.headers == Headers( [ ( 'Content-Type', 'application/json;charset=utf-8' ) ] )
+  assert len( list( wresp.iter_encoded() ) ) == 11
+  resp = Response( 200, RecordStream( ( 'key{0}'.format( i ), 'v' * 50 ) for i in range( 20 ) ) )
+  assert json.loads( WerkzeugResponse( resp ).asJSON().get_data() ) == dict( ( 'key{0}'.format( i ), 'v' * 50 ) for i in range( 20 ) )
+
+
 def test_werkzeug_server():
   server = WerkzeugServer( root_path='/api/', root_version='0.0', debug=True, get_user=getUser )
   ns = Namespace( name='ns1', version='0.1', converter=None )
@@ -143,5 +289,11 @@ def test_werkzeug_server():
         }
   wresp = server.handle( env )
   assert wresp.status_code == 200
-  assert wresp.headers == Headers( [ ( 'Cache-Control', 'max-age=0' ), ( 'Cinp-Version', '2.0' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '120' ), ( 'Verb', 'DESCRIBE' ), ( 'Type', 'Namespace' ) ] )
+  assert wresp.headers == Headers( [ ( 'Cache-Control', 'max-age=0' ), ( 'Cinp-Version', '2.0' ), ( 'Content-Type', 'application/json;charset=utf-8' ), ( 'Content-Length', '120' ), ( 'Verb', 'DESCRIBE' ), ( 'Type', 'Namespace' ), ( 'ETag', wresp.headers[ 'ETag' ] ) ] )
   assert json.loads( str( wresp.data, 'utf-8' ) ) == { 'multi-uri-max': 100, 'api-version': '0.0', 'path': '/api/', 'namespaces': [ '/api/ns1/' ], 'models': [], 'name': 'root' }
+
+  env[ 'HTTP_IF_NONE_MATCH' ] = wresp.headers[ 'ETag' ]
+  env[ 'wsgi.input' ] = BytesIO( b'' )
+  wresp = server.handle( env )
+  assert wresp.status_code == 304
+  assert wresp.data == b''
@@ -66,10 +66,13 @@ class Car( models.Model ):
 
   @cinp.check_auth()
   @staticmethod
-  def checkAuth( user, method, id_list, action=None ):
+  def checkAuth( user, method, id_list, action=None, object_map=None ):  # object_map is the cars in id_list, already loaded for the request
     if id_list is not None:
-      for car in Car.objects.filter( pk__in=id_list ):
-        if car.owner != user:
+      if object_map is None:
+        object_map = Car.objects.in_bulk( id_list )
+
+      for car in object_map.values():
+        if car is not None and car.owner_id != user.pk:
           return False
 
     return True